@@ -0,0 +1,208 @@
+import queue  # Hands grow requests from the audio callback to the allocator thread
+import threading  # Blocks are allocated on a helper thread, never on the audio thread
+import time  # Yields the GIL between slices while the helper thread prepares a block
+import numpy as np  # For the preallocated sample storage
+
+DROP_OLDEST = "drop_oldest"  # When full, overwrite the oldest audio (keep the most recent max_frames)
+STOP = "stop"                # When full, ignore new audio (keep the first max_frames)
+FILL_SLICE_FRAMES = 16384    # Frames the allocator thread touches per GIL hold
+
+_requests = queue.SimpleQueue()  # Buffers that crossed their high-water mark and need a spare block
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def _new_block(frames, channels, pause=False):
+    """
+    Allocate a block and touch every page now, so the first write in the callback does not fault them in.
+    With pause, the pages are touched a slice at a time, giving up the GIL in between so the callback
+    is never kept waiting for the whole block.
+    """
+    block = np.empty((frames, channels), dtype=np.int16)
+    step = FILL_SLICE_FRAMES if pause else frames
+    for start in range(0, frames, step):
+        block[start:start + step] = 0
+        if pause:
+            time.sleep(0)
+    return block
+
+
+def _allocate_blocks():
+    while True:
+        buffer = _requests.get()
+        frames = buffer._next_block_frames()
+        if frames > 0:
+            buffer._spares.append(_new_block(frames, buffer.channels, pause=True))
+        buffer._requested = False
+
+
+def _start_allocator():
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = threading.Thread(target=_allocate_blocks, name="audio-buffer-allocator", daemon=True)
+            _allocator.start()
+
+
+class AudioBuffer:
+    """
+    Preallocated int16 arena for recorded audio, made of fixed-size blocks.
+
+    The audio callback copies each chunk into the current block and never allocates:
+    once less than half a block is left, it asks a helper thread for a spare block,
+    and picks that block up when the current ones are full. The arena starts with one
+    block of initial_frames and grows a block at a time until it reaches max_frames
+    (if set). At that point the overflow policy applies: DROP_OLDEST turns it into a
+    ring that keeps the most recent audio, STOP discards further audio. Consumers read
+    the result through views() (zero-copy) or detach() (one copy, made on stop).
+    """
+    def __init__(self, initial_frames, max_frames=None, channels=1, overflow=DROP_OLDEST):
+        if overflow not in (DROP_OLDEST, STOP):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if max_frames is not None:
+            initial_frames = min(initial_frames, max_frames)
+        self.max_frames = max_frames
+        self.channels = channels
+        self.overflow = overflow
+        self._block_frames = max(1, initial_frames)
+        self._blocks = [_new_block(self._block_frames, channels)]
+        self._spares = []         # Blocks allocated ahead of time by the allocator thread
+        self._requested = False   # A spare block has been asked for and not delivered yet
+        self._capacity = self._block_frames
+        self._start = 0   # Index of the oldest frame (non-zero only once the ring has wrapped)
+        self._length = 0  # Number of valid frames
+        self.dropped_frames = 0
+        self.grow_count = 0
+        self.inline_allocations = 0  # Blocks the callback had to allocate itself (no spare was ready)
+        if self._can_grow():
+            _start_allocator()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def __len__(self):
+        return self._length
+
+    def clear(self):
+        """Forget the recorded audio but keep the allocated arena for the next recording."""
+        self._start = 0
+        self._length = 0
+        self.dropped_frames = 0
+
+    def write(self, indata):
+        """Append a chunk of frames (shape (frames, channels)). Called from the audio callback."""
+        frames = len(indata)
+        if self._length + frames > self._capacity:
+            self._grow(self._length + frames)
+        capacity = self._capacity
+        if self._length + frames > capacity:
+            if self.overflow == STOP:
+                frames = capacity - self._length
+                self.dropped_frames += len(indata) - frames
+                if frames <= 0:
+                    return
+                indata = indata[:frames]
+            else:
+                if frames >= capacity:
+                    # The chunk alone fills the ring: keep only its tail
+                    self.dropped_frames += self._length + frames - capacity
+                    self._copy_in(0, indata[frames - capacity:])
+                    self._start = 0
+                    self._length = capacity
+                    return
+                overflow = self._length + frames - capacity
+                self._start = (self._start + overflow) % capacity
+                self._length -= overflow
+                self.dropped_frames += overflow
+        end = (self._start + self._length) % capacity
+        first = min(frames, capacity - end)
+        self._copy_in(end, indata[:first])
+        if first < frames:
+            self._copy_in(0, indata[first:])
+        self._length += frames
+        if (not self._requested and not self._spares and self._can_grow()
+                and capacity - self._length < self._block_frames // 2):
+            # High-water mark: have the next block ready before this one fills up
+            self._requested = True
+            _requests.put(self)
+
+    def detach(self):
+        """
+        Copy the recorded audio out as a contiguous array and reset the arena for reuse.
+        The copy does not pin the arena; blocks beyond the first are released.
+        """
+        views = self.views()
+        audio = views[0].copy() if len(views) == 1 else np.concatenate(views, axis=0)
+        del self._blocks[1:]
+        self._capacity = len(self._blocks[0])
+        self.clear()
+        return audio
+
+    def views(self):
+        """
+        Return the recorded audio as zero-copy numpy views in chronological order:
+        one per block the audio spans, starting again at the front if the ring has wrapped.
+        """
+        if not self._length:
+            return (self._blocks[0][:0],)
+        end = self._start + self._length
+        if end <= self._capacity:
+            return tuple(self._slices(self._start, end))
+        return tuple(self._slices(self._start, self._capacity)) + tuple(self._slices(0, end - self._capacity))
+
+    def view(self):
+        """
+        Return the recorded audio as a single contiguous numpy array.
+        This is a zero-copy view if the audio sits in one block, otherwise a copy.
+        """
+        views = self.views()
+        if len(views) == 1:
+            return views[0]
+        return np.concatenate(views, axis=0)
+
+    def memoryview(self):
+        """Return a memoryview over the recorded int16 samples."""
+        return memoryview(self.view())
+
+    def _can_grow(self):
+        return self.max_frames is None or self._capacity < self.max_frames
+
+    def _next_block_frames(self):
+        if self.max_frames is None:
+            return self._block_frames
+        return min(self._block_frames, self.max_frames - self._capacity)
+
+    def _grow(self, needed):
+        # Growing happens before the ring can wrap, so the data is always at the front here
+        while self._capacity < needed and self._can_grow():
+            if self._spares:
+                block = self._spares.pop()[:self._next_block_frames()]
+            else:
+                # The allocator thread fell behind: allocating here is the only way not to lose audio
+                block = np.zeros((self._next_block_frames(), self.channels), dtype=np.int16)
+                self.inline_allocations += 1
+            self._blocks.append(block)
+            self._capacity += len(block)
+            self.grow_count += 1
+
+    def _copy_in(self, pos, data):
+        """Copy data into the arena starting at frame pos, across block boundaries (no wrap)."""
+        block, offset = divmod(pos, self._block_frames)
+        while len(data):
+            target = self._blocks[block]
+            n = min(len(data), len(target) - offset)
+            target[offset:offset + n] = data[:n]
+            data = data[n:]
+            block += 1
+            offset = 0
+
+    def _slices(self, start, end):
+        block, offset = divmod(start, self._block_frames)
+        while start < end:
+            source = self._blocks[block]
+            n = min(end - start, len(source) - offset)
+            yield source[offset:offset + n]
+            start += n
+            block += 1
+            offset = 0
@@ -0,0 +1,98 @@
+import io         # For encoding WAV data in memory
+import threading  # Encodings are shared between STT threads
+
+
+class AudioClip:
+    """
+    A recorded utterance held in memory: int16 samples plus sample rate.
+
+    The recorder hands an AudioClip straight to the STT engines instead of
+    writing recorded.wav and having each engine read it back. Encodings are
+    computed once, on first use, and shared by every engine that asks for them.
+    """
+    def __init__(self, samples=None, fs=None, wav_data=None, path=None):
+        self._samples = samples
+        self.fs = fs
+        self._encoded = {"wav": wav_data} if wav_data is not None else {}
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, filename):
+        """Load a WAV file. The file bytes are used as-is, so no re-encoding happens."""
+        with open(filename, "rb") as f:
+            return cls(wav_data=f.read(), path=filename)
+
+    @property
+    def samples(self):
+        """The int16 samples, decoded from the WAV data if the clip came from disk."""
+        if self._samples is None:
+            with self._lock:
+                if self._samples is None:
+                    import scipy.io.wavfile as wav  # For WAV decoding (imported on first use: slow to load)
+                    self.fs, self._samples = wav.read(io.BytesIO(self._encoded["wav"]))
+        return self._samples
+
+    @property
+    def channels(self):
+        return 1 if self.samples.ndim == 1 else self.samples.shape[1]
+
+    def name(self, fmt="wav"):
+        """A file name for APIs that want one (only the extension matters to them)."""
+        if self.path and self.path.endswith("." + fmt):
+            return self.path
+        return f"audio.{fmt}"
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.fs
+
+    def __len__(self):
+        return len(self.samples)
+
+    def encoded(self, fmt="wav"):
+        """
+        Return the clip encoded as a file in the given format ("wav" or "flac").
+        Each format is encoded at most once and then shared by every caller.
+        """
+        data = self._encoded.get(fmt)
+        if data is None:
+            samples = self.samples
+            with self._lock:
+                data = self._encoded.get(fmt)
+                if data is None:
+                    data = encode(samples, self.fs, fmt)
+                    self._encoded[fmt] = data
+        return data
+
+    def wav_bytes(self):
+        """Return the clip encoded as a WAV file, encoding it at most once."""
+        return self.encoded("wav")
+
+    def save(self, filename):
+        """Write the clip to disk as a WAV file and remember the path."""
+        with open(filename, "wb") as f:
+            f.write(self.wav_bytes())
+        self.path = filename
+        return filename
+
+
+def encode(samples, fs, fmt):
+    """Encode int16 samples as an in-memory audio file in the given format."""
+    buf = io.BytesIO()
+    if fmt == "wav":
+        import scipy.io.wavfile as wav  # For WAV encoding (imported on first use: slow to load)
+        wav.write(buf, fs, samples)
+    elif fmt == "flac":
+        import soundfile  # Optional dependency, only needed for FLAC payloads
+        soundfile.write(buf, samples, fs, format="FLAC", subtype="PCM_16")
+    else:
+        raise ValueError(f"Unsupported audio format: {fmt}")
+    return buf.getvalue()
+
+
+def as_clip(audio):
+    """Accept either an AudioClip or a WAV filename (the original interface) and return an AudioClip."""
+    if isinstance(audio, AudioClip):
+        return audio
+    return AudioClip.from_file(audio)
@@ -0,0 +1,53 @@
+import importlib.util  # For checking optional dependencies without importing them
+import os  # For configuration via environment variables
+from math import gcd  # For the polyphase up/down factors
+import numpy as np  # For sample manipulation
+from audio.clip import AudioClip  # Input and output of the preprocessing stage
+
+# Speech recognizers work at 16 kHz internally; sending 44.1 kHz only adds bytes
+TARGET_FS = int(os.getenv("STT_SAMPLE_RATE", "16000"))
+# Payload format for the STT engines: "flac" (lossless, about half the size of WAV) or "wav"
+PAYLOAD_FORMAT = os.getenv("STT_PAYLOAD_FORMAT", "flac")
+
+
+def downmix(samples):
+    """Average all channels into one. Returns mono samples of shape (frames,)."""
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples.reshape(-1)
+    return samples.mean(axis=1).astype(samples.dtype)
+
+
+def resample(samples, fs_in, fs_out):
+    """Resample int16 samples from fs_in to fs_out with a polyphase filter."""
+    if fs_in == fs_out:
+        return samples
+    from scipy.signal import resample_poly  # Polyphase (vectorized FIR) resampler; imported on first use (slow to load)
+    g = gcd(fs_in, fs_out)
+    resampled = resample_poly(samples.astype(np.float32), fs_out // g, fs_in // g, axis=0)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def prepare_for_stt(clip, target_fs=TARGET_FS, mono=True):
+    """
+    Return a clip ready for upload: downmixed to mono and resampled to target_fs.
+    The input clip is returned unchanged if it already matches.
+    """
+    samples = clip.samples
+    if mono:
+        samples = downmix(samples)
+    if clip.fs == target_fs and samples is clip.samples:
+        return clip
+    return AudioClip(resample(samples, clip.fs, target_fs), target_fs)
+
+
+def check_payload_format(fmt=PAYLOAD_FORMAT):
+    """
+    Return fmt if it can be encoded here, falling back to "wav" when the
+    optional soundfile package needed for FLAC is not installed.
+    """
+    if fmt == "flac" and importlib.util.find_spec("soundfile") is None:
+        print("[Audio] soundfile is not installed, sending WAV instead of FLAC")
+        return "wav"
+    return fmt
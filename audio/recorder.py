@@ -1,48 +1,253 @@
-import sounddevice as sd     # For capturing audio from the microphone
-import scipy.io.wavfile as wav  # For saving audio data as a WAV file
-import numpy as np           # For handling and concatenating audio data arrays
+import os  # For configuration via environment variables
+import threading  # The audio callback runs on PortAudio's thread; reopening runs on its own
+import time  # For start latency and reopen back-off
+from audio.buffer import AudioBuffer, DROP_OLDEST  # Preallocated arena the callback writes into
+from audio.clip import AudioClip  # In-memory recording handed to the STT engines
+from utils.benchmark import record_value, count_event  # Start latency, pre-roll and reopen counts
 
 FS = 44100  # Sample rate
 FILENAME = "recorded.wav"
+INITIAL_SECONDS = 30  # Audio arena preallocated up front; grows by blocks of this size if exceeded
+MAX_SECONDS = None    # Optional cap on recording length (None = unlimited)
+
+# RECORDER_MODE=armed keeps one input stream open across utterances; per_recording opens
+# a new stream on every hotkey press (device open time then clips the first word)
+RECORDER_MODE = os.getenv("RECORDER_MODE", "armed")
+# What an armed stream does between utterances: capture keeps it running and keeps the
+# last PREROLL_MS of audio so speech from just before the key press is not lost; pause
+# stops it (no callbacks, so no idle CPU, and the OS microphone indicator goes off) but
+# leaves the device open, so starting is still fast, just without pre-roll
+RECORDER_IDLE = os.getenv("RECORDER_IDLE", "capture")
+PREROLL_MS = int(os.getenv("PREROLL_MS", "300"))
+REOPEN_DELAY = 0.5  # Seconds between attempts to reopen a failed input device
+
+
+def open_input_stream(samplerate, channels, dtype, callback, finished_callback):
+    """
+    Open (but do not start) a sounddevice input stream. AudioRecorder takes any
+    factory with this signature, returning an object with start(), stop() and close(),
+    so it can run against a fake device (see bench/recorder_start.py).
+    """
+    import sounddevice as sd  # Imported here: loading PortAudio is part of the audio device warm-up
+    return sd.InputStream(samplerate=samplerate, channels=channels, dtype=dtype,
+                          callback=callback, finished_callback=finished_callback)
+
+
+def is_device_error(status):
+    """
+    Whether a callback status means the device stopped delivering audio (so the stream
+    is reopened), rather than a one-off glitch. Input overflow only means some samples
+    were dropped because the callback ran late; input underflow means PortAudio had no
+    real input to hand over.
+    """
+    return bool(getattr(status, "input_underflow", False))
+
 
 class AudioRecorder:
     """
     Handles audio recording from the microphone.
+
+    In armed mode the input stream is opened once (by arm(), or by the first start())
+    and stays open: between utterances the callback writes into a small pre-roll ring,
+    and start() moves that audio into the recording and switches the callback over,
+    without touching the device. If the device fails (an error status from the callback,
+    or the stream ending on its own), the stream is reopened on a background thread.
     """
-    def __init__(self, filename=FILENAME, fs=FS):
+    def __init__(self, filename=FILENAME, fs=FS, max_seconds=MAX_SECONDS, overflow=DROP_OLDEST, save_to_disk=False,
+                 mode=RECORDER_MODE, idle=RECORDER_IDLE, preroll_ms=PREROLL_MS, stream_factory=open_input_stream):
+        if mode not in ("armed", "per_recording"):
+            raise ValueError(f"Unknown recorder mode: {mode}")
+        if idle not in ("capture", "pause"):
+            raise ValueError(f"Unknown idle setting: {idle}")
         self.filename = filename
+        self.save_to_disk = save_to_disk
         self.fs = fs
-        self.recording = []
+        self.mode = mode
+        self.idle = idle
+        self.stream_factory = stream_factory
+        max_frames = int(max_seconds * fs) if max_seconds else None
+        self.buffer = AudioBuffer(INITIAL_SECONDS * fs, max_frames=max_frames, overflow=overflow)
+        preroll_frames = int(preroll_ms * fs / 1000) if mode == "armed" and idle == "capture" else 0
+        # Ring holding the most recent audio while idle (armed capture mode only)
+        self.preroll = AudioBuffer(preroll_frames, max_frames=preroll_frames) if preroll_frames else None
         self.stream = None
+        self.on_chunk = None
+        self.recording = False
+        self.reopen_count = 0
+        self._lock = threading.Lock()  # Shared with the audio callback; held only for a buffer write
+        # Serialises opening, starting, stopping and closing the stream. Never held together
+        # with _lock: stopping a stream waits for its callback, which may be waiting for _lock
+        self._device_lock = threading.Lock()
+        self._stopping = False         # Set while we stop or close the stream ourselves
+        self._reopen = threading.Event()
+        self._reopen_thread = None
+        self._closed = False
 
-    def start(self):
-        """Start recording audio from the microphone."""
-        self.recording = []
-        self.stream = sd.InputStream(samplerate=self.fs, channels=1, dtype="int16", callback=self._callback)
-        self.stream.start()
+    @property
+    def armed(self):
+        return self.stream is not None and self.mode == "armed"
+
+    def warm_up(self):
+        """
+        Open the input stream ahead of the first recording: in armed mode it is opened
+        and left open (and starts filling the pre-roll); otherwise it is opened and closed
+        once, so the first recording does not pay for audio device setup (and any
+        microphone permission prompt appears right away).
+        """
+        if self.mode == "armed":
+            self.arm()
+            return
+        stream = self.stream_factory(self.fs, 1, "int16", None, None)
+        stream.start()
+        stream.stop()
+        stream.close()
+
+    def arm(self):
+        """Open the input stream and keep it open across recordings (armed mode)."""
+        with self._device_lock:
+            if self.stream is not None:
+                return
+            self._closed = False
+            self._open()
+            if self.idle == "capture":
+                self.stream.start()
+        if self._reopen_thread is None or not self._reopen_thread.is_alive():
+            self._reopen_thread = threading.Thread(target=self._reopen_loop, daemon=True, name="recorder-reopen")
+            self._reopen_thread.start()
+
+    def close(self):
+        """Close the input stream (armed mode keeps it open until this is called)."""
+        self._closed = True
+        self._reopen.set()
+        with self._lock:
+            self.recording = False
+        with self._device_lock:
+            self._close_stream()
+
+    def start(self, on_chunk=None):
+        """
+        Start recording audio from the microphone.
+        If on_chunk is given, it is called with every captured chunk (e.g. StreamingPipeline.submit).
+        In armed capture mode the recording begins with the pre-roll (the audio from just
+        before this call), which on_chunk receives first.
+        """
+        start = time.perf_counter()
+        if self.mode == "armed" and self.stream is None:
+            self.arm()
+        with self._lock:
+            self.buffer.clear()
+            self.on_chunk = on_chunk
+            preroll = 0
+            if self.preroll is not None:
+                preroll = len(self.preroll)
+                for audio in self.preroll.views():
+                    self.buffer.write(audio)
+                    if on_chunk is not None:
+                        on_chunk(audio.copy())
+                self.preroll.clear()
+            self.recording = True
+        if self.mode == "per_recording" or self.idle == "pause":
+            with self._device_lock:
+                if self.stream is None:
+                    self._open()
+                self.stream.start()
+        record_value("recorder_start_latency", time.perf_counter() - start)
+        if self.preroll is not None:
+            record_value("recorder_preroll_seconds", preroll / self.fs)
 
     def stop(self):
-        """Stop recording, save to file, and return the filename."""
-        if self.stream is not None:
+        """
+        Stop recording and return the audio as an AudioClip (None if nothing was recorded).
+        The clip is also written to self.filename if save_to_disk is set.
+        """
+        with self._lock:
+            self.recording = False
+            self.on_chunk = None
+        with self._device_lock:
+            if self.mode == "per_recording":
+                self._close_stream()
+            elif self.idle == "pause" and self.stream is not None:
+                self._stopping = True
+                try:
+                    self.stream.stop()
+                finally:
+                    self._stopping = False
+        if self.buffer.dropped_frames:
+            print(f"[Recorder] Maximum duration reached, dropped {self.buffer.dropped_frames / self.fs:.1f}s of audio")
+        if not len(self.buffer):
+            return None
+        # The clip is a copy, so the arena is reused by the next recording
+        clip = AudioClip(self.buffer.detach(), self.fs)
+        if self.save_to_disk:
+            clip.save(self.filename)
+        return clip
+
+    def _open(self):
+        self.stream = self.stream_factory(self.fs, 1, "int16", self._callback, self._finished)
+
+    def _close_stream(self):
+        if self.stream is None:
+            return
+        self._stopping = True
+        try:
             self.stream.stop()
             self.stream.close()
+        finally:
+            self._stopping = False
             self.stream = None
-        if self.recording:
-            audio = np.concatenate(self.recording, axis=0)
-            wav.write(self.filename, self.fs, audio)
-            return self.filename
-        return None
+
+    def _finished(self):
+        """Called by PortAudio when the stream ends; unless we stopped it, the device went away."""
+        if not self._stopping and self.mode == "armed":
+            self._reopen.set()
+
+    def _reopen_loop(self):
+        """Reopens the armed stream after a device error (never from the audio callback itself)."""
+        while True:
+            self._reopen.wait()
+            self._reopen.clear()
+            if self._closed:
+                return
+            print("[Recorder] Input device error, reopening the stream...")
+            while not self._closed:
+                try:
+                    with self._device_lock:
+                        try:
+                            self._close_stream()
+                        except Exception:
+                            self.stream = None  # The old stream is unusable either way
+                        self._open()
+                        if self.idle == "capture" or self.recording:
+                            self.stream.start()
+                    self.reopen_count += 1
+                    count_event("recorder_reopen")
+                    break
+                except Exception as e:
+                    print(f"[Recorder] Could not reopen the input device: {e}")
+                    time.sleep(REOPEN_DELAY)
 
     def _callback(self, indata, frames, time, status):
         """
         Callback function for the sounddevice.InputStream.
 
         This function is automatically called by the InputStream whenever new audio data is available.
-        It receives a chunk of audio data from the microphone and appends it to the recording buffer.
+        It receives a chunk of audio data from the microphone and writes it into the preallocated buffer
+        while recording, or into the pre-roll ring while an armed stream is idle.
 
-        If there is a status message (e.g., an error or warning), it is printed to the console.
-        The audio data is copied and stored in self.recording for later concatenation and saving.
+        If there is a status message (e.g., an error or warning), it is printed to the console, and
+        device errors schedule a reopen (the stream cannot be closed from its own callback).
+        Writing into the buffer copies the samples without allocating, so the audio thread stays cheap.
+        In streaming mode a private copy is also handed to on_chunk, which must not block.
         """
         if status:
             print(status)  # Print any errors or warnings from the audio stream
-        self.recording.append(indata.copy())  # Store a copy of the audio chunk for later processing
\ No newline at end of file
+            if self.mode == "armed" and is_device_error(status):
+                self._reopen.set()
+        with self._lock:
+            if not self.recording:
+                if self.preroll is not None:
+                    self.preroll.write(indata)
+                return
+            self.buffer.write(indata)
+            if self.on_chunk is not None:
+                self.on_chunk(indata.copy())  # PortAudio reuses indata, so the queue needs its own copy
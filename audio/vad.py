@@ -0,0 +1,133 @@
+import numpy as np  # For vectorized per-frame energy and zero-crossing features
+from audio.clip import AudioClip  # Trimmed audio is returned as new clips (views, no copies)
+
+FRAME_MS = 30            # Analysis frame length
+ENERGY_MARGIN_DB = 12.0  # A frame is speech if it is this much louder than the estimated noise floor
+MIN_ENERGY_DBFS = -50.0  # ...and at least this loud in absolute terms
+MAX_NOISE_FLOOR_DBFS = -40.0  # Cap on the noise floor estimate, so a recording that is all speech is not dropped
+ZCR_MIN = 0.1            # Quieter frames with this zero-crossing rate or more can be fricatives ("s", "f")
+ZCR_MAX = 0.5            # Above this the frame looks like white noise rather than speech
+PADDING_MS = 200         # Speech kept on either side of detected speech so word edges are not clipped
+MIN_SPEECH_MS = 90       # Shorter bursts (clicks, key presses) are not treated as speech
+MIN_PAUSE_MS = 300       # Minimum silence to split at
+
+
+class VadResult:
+    """
+    Outcome of voice activity detection on one clip.
+
+    clip is the trimmed clip (None if no speech was found), segments is a list of
+    (start_frame, end_frame) speech regions in the original clip, and
+    original_seconds/kept_seconds/saved_seconds describe how much audio was cut.
+    """
+    def __init__(self, clip, segments, original_seconds, kept_seconds):
+        self.clip = clip
+        self.segments = segments
+        self.original_seconds = original_seconds
+        self.kept_seconds = kept_seconds
+        self.saved_seconds = original_seconds - kept_seconds
+
+    @property
+    def has_speech(self):
+        return self.clip is not None
+
+
+def frame_features(samples, fs, frame_ms=FRAME_MS):
+    """
+    Split samples into non-overlapping frames and return (energy_dbfs, zcr) arrays, one value per frame.
+    """
+    samples = np.asarray(samples).reshape(-1)
+    frame_len = max(1, int(fs * frame_ms / 1000))
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.empty(0), np.empty(0)
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_dbfs = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame_len - 1 if frame_len > 1 else 1)
+    return energy_dbfs, zcr
+
+
+def speech_mask(samples, fs, frame_ms=FRAME_MS, padding_ms=PADDING_MS, min_speech_ms=MIN_SPEECH_MS):
+    """
+    Return a boolean array with one entry per frame, True where the frame contains speech.
+    """
+    energy, zcr = frame_features(samples, fs, frame_ms)
+    if len(energy) == 0:
+        return np.zeros(0, dtype=bool)
+    # The quietest tenth of the recording is a good estimate of the room's noise floor
+    noise_floor = min(np.percentile(energy, 10), MAX_NOISE_FLOOR_DBFS)
+    threshold = max(noise_floor + ENERGY_MARGIN_DB, MIN_ENERGY_DBFS)
+    voiced = energy >= threshold
+    fricative = (energy >= threshold - ENERGY_MARGIN_DB / 2) & (zcr >= ZCR_MIN) & (zcr <= ZCR_MAX)
+    mask = voiced | fricative
+    mask = _drop_short_runs(mask, max(1, min_speech_ms // frame_ms))
+    # Extend speech regions by the padding on both sides (dilation via convolution)
+    pad = padding_ms // frame_ms
+    if pad and mask.any():
+        mask = np.convolve(mask.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+    return mask
+
+
+def speech_segments(samples, fs, frame_ms=FRAME_MS, padding_ms=PADDING_MS, min_speech_ms=MIN_SPEECH_MS):
+    """
+    Return a list of (start_frame, end_frame) sample ranges that contain speech.
+    """
+    mask = speech_mask(samples, fs, frame_ms, padding_ms, min_speech_ms)
+    frame_len = max(1, int(fs * frame_ms / 1000))
+    n_samples = len(samples)
+    return [(start * frame_len, min(end * frame_len, n_samples)) for start, end in _runs(mask)]
+
+
+def trim_silence(clip, frame_ms=FRAME_MS, padding_ms=PADDING_MS):
+    """
+    Cut leading and trailing silence from clip. Pauses between words are kept.
+    Returns a VadResult whose clip is None if the recording contains no speech.
+    """
+    samples, fs = clip.samples, clip.fs
+    original = len(samples) / fs
+    segments = speech_segments(samples, fs, frame_ms, padding_ms)
+    if not segments:
+        return VadResult(None, [], original, 0.0)
+    start, end = segments[0][0], segments[-1][1]
+    trimmed = AudioClip(samples[start:end], fs)
+    return VadResult(trimmed, segments, original, (end - start) / fs)
+
+
+def split_at_pauses(clip, max_seconds, min_pause_ms=MIN_PAUSE_MS, frame_ms=FRAME_MS):
+    """
+    Split a long clip at pauses so that each piece is at most max_seconds where possible.
+    Speech regions separated by less than min_pause_ms stay together. Returns a list of AudioClips
+    with the silence between pieces removed (an empty list if there is no speech).
+    """
+    samples, fs = clip.samples, clip.fs
+    # Padding of half a pause merges regions separated by shorter pauses
+    segments = speech_segments(samples, fs, frame_ms, padding_ms=min_pause_ms // 2)
+    max_frames = int(max_seconds * fs)
+    pieces = []
+    for start, end in segments:
+        if pieces and end - pieces[-1][0] <= max_frames:
+            pieces[-1] = (pieces[-1][0], end)
+        else:
+            pieces.append((start, end))
+    return [AudioClip(samples[start:end], fs) for start, end in pieces]
+
+
+def _runs(mask):
+    """Return (start, end) index pairs of consecutive True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _drop_short_runs(mask, min_frames):
+    """Clear True runs shorter than min_frames."""
+    if min_frames <= 1:
+        return mask
+    mask = mask.copy()
+    for start, end in _runs(mask):
+        if end - start < min_frames:
+            mask[start:end] = False
+    return mask
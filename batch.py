@@ -0,0 +1,282 @@
+"""
+Headless batch mode: run the STT -> intent -> tool pipeline over recorded WAV files.
+
+INPUT is a directory (searched recursively for *.wav) or a manifest: a .jsonl file
+with a "path" per line (optional "id" and "reference" transcript), or a text file
+with one path per line. Relative manifest paths are resolved against the manifest.
+Results are appended to --output as one JSON object per file, so an interrupted run
+resumes where it stopped when started again with the same output. At the end the
+throughput and per-stage latency percentiles are printed.
+
+--stub runs fully offline: STT returns the manifest reference or the sidecar
+transcript (recording.wav -> recording.txt), intent comes from the local classifier,
+and tools return placeholders.
+
+Usage: python batch.py INPUT [--output batch_results.jsonl] [--workers 4] [--executor thread|process]
+                             [--stub] [--tools none|run] [--intent auto|local] [--retry-errors]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing pipeline output
+import glob  # For finding WAV files
+import json  # For the manifest and the results
+import os  # For paths
+import sys  # Progress goes to stderr
+import time  # For stage timings and throughput
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait  # Bounded parallelism
+import numpy as np  # For percentiles
+from audio.clip import AudioClip  # Recordings are loaded as in-memory clips
+from audio.vad import trim_silence  # Same silence trimming as the live agent
+from audio.preprocess import prepare_for_stt, check_payload_format, PAYLOAD_FORMAT  # Same STT payload
+from transcription.engines import transcribe, register_engine, TranscriptFileEngine  # STT orchestration
+
+STAGES = ("load", "vad", "audio_preprocessing", "stt", "intent", "tool")
+STUB_ENGINE = "stub"
+PERCENTILES = (50, 90, 99)
+
+_options = {}  # Settings of this worker (set by init_worker)
+_stub_engine = None
+
+
+def load_inputs(source):
+    """Return a list of {"id", "path", "reference"} for a directory or manifest."""
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "**", "*.wav"), recursive=True))
+        return [{"id": os.path.relpath(p, source), "path": p, "reference": None} for p in paths]
+    base = os.path.dirname(os.path.abspath(source))
+    items = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            row = json.loads(line) if source.endswith(".jsonl") else {"path": line}
+            path = row["path"] if os.path.isabs(row["path"]) else os.path.join(base, row["path"])
+            items.append({"id": row.get("id", row["path"]), "path": path, "reference": row.get("reference")})
+    return items
+
+
+def load_done(output, retry_errors=False):
+    """Ids already in the output file (failed ones too, unless retry_errors)."""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Last line cut short by an interruption
+            if not (retry_errors and record.get("status") == "error"):
+                done.add(record["id"])
+    return done
+
+
+def init_worker(options):
+    """Configure a worker (thread pool: once; process pool: in every process)."""
+    global _stub_engine
+    _options.update(options)
+    if options["stub"]:
+        _stub_engine = register_engine(TranscriptFileEngine(STUB_ENGINE, latency=options["stub_latency"]))
+    if options["executor"] == "process" and not options["verbose"]:
+        sys.stdout = open(os.devnull, "w")
+
+
+@contextlib.contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def process_file(item):
+    """Run the pipeline on one recording and return its result record."""
+    options = _options
+    timings = {}
+    record = {"id": item["id"], "path": item["path"], "status": "ok", "timings": timings}
+    if item.get("reference") is not None:
+        record["reference"] = item["reference"]
+    start = time.perf_counter()
+    try:
+        with _stage(timings, "load"):
+            clip = AudioClip.from_file(item["path"])
+            record["audio_seconds"] = clip.duration
+        with _stage(timings, "vad"):
+            vad = trim_silence(clip)
+        if not vad.has_speech:
+            record["status"] = "no_speech"
+            return record
+        with _stage(timings, "audio_preprocessing"):
+            prepared = prepare_for_stt(vad.clip)
+            prepared.encoded(options["payload_format"])
+        prepared.path = item["path"]  # Lets the stub engine find the reference transcript
+        if _stub_engine is not None and item.get("reference") is not None:
+            _stub_engine.transcripts[item["path"]] = item["reference"]
+        with _stage(timings, "stt"):
+            stt = transcribe(prepared, policy=options["policy"], engines=options["engines"], fmt=options["payload_format"])
+        record["stt_engine"] = stt.engine
+        record["stt_results"] = {name: {"text": text, "latency": latency, "error": None if error is None else str(error)}
+                                 for name, (text, latency, error) in stt.results.items()}
+        if stt.text is None:
+            record["status"] = "no_transcript"
+            return record
+        record["transcript"] = stt.text
+        if item.get("reference") is not None:
+            record["wer"] = word_error_rate(item["reference"], stt.text)
+        with _stage(timings, "intent"):
+            intent_result = detect(stt.text, options)
+        record["intent"] = intent_result
+        if options["tools"] == "run":
+            with _stage(timings, "tool"):
+                record["tool"] = run_tool(intent_result, options)
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        record["total"] = time.perf_counter() - start
+    return record
+
+
+def detect(transcript, options):
+    if options["intent"] == "local":
+        from tools.local_intent import classify  # Offline
+        return classify(transcript)
+    from tools.intent import detect_intent  # Local fast path with Gemini fallback (needs GEMINI_API_KEY)
+    return detect_intent(transcript)
+
+
+def run_tool(intent_result, options):
+    """Run the chosen tool headlessly: answers and audio are recorded, never spoken or copied."""
+    intent, query = intent_result["intent"], intent_result["query"]
+    if intent == "web_search":
+        if options["stub"]:
+            return {"answer": f"[stub answer] {query}"}
+        from tools.web_search import search_duckduckgo
+        answer, record, results = search_duckduckgo(query, result_length=intent_result.get("result_length", "default"))
+        return {"answer": answer, "record": record, "links": [r["href"] for r in results]}
+    if intent == "tts":
+        from tools.tts_engines import synthesize, FakeTTS
+        if options["stub"]:
+            data = synthesize(query, engine=FakeTTS(), cache=False)
+        else:
+            data = synthesize(query)
+        return {"tts_bytes": len(data)}
+    return {"clipboard": query}
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length (case and punctuation ignored)."""
+    def words(text):
+        return "".join(c if c.isalnum() or c.isspace() else " " for c in text.lower()).split()
+    ref, hyp = words(reference), words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def summarize(records, elapsed, out=sys.stderr):
+    """Print throughput, outcomes and per-stage latency percentiles for this run."""
+    if not records:
+        print("No files processed.", file=out)
+        return
+    audio = sum(r.get("audio_seconds", 0.0) for r in records)
+    statuses = {}
+    for r in records:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    print(f"\nProcessed {len(records)} files in {elapsed:.1f}s: {len(records) / elapsed:.2f} files/s, "
+          f"{audio / elapsed:.1f}s of audio per second", file=out)
+    print("Outcomes: " + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())), file=out)
+    wers = [r["wer"] for r in records if "wer" in r]
+    if wers:
+        print(f"Mean WER against references: {np.mean(wers):.1%} ({len(wers)} files)", file=out)
+    header = "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+    print(f"{'stage':<20}{'count':>7}{header}{'max':>9}", file=out)
+    for stage in STAGES + ("total",):
+        values = [r["total"] if stage == "total" else r["timings"][stage]
+                  for r in records if stage == "total" or stage in r["timings"]]
+        if not values:
+            continue
+        cells = "".join(f"{v:>8.3f}s" for v in np.percentile(values, PERCENTILES))
+        print(f"{stage:<20}{len(values):>7}{cells}{max(values):>8.3f}s", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="Directory of WAV files, or a manifest (.jsonl or one path per line)")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file (appended to; used to resume)")
+    parser.add_argument("--workers", type=int, default=4, help="Files processed in parallel")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="Thread pool (API-bound runs) or process pool (CPU-bound, e.g. --stub)")
+    parser.add_argument("--stub", action="store_true", help="Offline: reference/sidecar transcripts, local intent, placeholder tools")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated STT latency in --stub mode")
+    parser.add_argument("--policy", default=None, help="STT policy (default: STT_POLICY, 'single' with --stub)")
+    parser.add_argument("--engines", default=None, help="Comma-separated STT engines (default: STT_ENGINES)")
+    parser.add_argument("--intent", choices=("auto", "local"), default="auto",
+                        help="auto: local classifier with Gemini fallback; local: offline only")
+    parser.add_argument("--tools", choices=("none", "run"), default="none", help="Also run the detected tool")
+    parser.add_argument("--retry-errors", action="store_true", help="Reprocess files that failed in an earlier run")
+    parser.add_argument("--limit", type=int, default=None, help="Process at most this many new files")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    options = {
+        "stub": args.stub,
+        "stub_latency": args.stub_latency_ms / 1000,
+        "policy": args.policy or ("single" if args.stub else None),
+        "engines": [STUB_ENGINE] if args.stub else (args.engines.split(",") if args.engines else None),
+        "intent": "local" if args.stub else args.intent,
+        "tools": args.tools,
+        "payload_format": check_payload_format(PAYLOAD_FORMAT),
+        "executor": args.executor,
+        "verbose": args.verbose,
+    }
+    items = load_inputs(args.input)
+    done = load_done(args.output, args.retry_errors)
+    todo = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} files, {len(items) - len(todo)} already in {args.output}, {len(todo)} to process", file=sys.stderr)
+    todo = todo[:args.limit]
+
+    if args.executor == "process":
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(options,))
+    else:
+        init_worker(options)
+        pool = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="batch")
+    records = []
+    start = time.perf_counter()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        with open(args.output, "a", encoding="utf-8") as out, quiet:
+            pending = set()
+            queue = iter(todo)
+            while True:
+                # Keep at most two files per worker in flight, so huge corpora are not all queued at once
+                for item in queue:
+                    pending.add(pool.submit(process_file, item))
+                    if len(pending) >= args.workers * 2:
+                        break
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()  # Each finished file survives an interruption
+                    records.append(record)
+                    print(f"[{len(records)}/{len(todo)}] {record['status']:<13} {record['id']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\nInterrupted; run again with the same --output to resume.", file=sys.stderr)
+        pool.shutdown(wait=False, cancel_futures=True)
+    else:
+        pool.shutdown()
+    summarize(records, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+End-to-end latency of the agent: fixture utterances replayed through process_audio.
+
+Every remote service is replaced by a deterministic local stand-in with injected
+latency and jitter (seeded, so runs are repeatable): STT engines (registered under
+the names in STT_ENGINES), Gemini (intent JSON and streamed answers), DuckDuckGo,
+the web pages (a local HTTP server, scraped and extracted for real) and gTTS
+synthesis and playback. Everything else - VAD, preprocessing, the scheduler,
+speculation, ranking, sentence streaming - is the real code.
+
+For each scenario it reports the median over --runs of the time to transcript, time
+to first audio, total time, and the time spent in every stage (span). Results are
+compared against the stored baseline; a metric more than --threshold slower (and by
+at least --min-delta-ms) is a regression and makes the exit status 1.
+--save-baseline stores the current results as the new baseline.
+
+Usage: python -m bench.end_to_end [--runs 3] [--scale 1.0] [--latency gemini=500] [--save-baseline]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing the pipeline's output
+import io  # For silencing the pipeline's output
+import json  # For the baseline
+import os  # For configuration via environment variables
+import random  # For seeded jitter
+import shutil  # For removing the scratch directory
+import sys  # For the exit status
+import tempfile  # Caches and saved results go to a scratch directory
+import threading  # For the stand-in HTTP server
+import time  # For the stand-ins' delays
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Local stand-in for the web pages
+import numpy as np  # For medians and fixture audio
+from audio.clip import AudioClip  # Fixtures are in-memory clips
+from bench.fixtures import FS, room_noise, synthetic_speech  # Deterministic speech-like audio
+from transcription import engines  # Stand-in engines replace the registered ones
+from utils.clients import set_client  # Stand-in Gemini, DuckDuckGo and HTTP clients
+from utils.scheduler import Scheduler  # Runs process_audio as the agent does
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "data", "end_to_end_baseline.json")
+
+# (name, seconds of speech, transcript, intent decided by Gemini rather than locally);
+# the transcript decides the path through the pipeline
+SCENARIOS = [
+    ("web_search_short", 2.5, "search the web for the boiling point of water on mount everest, make it short", False),
+    ("web_search_gemini_intent", 2.0, "how high does water boil up on everest these days", True),
+    ("read_aloud", 3.0, "read this aloud the team meeting has moved to thursday at three", False),
+    ("dictation", 6.0, "note for the design review we agreed to ship the new onboarding flow next sprint "
+                       "and revisit pricing afterwards", False),
+]
+
+# Injected latency per stand-in, in milliseconds: (mean, jitter); each call takes mean +- jitter
+LATENCIES_MS = {
+    "stt": (900, 200),       # Each STT engine (the second registered engine is 20% slower)
+    "gemini": (350, 80),     # Gemini round trip before the first token
+    "ddg": (300, 60),        # DuckDuckGo search
+    "http": (250, 100),      # Each web page
+    "tts": (180, 40),        # gTTS synthesis of one sentence
+}
+PLAYBACK_MS_PER_CHAR = 2.0  # Stand-in playback length
+
+
+class Latency:
+    """Seeded source of delays: mean +- jitter seconds, uniformly distributed."""
+    def __init__(self, mean, jitter, seed):
+        self.mean = mean
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            offset = self._rng.uniform(-1.0, 1.0)
+        return max(0.0, self.mean + offset * self.jitter)
+
+
+class StandInSTT(engines.STTEngine):
+    """Returns the scenario's transcript after an injected delay; honors cancel_event."""
+    def __init__(self, name, latency):
+        self.name = name
+        self.latency = latency
+        self.text = None
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        delay = self.latency()
+        if cancel_event is not None:
+            if cancel_event.wait(delay):
+                return None
+        else:
+            time.sleep(delay)
+        return self.text
+
+
+class StandInDDGS:
+    """DuckDuckGo stand-in whose hits point at the local page server."""
+    def __init__(self, base_url, latency):
+        self.base_url = base_url
+        self.latency = latency
+
+    def text(self, query, max_results=3):
+        time.sleep(self.latency())
+        return [{"title": f"Stand-in result {i}", "href": f"{self.base_url}/page{i}", "body": query}
+                for i in range(max_results)]
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    pages = {}
+    latency = None
+
+    def do_GET(self):
+        time.sleep(self.latency())
+        body = self.pages.get(self.path.rsplit("/", 1)[-1])
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_page_server(latency):
+    """Serve synthetic article pages (with the Everest facts) on a free localhost port."""
+    from bench.search_answer import QUESTIONS, synthetic_pages
+    texts = synthetic_pages(QUESTIONS[0][1], seed=0)
+    PageHandler.latency = latency
+    PageHandler.pages = {
+        url.rsplit("/", 1)[-1]: ("<html><head><title>Stand-in</title></head><body><article>"
+                                 + "".join(f"<p>{p}</p>" for p in text.split("\n\n"))
+                                 + "</article></body></html>").encode("utf-8")
+        for url, text in texts.items()
+    }
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def make_gemini(latency):
+    """Gemini stand-in: intent prompts get the local classifier's answer as JSON, the rest streamed text."""
+    from bench.search_answer import FakeGeminiModel, _Response
+    from tools.local_intent import classify
+
+    class StandInGemini(FakeGeminiModel):
+        def generate_content(self, prompt, stream=False, request_options=None):
+            self.rtt = latency()
+            if "intent classifier" in prompt:
+                guess = classify(prompt.rsplit("\nUser: ", 1)[-1].strip())
+                time.sleep(self.rtt)
+                result = {"intent": guess["intent"], "query": guess["query"], "result_length": guess["result_length"]}
+                return _Response(json.dumps(result), len(prompt) // 4)
+            return super().generate_content(prompt, stream=stream)
+
+    return StandInGemini()
+
+
+class Player:
+    """Stand-in speaker: records when the first audio of the utterance started playing."""
+    def __init__(self, tts):
+        self.tts = tts
+        self.first_ns = None
+
+    def play(self, data, stop_event=None):
+        if self.first_ns is None:
+            self.first_ns = time.perf_counter_ns()
+        return self.tts.play(data, stop_event)
+
+
+def fixture_clip(seconds, seed):
+    samples = np.concatenate([room_noise(0.4, seed=seed), synthetic_speech(seconds, seed=seed),
+                              room_noise(0.6, seed=seed + 100)])
+    return AudioClip(samples.reshape(-1, 1), FS)
+
+
+def setup(latencies, scale, jitter, seed, scratch):
+    """Configure the agent for offline runs and install every stand-in. Returns (stt engines, player)."""
+    os.environ["AGENT_CACHE_PATH"] = os.path.join(scratch, "cache.sqlite3")
+    os.environ["TTS_CACHE_DIR"] = ""
+    os.environ["INTENT_LOG_PATH"] = ""
+    os.environ["INTENT_SHADOW_RATE"] = "0"
+    os.environ["SEARCH_ARCHIVE_DIR"] = os.path.join(scratch, "archive")
+    from tools import web_search  # Imported here: reads the environment on import
+    from tools.tts_engines import FakeTTS, register_tts_engine, TTS_ENGINE
+
+    def latency(name, factor=1.0, offset=0):
+        mean, spread = latencies[name]
+        return Latency(mean * factor * scale / 1000, spread * jitter * scale / 1000, seed + offset)
+
+    stt = []
+    for i, name in enumerate(engines.STT_ENGINES):
+        stt.append(engines.register_engine(StandInSTT(name, latency("stt", 1.0 + 0.2 * i, i))))
+    gemini = make_gemini(latency("gemini", offset=10))
+    set_client(("gemini", web_search.GEMINI_MODEL), gemini)
+    set_client(("gemini", "gemini-2.0-flash-lite"), gemini)
+    _, base_url = start_page_server(latency("http", offset=20))
+    set_client("ddgs", StandInDDGS(base_url, latency("ddg", offset=30)))
+
+    class StandInTTS(FakeTTS):
+        def __init__(self):
+            super().__init__(seconds_per_char=PLAYBACK_MS_PER_CHAR * scale / 1000, name=TTS_ENGINE)
+            self.delay = latency("tts", offset=40)
+
+        def synthesize(self, text, lang="en"):
+            self.synth_delay = self.delay()
+            return super().synthesize(text, lang)
+
+    tts = StandInTTS()
+    register_tts_engine(tts)
+    return stt, tts
+
+
+def run_utterance(scheduler, process_audio, clip, transcript, gemini_intent, stt, tts):
+    """Run one utterance and return its metrics in seconds."""
+    from tools import intent
+    from utils.benchmark import clear_benchmark_data
+    from utils.cache import get_cache
+    from utils.tracing import spans
+    from tools.tts_engines import get_synthesis_cache
+    from tools.web_search import wait_for_summaries
+    clear_benchmark_data()
+    get_cache().clear()  # Every run pays for search, scraping and synthesis, as a first question would
+    get_synthesis_cache().clear()
+    for engine in stt:
+        engine.text = transcript
+    player = Player(tts)
+    threshold = intent.LOCAL_INTENT_THRESHOLD
+    if gemini_intent:
+        intent.LOCAL_INTENT_THRESHOLD = 1.01  # Above 1 always asks Gemini
+    try:
+        job = scheduler.submit(process_audio, clip, play=player.play, copy=lambda text: None)
+        job.result()
+        wait_for_summaries()
+    finally:
+        intent.LOCAL_INTENT_THRESHOLD = threshold
+    records = spans()
+    root = next(r for r in records if r["name"] == "total_processing" and r.get("attrs", {}).get("job") == job.id)
+    trace = [r for r in records if r["trace_id"] == root["trace_id"]]
+    start = root["start_ns"]
+    metrics = {"total": root["duration_ns"] / 1e9}
+    for r in trace:
+        if r["name"] in ("stt_race", "stt_compare", "stt_hedged", "stt_single"):
+            metrics["time_to_transcript"] = (r["start_ns"] + r["duration_ns"] - start) / 1e9
+        if r is not root:
+            metrics[f"stage:{r['name']}"] = metrics.get(f"stage:{r['name']}", 0.0) + r["duration_ns"] / 1e9
+    if player.first_ns is not None:
+        metrics["time_to_first_audio"] = (player.first_ns - start) / 1e9
+    return metrics
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Return a list of (scenario, metric, baseline s, current s, change) for regressions."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(scenario, {}).get(metric)
+            if before is None or before <= 0:
+                continue
+            if value > before * (1 + threshold) and value - before >= min_delta:
+                regressions.append((scenario, metric, before, value, value / before - 1))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Runs per scenario (the median is reported)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every injected latency")
+    parser.add_argument("--jitter", type=float, default=1.0, help="Multiply every injected jitter (0 for none)")
+    parser.add_argument("--latency", action="append", default=[], metavar="NAME=MS",
+                        help=f"Override a mean latency ({', '.join(LATENCIES_MS)})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the injected jitter")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=25.0, help="Smaller slowdowns are ignored (noise)")
+    args = parser.parse_args()
+    latencies = dict(LATENCIES_MS)
+    for override in args.latency:
+        name, ms = override.split("=")
+        latencies[name] = (float(ms), latencies[name][1])
+
+    scratch = tempfile.mkdtemp(prefix="bench_end_to_end_")
+    with contextlib.redirect_stdout(io.StringIO()):
+        stt, tts = setup(latencies, args.scale, args.jitter, args.seed, scratch)
+        from pipeline import process_audio  # Imported after setup(): tools read the environment on import
+    scheduler = Scheduler("queue")
+    results = {}
+    for i, (name, seconds, transcript, gemini_intent) in enumerate(SCENARIOS):
+        clip = fixture_clip(seconds, seed=i)
+        runs = []
+        for _ in range(args.runs):
+            with contextlib.redirect_stdout(io.StringIO()):
+                runs.append(run_utterance(scheduler, process_audio, clip, transcript, gemini_intent, stt, tts))
+        keys = sorted({key for run in runs for key in run})
+        results[name] = {key: float(np.median([run[key] for run in runs if key in run])) for key in keys}
+    scheduler.shutdown()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{len(SCENARIOS)} scenarios x {args.runs} runs, latency scale {args.scale}, jitter x{args.jitter} (medians)")
+    print(f"{'scenario':<26} {'transcript':>10} {'first audio':>12} {'total':>8}")
+    for name, metrics in results.items():
+        first_audio = metrics.get("time_to_first_audio")
+        print(f"{name:<26} {metrics.get('time_to_transcript', 0.0):>9.3f}s "
+              f"{'-' if first_audio is None else f'{first_audio:.3f}s':>12} {metrics['total']:>7.3f}s")
+    print("\nTime per stage:")
+    stages = sorted({key for metrics in results.values() for key in metrics if key.startswith("stage:")})
+    print(f"{'stage':<30}" + "".join(f"{name[:14]:>15}" for name in results))
+    for stage in stages:
+        cells = "".join(f"{results[name][stage]:>14.3f}s" if stage in results[name] else f"{'-':>15}" for name in results)
+        print(f"{stage[6:]:<30}{cells}")
+
+    config = {"latencies_ms": latencies, "scale": args.scale, "jitter": args.jitter, "runs": args.runs,
+              "seed": args.seed, "playback_ms_per_char": PLAYBACK_MS_PER_CHAR}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"config": config, "results": results}, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if json.loads(json.dumps(config)) != baseline.get("config"):
+        print("\nWarning: the baseline was recorded with different stand-in settings; the comparison may not be meaningful.")
+    regressions = compare(results, baseline["results"], args.threshold, args.min_delta_ms / 1000)
+    if not regressions:
+        print(f"\nNo regressions against the baseline (threshold {args.threshold:.0%}).")
+        return
+    print(f"\n{len(regressions)} regression(s) against the baseline (threshold {args.threshold:.0%}):")
+    for scenario, metric, before, value, change in regressions:
+        print(f"  {scenario} {metric}: {before:.3f}s -> {value:.3f}s (+{change:.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
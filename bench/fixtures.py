@@ -0,0 +1,55 @@
+"""
+Deterministic audio fixtures for the benchmarks, so they run without recordings.
+
+Real recordings can be used instead by pointing a benchmark at a directory of WAV files.
+"""
+import glob  # For listing fixture directories
+import os  # For path handling
+import numpy as np  # For synthesizing speech-like audio
+from audio.clip import AudioClip  # Fixtures are returned as in-memory clips
+
+FS = 44100
+
+# (name, seconds of speech, seconds of leading silence, seconds of trailing silence)
+SYNTHETIC = [
+    ("short_question", 1.5, 0.4, 0.6),
+    ("dictation", 6.0, 0.3, 0.8),
+    ("long_explanation", 15.0, 0.5, 1.0),
+]
+
+
+def synthetic_speech(seconds, fs=FS, seed=0):
+    """
+    Speech-like int16 audio: voiced harmonics with a syllable-rate envelope and
+    short noise bursts standing in for fricatives.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fs)) / fs
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / fs
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    fricatives = rng.standard_normal(len(t)) * (np.sin(2 * np.pi * 1.3 * t) > 0.9)
+    audio = 0.25 * voiced * envelope + 0.05 * fricatives
+    return (audio / np.max(np.abs(audio)) * 12000).astype(np.int16)
+
+
+def room_noise(seconds, fs=FS, seed=0):
+    """Low-level background noise."""
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * fs)) * 20).astype(np.int16)
+
+
+def load_fixtures(directory=None):
+    """
+    Return a list of (name, AudioClip). Reads every *.wav in directory if given,
+    otherwise synthesizes the SYNTHETIC set.
+    """
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "*.wav")))
+        return [(os.path.splitext(os.path.basename(p))[0], AudioClip.from_file(p)) for p in paths]
+    fixtures = []
+    for i, (name, speech, lead, trail) in enumerate(SYNTHETIC):
+        samples = np.concatenate([room_noise(lead, seed=i), synthetic_speech(speech, seed=i), room_noise(trail, seed=i + 100)])
+        fixtures.append((name, AudioClip(samples.reshape(-1, 1), FS)))
+    return fixtures
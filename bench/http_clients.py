@@ -0,0 +1,74 @@
+"""
+Fresh connection per request vs the shared keep-alive session, against a local HTTP stand-in.
+
+The stand-in server charges --handshake-ms for every new connection, standing in for
+the TCP + TLS setup to a remote host, and --latency-ms for every request.
+
+Usage: python -m bench.http_clients [--requests 50] [--handshake-ms 40] [--latency-ms 5]
+"""
+import argparse  # For command line options
+import threading  # For running the stand-in server
+import time  # For simulated server latency
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Local HTTP stand-in
+import requests  # The per-request client used before the shared session
+from utils.benchmark import benchmark_block, print_benchmark_summary  # For before/after numbers
+from utils.clients import get_http_session  # The shared session under test
+
+PAGE = b"<html><body><article><p>" + b"Local stand-in page. " * 200 + b"</p></article></body></html>"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like real sites
+    disable_nagle_algorithm = True  # Otherwise delayed ACKs dominate the timings
+    handshake = 0.0
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        time.sleep(self.handshake)  # Once per connection
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(handshake, latency):
+    """Start the stand-in server on a free localhost port and return (server, base_url)."""
+    StandInHandler.handshake = handshake
+    StandInHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50, help="Requests per client variant")
+    parser.add_argument("--handshake-ms", type=float, default=40.0, help="Simulated connection setup cost")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated per-request server time")
+    args = parser.parse_args()
+    server, base_url = start_server(args.handshake_ms / 1000, args.latency_ms / 1000)
+    urls = [f"{base_url}/page/{i}" for i in range(args.requests)]
+    try:
+        with benchmark_block(f"fresh_connection_x{args.requests}"):
+            for url in urls:
+                requests.get(url, timeout=10).raise_for_status()
+        session = get_http_session()
+        with benchmark_block(f"shared_session_x{args.requests}"):
+            for url in urls:
+                session.get(url, timeout=10).raise_for_status()
+    finally:
+        server.shutdown()
+    print_benchmark_summary()
+
+
+if __name__ == "__main__":
+    main()
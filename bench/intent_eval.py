@@ -0,0 +1,86 @@
+"""
+Offline evaluation of the local intent classifier.
+
+Reports, for a range of thresholds, how many utterances the local classifier would
+decide on its own (coverage) and how accurate those decisions are, plus the cost
+of a local decision. --gemini also asks Gemini about every utterance (needs
+GEMINI_API_KEY) and reports agreement. --log summarizes agreement by confidence
+from a live decision log (logs/intent_decisions.jsonl).
+
+Usage: python -m bench.intent_eval [--data bench/data/intent_eval.jsonl] [--gemini] [--log PATH]
+"""
+import argparse  # For command line options
+import json  # For reading the data and log files
+import os  # For the default data path
+import time  # For per-decision cost
+from tools.local_intent import classify, load_examples  # The classifier under test
+
+DEFAULT_DATA = os.path.join(os.path.dirname(__file__), "data", "intent_eval.jsonl")
+THRESHOLDS = (0.5, 0.7, 0.8, 0.9, 0.95)
+
+
+def evaluate(rows, thresholds=THRESHOLDS):
+    predictions = []
+    start = time.perf_counter()
+    for text, _ in rows:
+        predictions.append(classify(text))
+    per_call_us = (time.perf_counter() - start) / max(1, len(rows)) * 1e6
+    print(f"{len(rows)} utterances, {per_call_us:.1f}us per local decision")
+    print(f"{'threshold':>9}  {'coverage':>8}  {'accuracy':>8}")
+    for threshold in thresholds:
+        decided = [(p, intent) for p, (_, intent) in zip(predictions, rows) if p["confidence"] >= threshold]
+        correct = sum(p["intent"] == intent for p, intent in decided)
+        accuracy = correct / len(decided) if decided else float("nan")
+        print(f"{threshold:>9.2f}  {len(decided) / len(rows):>8.0%}  {accuracy:>8.1%}")
+    mistakes = [(text, intent, p) for p, (text, intent) in zip(predictions, rows) if p["intent"] != intent]
+    if mistakes:
+        print("Misclassified:")
+        for text, intent, p in mistakes:
+            print(f"  {intent} -> {p['intent']} ({p['confidence']:.2f}): {text}")
+    return predictions
+
+
+def compare_with_gemini(rows, predictions):
+    from tools.intent import detect_intent_with_gemini  # Needs GEMINI_API_KEY
+    agree = 0
+    for (text, _), local in zip(rows, predictions):
+        try:
+            gemini = detect_intent_with_gemini(text)
+        except Exception as e:
+            print(f"Gemini failed on {text!r}: {e}")
+            continue
+        agree += gemini["intent"] == local["intent"]
+    print(f"Agreement with Gemini: {agree / len(rows):.1%} of {len(rows)}")
+
+
+def summarize_log(path):
+    buckets = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for entry in map(json.loads, filter(str.strip, f)):
+            if entry.get("gemini") is None:
+                continue
+            bucket = min(int(entry["local"]["confidence"] * 10), 9) / 10
+            agree, total = buckets.get(bucket, (0, 0))
+            buckets[bucket] = (agree + (entry["local"]["intent"] == entry["gemini"]["intent"]), total + 1)
+    print(f"Agreement with Gemini by local confidence ({path}):")
+    for bucket in sorted(buckets):
+        agree, total = buckets[bucket]
+        print(f"  {bucket:.1f}-{bucket + 0.1:.1f}: {agree / total:6.1%} of {total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data", default=DEFAULT_DATA, help="JSONL file with 'text' and 'intent' fields")
+    parser.add_argument("--gemini", action="store_true", help="Also compare every utterance with Gemini")
+    parser.add_argument("--log", help="Summarize a decision log written by tools.intent")
+    args = parser.parse_args()
+    rows = load_examples(args.data)
+    predictions = evaluate(rows)
+    if args.gemini:
+        compare_with_gemini(rows, predictions)
+    if args.log:
+        summarize_log(args.log)
+
+
+if __name__ == "__main__":
+    main()
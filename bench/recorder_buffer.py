@@ -0,0 +1,141 @@
+"""
+Microbenchmark for the recorder's audio callback.
+
+Feeds synthetic 44.1 kHz int16 callbacks into the old list-of-copies approach and
+into AudioBuffer, and reports numpy buffer allocations made by the callbacks,
+how often the arena grew (and how many of those blocks the callback had to allocate
+itself), peak memory (including the final copy), callback cost and jitter, and the
+time stop() needs to produce the final array. By default it records 10 s (fits the
+preallocated 30 s) and 60 s (needs the arena to grow).
+
+Usage: python -m bench.recorder_buffer [--seconds 10 60] [--blocksize 512] [--realtime]
+"""
+import argparse  # For command line options
+import statistics  # For mean/stdev of callback timings
+import time  # For perf_counter timings and real-time pacing
+import tracemalloc  # For counting allocations made by the callback
+import numpy as np  # For synthetic audio
+from audio.buffer import AudioBuffer  # The preallocated arena under test
+
+FS = 44100  # Same as audio.recorder.FS (not imported so the benchmark runs without sounddevice)
+INITIAL_SECONDS = 30  # Same as audio.recorder.INITIAL_SECONDS
+
+
+class ListRecorder:
+    """The original approach: copy every chunk into a list and concatenate on stop."""
+    def __init__(self):
+        self.recording = []
+
+    def callback(self, indata):
+        self.recording.append(indata.copy())
+
+    def finish(self):
+        return np.concatenate(self.recording, axis=0)
+
+    def growth(self):
+        return None
+
+
+class BufferRecorder:
+    """The current approach: write every chunk into a preallocated AudioBuffer."""
+    def __init__(self, fs):
+        self.buffer = AudioBuffer(INITIAL_SECONDS * fs)
+
+    def callback(self, indata):
+        self.buffer.write(indata)
+
+    def finish(self):
+        return self.buffer.detach()
+
+    def growth(self):
+        return self.buffer.grow_count, self.buffer.inline_allocations
+
+
+def run(make_recorder, seconds, blocksize, fs, realtime):
+    n_callbacks = int(seconds * fs / blocksize)
+    chunk = (np.random.default_rng(0).standard_normal((blocksize, 1)) * 1000).astype(np.int16)
+    period = blocksize / fs
+
+    # Pass 1: callback timings, without tracemalloc overhead
+    recorder = make_recorder()
+    durations = [0.0] * n_callbacks
+    lateness = [0.0] * n_callbacks if realtime else None
+    start = time.perf_counter()
+    for i in range(n_callbacks):
+        if realtime:
+            due = start + i * period
+            while time.perf_counter() < due:
+                time.sleep(0)
+            lateness[i] = time.perf_counter() - due
+        t0 = time.perf_counter()
+        recorder.callback(chunk)
+        durations[i] = time.perf_counter() - t0
+        time.sleep(0)  # Between callbacks PortAudio's thread does not hold the GIL, so other threads run
+    t0 = time.perf_counter()
+    recorder.finish()
+    finish_time = time.perf_counter() - t0
+
+    # Pass 2: allocations and peak memory
+    recorder = None
+    tracemalloc.start(16)
+    base_current, _ = tracemalloc.get_traced_memory()
+    recorder = make_recorder()
+    before = tracemalloc.take_snapshot()
+    for _ in range(n_callbacks):
+        recorder.callback(chunk)
+        time.sleep(0)
+    after = tracemalloc.take_snapshot()
+    growth = recorder.growth()
+    audio = recorder.finish()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # numpy sample buffers are traced in numpy's own domain. Only allocations made from this file's
+    # callbacks count (not a helper thread's), and grouping by traceback keeps a buffer that replaced
+    # one freed elsewhere (e.g. an arena that grew) from cancelling out
+    def callback_only(snapshot):
+        snapshot = snapshot.filter_traces([tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)])
+        return snapshot.filter_traces([tracemalloc.Filter(True, __file__, all_frames=True)])
+
+    allocations = sum(
+        max(0, s.count_diff) for s in callback_only(after).compare_to(callback_only(before), "traceback")
+    )
+
+    durations.sort()
+    return {
+        "frames": len(audio),
+        "allocations": allocations,
+        "growth": growth,
+        "peak_mb": (peak - base_current) / 1e6,
+        "mean_us": statistics.mean(durations) * 1e6,
+        "p99_us": durations[int(len(durations) * 0.99) - 1] * 1e6,
+        "max_us": durations[-1] * 1e6,
+        "jitter_us": statistics.pstdev(durations) * 1e6,
+        "finish_ms": finish_time * 1e3,
+        "late_max_us": max(lateness) * 1e6 if lateness else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10.0, 60.0],
+                        help="Lengths of the synthetic recordings")
+    parser.add_argument("--blocksize", type=int, default=512, help="Frames per callback")
+    parser.add_argument("--realtime", action="store_true", help="Pace callbacks at the real 44.1 kHz rate")
+    args = parser.parse_args()
+    for seconds in args.seconds:
+        print(f"{seconds:.0f}s at {FS} Hz, {args.blocksize} frames per callback "
+              f"(arena preallocated for {INITIAL_SECONDS}s)")
+        for name, make_recorder in (("list+concatenate", ListRecorder), ("AudioBuffer", lambda: BufferRecorder(FS))):
+            r = run(make_recorder, seconds, args.blocksize, FS, args.realtime)
+            grown = "-" if r["growth"] is None else f"{r['growth'][0]} ({r['growth'][1]} in callback)"
+            line = (f"{name:>17}: sample allocations={r['allocations']:>6}  grew={grown:<17} "
+                    f"peak={r['peak_mb']:7.2f} MB  "
+                    f"callback mean={r['mean_us']:5.2f}us p99={r['p99_us']:5.2f}us max={r['max_us']:8.2f}us "
+                    f"jitter(stdev)={r['jitter_us']:5.2f}us  stop={r['finish_ms']:6.2f}ms")
+            if r["late_max_us"] is not None:
+                line += f"  max lateness={r['late_max_us']:.1f}us"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
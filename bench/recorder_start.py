@@ -0,0 +1,170 @@
+"""
+Record-start latency and clipped first words, per recorder mode, with a fake input device.
+
+A fake input stream stands in for sounddevice: opening it takes --open-ms, starting it
+--start-ms, and it then delivers real-time callbacks. The "user" starts speaking --lead-ms
+before pressing the hotkey, so in every utterance some speech precedes start(). For each
+mode it reports how long start() took, how much speech is missing from the recording
+(its start, plus up to one block not yet delivered at the end), and the callbacks per
+second while idle. A last run injects a device error
+and checks that the armed stream is reopened and keeps recording. No microphone needed.
+
+Usage: python -m bench.recorder_start [--utterances 5] [--open-ms 150] [--start-ms 30] [--lead-ms 100]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing the recorder's reopen messages
+import io  # For silencing the recorder's reopen messages
+import threading  # The fake device delivers callbacks on its own thread
+import time  # For pacing and timings
+import numpy as np  # For the fake audio
+from audio.recorder import AudioRecorder, FS  # Recorder under test
+from utils.benchmark import benchmark_data, benchmark_counters, clear_benchmark_data  # Start latency is recorded by the recorder
+
+BLOCKSIZE = 512
+SPEECH = 1000   # Sample value while the user speaks (silence is 0)
+MODES = (("per_recording", "capture"), ("armed", "pause"), ("armed", "capture"))
+
+
+class DeviceError:
+    """Callback status for a device that stopped delivering input (like sounddevice.CallbackFlags)."""
+    input_underflow = True
+
+    def __bool__(self):
+        return True
+
+    def __str__(self):
+        return "input underflow"
+
+
+class FakeInputStream:
+    """
+    Behaves like sounddevice.InputStream for AudioRecorder: open and start take time,
+    then the callback is called every BLOCKSIZE frames at the real-time rate.
+    """
+    def __init__(self, device, callback, finished_callback):
+        time.sleep(device.open_seconds)
+        self.device = device
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._deliver, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        if self.finished_callback is not None:
+            self.finished_callback()
+
+    def close(self):
+        self._running.clear()
+
+    def _deliver(self):
+        time.sleep(self.device.start_seconds)
+        first = time.perf_counter()  # Time of the first sample
+        frames = 0
+        while self._running.is_set():
+            due = first + (frames + BLOCKSIZE) / FS
+            time.sleep(max(0.0, due - time.perf_counter()))
+            # Each sample is speech if the user was speaking when it was captured
+            t = first + (frames + np.arange(BLOCKSIZE)) / FS
+            chunk = np.where(t >= self.device.speech_from, SPEECH, 0).astype(np.int16).reshape(-1, 1)
+            status = None
+            if self.device.fail.is_set():
+                self.device.fail.clear()
+                status = DeviceError()
+            if self.callback is not None:
+                self.callback(chunk, BLOCKSIZE, None, status)
+                self.device.callbacks += 1
+            frames += BLOCKSIZE
+
+
+class FakeDevice:
+    """Stream factory for AudioRecorder; also tells the fake streams when speech starts."""
+    def __init__(self, open_seconds, start_seconds):
+        self.open_seconds = open_seconds
+        self.start_seconds = start_seconds
+        self.speech_from = float("inf")
+        self.callbacks = 0
+        self.opened = 0
+        self.fail = threading.Event()
+
+    def __call__(self, samplerate, channels, dtype, callback, finished_callback):
+        self.opened += 1
+        return FakeInputStream(self, callback, finished_callback)
+
+
+def utterance(recorder, device, lead, speak):
+    """Speak for lead seconds before pressing the hotkey and speak seconds after; return clipped seconds."""
+    device.speech_from = time.perf_counter()
+    time.sleep(lead)
+    recorder.start()
+    time.sleep(speak)
+    spoken = time.perf_counter() - device.speech_from
+    clip = recorder.stop()
+    device.speech_from = float("inf")
+    captured = np.count_nonzero(clip.samples) / FS if clip is not None else 0.0
+    return max(0.0, spoken - captured)
+
+
+def run_mode(mode, idle, args):
+    clear_benchmark_data()
+    device = FakeDevice(args.open_ms / 1000, args.start_ms / 1000)
+    recorder = AudioRecorder(mode=mode, idle=idle, stream_factory=device)
+    recorder.warm_up()
+    time.sleep(0.5)  # Idle until the first hotkey press
+    device.callbacks = 0
+    idle_start = time.perf_counter()
+    time.sleep(0.5)
+    idle_rate = device.callbacks / (time.perf_counter() - idle_start)
+    clipped = [utterance(recorder, device, args.lead_ms / 1000, args.speak_ms / 1000) for _ in range(args.utterances)]
+    recorder.close()
+    latency = benchmark_data["recorder_start_latency"]
+    print(f"{mode + ' / ' + idle if mode == 'armed' else mode:16} start() p50 {latency.percentile(50) * 1000:6.1f} ms  "
+          f"max {latency.max * 1000:6.1f} ms   speech clipped {np.mean(clipped) * 1000:6.1f} ms avg  "
+          f"{max(clipped) * 1000:6.1f} ms max   idle {idle_rate:5.1f} callbacks/s   streams opened {device.opened}")
+
+
+def run_device_error(args):
+    clear_benchmark_data()
+    device = FakeDevice(args.open_ms / 1000, args.start_ms / 1000)
+    recorder = AudioRecorder(mode="armed", idle="capture", stream_factory=device)
+    recorder.arm()
+    device.speech_from = time.perf_counter()
+    recorder.start()
+    time.sleep(0.2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        device.fail.set()
+        deadline = time.perf_counter() + 5
+        while recorder.reopen_count == 0 and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.3)
+    clip = recorder.stop()
+    recorder.close()
+    seconds = len(clip.samples) / FS if clip is not None else 0.0
+    print(f"device error: reopened {recorder.reopen_count} time(s) "
+          f"(recorder_reopen counter {benchmark_counters.get('recorder_reopen', 0)}), "
+          f"streams opened {device.opened}, {seconds:.2f}s recorded across the reopen")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--utterances", type=int, default=5, help="Utterances per mode")
+    parser.add_argument("--open-ms", type=float, default=150, help="Time the fake device takes to open")
+    parser.add_argument("--start-ms", type=float, default=30, help="Time from stream start to the first callback")
+    parser.add_argument("--lead-ms", type=float, default=100, help="Speech before the hotkey press")
+    parser.add_argument("--speak-ms", type=float, default=400, help="Speech after the hotkey press")
+    args = parser.parse_args()
+    for mode, idle in MODES:
+        run_mode(mode, idle, args)
+    run_device_error(args)
+
+
+if __name__ == "__main__":
+    main()
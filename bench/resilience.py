@@ -0,0 +1,150 @@
+"""
+Tail latency and failures of upstream calls, with and without the resilience policies.
+
+A fake provider answers after a log-normal delay (median --median-ms), a fraction
+--slow of its calls hang far longer (up to the attempt timeout) and a fraction --fail
+fail at once with a transient error. The same seeded call sequence is made under each
+policy: a single attempt, retries with backoff, and retries plus hedging. Each reports
+the success rate and latency percentiles as a caller sees them. A last run takes the
+provider down for a while and compares a caller with and without a circuit breaker:
+how many calls were sent to the dead provider and how long callers waited on them.
+No network needed.
+
+Usage: python -m bench.resilience [--calls 200] [--median-ms 80] [--slow 0.05] [--fail 0.05] [--timeout 1.0]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing retry and breaker messages
+import io  # For silencing retry and breaker messages
+import random  # For the fake provider's delays and failures
+import threading  # Calls are made from several threads, like concurrent utterances
+import time  # For delays and latencies
+import numpy as np  # For percentiles
+from concurrent.futures import ThreadPoolExecutor  # Concurrent callers
+from utils import resilience  # Policies under test
+from utils.resilience import Policy, call  # Policies under test
+
+PERCENTILES = (50, 95, 99)
+CALLERS = 8
+
+
+class FakeProvider:
+    """Answers after a seeded delay; some calls are very slow, some fail at once, and it can be taken down."""
+    def __init__(self, median, slow, fail, seed):
+        self.median = median
+        self.slow = slow
+        self.fail = fail
+        self.down = threading.Event()
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            delay = self.median * self._random.lognormvariate(0, 0.4)
+        if self.down.is_set():
+            time.sleep(timeout)
+            raise TimeoutError("fake provider did not answer")
+        if roll < self.fail:
+            raise ConnectionError("fake provider reset the connection")
+        if roll < self.fail + self.slow:
+            delay *= 50
+        if delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("fake provider timed out")
+        time.sleep(delay)
+        return "ok"
+
+
+def run_policy(name, policy, hedge, args):
+    """Make args.calls calls from CALLERS threads; returns (latencies of successes, failures, provider calls)."""
+    resilience.POLICIES[name] = policy
+    fake = FakeProvider(args.median_ms / 1000, args.slow, args.fail, args.seed)
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            call(name, fake, hedge=hedge)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    # Warm-up calls, so hedging knows the provider's p95
+    with ThreadPoolExecutor(max_workers=CALLERS) as pool:
+        list(pool.map(one, range(20)))
+        fake.calls = 0
+        results = list(pool.map(one, range(args.calls)))
+    latencies = [r for r in results if r is not None]
+    return latencies, len(results) - len(latencies), fake.calls
+
+
+def run_outage(name, breaker_failures, args):
+    """Calls at a steady pace while the provider is down for args.outage seconds."""
+    resilience.POLICIES[name] = Policy(attempts=1, timeout=args.timeout, budget=args.timeout,
+                                       breaker_failures=breaker_failures, breaker_cooldown=args.outage / 2)
+    fake = FakeProvider(args.median_ms / 1000, 0.0, 0.0, args.seed)
+    fake.down.set()
+    waited = []
+
+    def one():
+        start = time.perf_counter()
+        try:
+            call(name, fake)
+        except Exception:
+            waited.append(time.perf_counter() - start)
+
+    threads = []
+    end = time.perf_counter() + args.outage
+    while time.perf_counter() < end:
+        t = threading.Thread(target=one)
+        t.start()
+        threads.append(t)
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+    return len(threads), fake.calls, sum(waited)
+
+
+def percentiles(values):
+    if not values:
+        return "-"
+    return "  ".join(f"p{q} {np.percentile(values, q) * 1000:7.1f} ms" for q in PERCENTILES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="Calls per policy")
+    parser.add_argument("--median-ms", type=float, default=80, help="Median latency of the fake provider")
+    parser.add_argument("--slow", type=float, default=0.05, help="Fraction of calls that are very slow")
+    parser.add_argument("--fail", type=float, default=0.05, help="Fraction of calls that fail at once")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Timeout per attempt (seconds)")
+    parser.add_argument("--outage", type=float, default=3.0, help="Length of the outage run (seconds)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for delays and failures")
+    args = parser.parse_args()
+
+    budget = 3 * args.timeout
+    policies = (
+        ("single attempt", Policy(attempts=1, timeout=args.timeout, budget=budget, breaker_failures=None), False),
+        ("retries", Policy(attempts=3, timeout=args.timeout, budget=budget, backoff=0.05,
+                           breaker_failures=None), False),
+        ("retries + hedging", Policy(attempts=3, timeout=args.timeout, budget=budget, backoff=0.05,
+                                     hedge_min=0.05, breaker_failures=None), True),
+    )
+    print(f"{args.calls} calls from {CALLERS} threads, median {args.median_ms:.0f} ms, "
+          f"{args.slow:.0%} slow, {args.fail:.0%} failing, timeout {args.timeout:.1f}s")
+    for i, (label, policy, hedge) in enumerate(policies):
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, failures, sent = run_policy(f"bench_policy_{i}", policy, hedge, args)
+        print(f"  {label:<18} ok {len(latencies) / args.calls:6.1%}  {percentiles(latencies)}  "
+              f"requests sent {sent}")
+
+    print(f"\nProvider down for {args.outage:.1f}s, one call every 50 ms:")
+    for label, failures in (("no breaker", None), ("circuit breaker", 3)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            made, sent, waited = run_outage(f"bench_outage_{failures}", failures, args)
+        print(f"  {label:<18} {made} calls, {sent} sent to the provider, {waited:.1f}s spent waiting on it")
+
+
+if __name__ == "__main__":
+    main()
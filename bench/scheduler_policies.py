@@ -0,0 +1,70 @@
+"""
+Scheduler policies with fake stages: what happens when utterances overlap.
+
+Each utterance is a job of fake blocking stages (STT, intent, search, speech) with
+the given latencies. Utterances are submitted --gap-ms apart, so later ones arrive
+while earlier ones are still running, the way a user interrupts. For each policy it
+reports what became of every job, how long cancellation took, the total time, and
+how many threads were still alive afterwards. No keyboard, microphone or API keys.
+
+Usage: python -m bench.scheduler_policies [--utterances 3] [--gap-ms 400] [--stage-ms 250]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing per-job benchmark output
+import io  # For silencing per-job benchmark output
+import threading  # For counting leftover threads
+import time  # For timings
+from utils.benchmark import benchmark_data, clear_benchmark_data  # Cancel latency is recorded by the scheduler
+from utils.scheduler import POLICIES, Scheduler, fake_stage  # Scheduler under test
+
+STAGES = ("stt", "intent", "web_search", "speech")
+
+
+async def utterance(ctx, stage_seconds):
+    for stage in STAGES:
+        # Stages honor the job's cancel event, like speech playback and scraping do
+        await ctx.run(fake_stage, stage_seconds, stage, cancel_event=ctx.cancel_event, stage=stage)
+    return "spoken"
+
+
+def run_policy(policy, utterances, gap, stage_seconds):
+    clear_benchmark_data()
+    threads_before = threading.active_count()
+    scheduler = Scheduler(policy)
+    start = time.perf_counter()
+    jobs = []
+    for _ in range(utterances):
+        scheduler.preempt()  # What the hotkey does when recording starts
+        jobs.append(scheduler.submit(utterance, stage_seconds))
+        time.sleep(gap)
+    for job in jobs:
+        job.wait(stages=True)
+    elapsed = time.perf_counter() - start
+    scheduler.shutdown()
+    time.sleep(0.05)  # Let the pool's idle threads exit
+    latencies = benchmark_data.get("scheduler_cancel_latency")
+    return {
+        "states": " ".join(job.state for job in jobs),
+        "elapsed": elapsed,
+        "cancel_ms": 1000 * latencies.max if latencies else 0.0,
+        "leftover_threads": threading.active_count() - threads_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--utterances", type=int, default=3, help="Utterances submitted one after another")
+    parser.add_argument("--gap-ms", type=float, default=400.0, help="Time between utterances")
+    parser.add_argument("--stage-ms", type=float, default=250.0, help="Latency of each fake stage")
+    args = parser.parse_args()
+    print(f"{args.utterances} utterances {args.gap_ms:.0f}ms apart, {len(STAGES)} stages of {args.stage_ms:.0f}ms each")
+    print(f"{'policy':<16} {'total':>7} {'max cancel':>11} {'threads left':>13}  jobs")
+    for policy in POLICIES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_policy(policy, args.utterances, args.gap_ms / 1000, args.stage_ms / 1000)
+        print(f"{policy:<16} {result['elapsed']:>6.2f}s {result['cancel_ms']:>9.1f}ms "
+              f"{result['leftover_threads']:>13}  {result['states']}")
+
+
+if __name__ == "__main__":
+    main()
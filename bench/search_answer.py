@@ -0,0 +1,181 @@
+"""
+Two-call answer flow (summarize, then answer) vs the single call with a BM25 pre-filter.
+
+Each flow answers questions over synthetic scraped pages in which a few paragraphs
+hold the facts and the rest is filler. The offline Gemini stand-in charges a round
+trip, a prefill cost per prompt token and a decode cost per generated token, so the
+numbers show where the time goes; --gemini uses the real model (needs GEMINI_API_KEY).
+Reported per flow: prompt tokens, time to the first answer token, time to the full
+answer, time until the summary file is written, and how many fact paragraphs reached
+the prompt.
+
+Usage: python -m bench.search_answer [--gemini] [--top-k 8] [--rtt-ms 250]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing per-call benchmark output
+import io  # For silencing per-call benchmark output
+import random  # For deterministic filler text
+import tempfile  # Results are archived outside search_results/
+import time  # For latency and the stand-in's delays
+from tools import web_search  # Answer flows under test
+from tools import search_archive  # Results are archived to a temporary directory
+from tools.ranking import top_passages  # For the fact recall check
+from utils.benchmark import benchmark_data, clear_benchmark_data  # Token counts recorded by the flows
+
+# (question, fact paragraphs planted in the pages)
+QUESTIONS = [
+    ("What is the boiling point of water on Mount Everest?", [
+        "On the summit of Mount Everest water boils at roughly 70 degrees Celsius because the air pressure is about a third of sea level.",
+        "Climbers on Everest find that the boiling point of water drops about one degree for every 300 meters of altitude.",
+    ]),
+    ("When did the James Webb Space Telescope launch?", [
+        "The James Webb Space Telescope launched on 25 December 2021 on an Ariane 5 rocket from Kourou, French Guiana.",
+        "After its launch, Webb took about a month to reach its orbit around the second Lagrange point.",
+    ]),
+    ("How many bones are in the adult human body?", [
+        "An adult human body has 206 bones, while a newborn has around 270 that fuse together during growth.",
+        "The smallest bone in the human body is the stapes in the middle ear; the largest is the femur.",
+    ]),
+]
+_FILLER = ("the of and to in a is that for it as was with be by on not he this are or his from at which "
+           "but have an they you were her she there been one all we their has would when if so no will more "
+           "history culture market report season policy network project support design travel research").split()
+
+
+def synthetic_pages(facts, pages=3, page_chars=6500, seed=0):
+    """Pages of filler paragraphs with the fact paragraphs scattered among them."""
+    rng = random.Random(seed)
+    paragraphs = [[] for _ in range(pages)]
+    for i in range(pages):
+        size = 0
+        while size < page_chars:
+            words = rng.choices(_FILLER, k=rng.randint(40, 90))
+            paragraph = " ".join(words).capitalize() + "."
+            paragraphs[i].append(paragraph)
+            size += len(paragraph)
+    for fact in facts:
+        page = rng.randrange(pages)
+        paragraphs[page].insert(rng.randrange(len(paragraphs[page]) + 1), fact)
+    return {f"https://example.org/page{i}": "\n\n".join(p) for i, p in enumerate(paragraphs)}
+
+
+class _Usage:
+    def __init__(self, prompt_token_count):
+        self.prompt_token_count = prompt_token_count
+
+
+class _Response:
+    def __init__(self, text, prompt_tokens, chunks=()):
+        self.text = text
+        self.usage_metadata = _Usage(prompt_tokens)
+        self._chunks = chunks
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """
+    Stand-in for a GenerativeModel: about 4 characters per token, rtt seconds per call,
+    prefill_tps prompt tokens and decode_tps generated tokens per second. Summaries are
+    summary_tokens long and answers answer_tokens long.
+    """
+    def __init__(self, rtt=0.25, prefill_tps=20000, decode_tps=200, answer_tokens=60, summary_tokens=250):
+        self.rtt = rtt
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.answer_tokens = answer_tokens
+        self.summary_tokens = summary_tokens
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        prompt_tokens = len(prompt) // 4
+        if prompt.startswith("Summarize"):
+            pieces = [("summary", self.summary_tokens)]
+        elif web_search.SUMMARY_MARKER in prompt:
+            pieces = [("answer", self.answer_tokens), ("marker", 4), ("summary", self.summary_tokens)]
+        else:
+            pieces = [("answer", self.answer_tokens)]
+        chunks = []
+        for kind, tokens in pieces:
+            if kind == "marker":
+                chunks.append(f"\n{web_search.SUMMARY_MARKER}\n")
+                continue
+            # One chunk per ~10 tokens, like a streamed response
+            chunks += [f"Stand-in {kind} text. " * 2] * max(1, tokens // 10)
+        time.sleep(self.rtt + prompt_tokens / self.prefill_tps)
+        if not stream:
+            time.sleep(sum(len(c) for c in chunks) / 4 / self.decode_tps)
+            return _Response("".join(chunks), prompt_tokens)
+        return _Response("".join(chunks), prompt_tokens, self._paced(chunks))
+
+    def _paced(self, chunks):
+        for chunk in chunks:
+            time.sleep(len(chunk) / 4 / self.decode_tps)
+            yield _Chunk(chunk)
+
+
+def run_flow(question, pages, model, mode, defer, record):
+    """
+    Answer one question; returns (prompt tokens before the answer is complete, all
+    prompt tokens, first token s, answer s, summary written s).
+    """
+    clear_benchmark_data()
+    start = time.perf_counter()
+    first = None
+    for _ in web_search.answer_stream(question, pages, "default", model, record=record,
+                                      mode=mode, defer_summary=defer):
+        if first is None:
+            first = time.perf_counter() - start
+    answered = time.perf_counter() - start
+    web_search.wait_for_summaries()
+    summarized = time.perf_counter() - start
+    tokens = sum(h.total for name, h in benchmark_data.items() if name.endswith("_prompt_tokens"))
+    background = benchmark_data["gemini_summary_prompt_tokens"].total if defer and "gemini_summary_prompt_tokens" in benchmark_data else 0
+    return tokens - background, tokens, first, answered, summarized
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--gemini", action="store_true", help="Use the real Gemini model instead of the stand-in")
+    parser.add_argument("--top-k", type=int, default=web_search.TOP_K_PASSAGES, help="Passages sent in single mode")
+    parser.add_argument("--rtt-ms", type=float, default=250.0, help="Stand-in round trip per call")
+    args = parser.parse_args()
+    web_search.TOP_K_PASSAGES = args.top_k
+    if args.gemini:
+        from utils.clients import get_gemini_model
+        model = get_gemini_model(web_search.GEMINI_MODEL)
+    else:
+        model = FakeGeminiModel(rtt=args.rtt_ms / 1000)
+    flows = [("two_call", "two_call", False), ("single", "single", False), ("single+deferred", "single", True)]
+    totals = {label: [0, 0, 0.0, 0.0, 0.0] for label, _, _ in flows}
+    recall = [0, 0]
+    with tempfile.TemporaryDirectory() as directory:
+        search_archive.ARCHIVE_DIR = directory
+        for n, (question, facts) in enumerate(QUESTIONS):
+            pages = synthetic_pages(facts, seed=n)
+            selected = " ".join(passage for _, passage, _ in top_passages(question, pages, k=args.top_k,
+                                                                        max_chars=web_search.PASSAGE_BUDGET))
+            recall[0] += sum(fact in selected for fact in facts)
+            recall[1] += len(facts)
+            for label, mode, defer in flows:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = run_flow(question, pages, model, mode, defer, f"{n}_{label}")
+                for i, value in enumerate(result):
+                    totals[label][i] += value
+    count = len(QUESTIONS)
+    print(f"{count} questions, {sum(len(p) for p in synthetic_pages([]).values())} characters of scraped text each")
+    print(f"{'flow':<16} {'answer tokens':>13} {'all tokens':>10} {'first token':>12} {'answer':>8} {'summary':>8}")
+    for label, _, _ in flows:
+        critical, tokens, first, answered, summarized = (value / count for value in totals[label])
+        print(f"{label:<16} {critical:>13.0f} {tokens:>10.0f} {first:>11.2f}s {answered:>7.2f}s {summarized:>7.2f}s")
+    print("answer tokens: prompt tokens sent before the answer is complete; all tokens include deferred summaries")
+    print(f"Fact paragraphs in the single-call prompt: {recall[0]}/{recall[1]}")
+
+
+if __name__ == "__main__":
+    main()
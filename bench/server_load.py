@@ -0,0 +1,168 @@
+"""
+Load test for the agent server: N concurrent simulated sessions against local stand-ins.
+
+Starts server.py's AgentServer in-process on a free localhost port, with every remote
+service replaced by the stand-ins of bench.end_to_end (STT, Gemini, DuckDuckGo, the
+web pages and gTTS, with injected latency). Each simulated session belongs to one of
+--tenants tenants and posts --utterances fixture recordings one after another, pausing
+--think-ms in between; a refused request (503 overloaded, 429 rate limited) is retried
+after its Retry-After, up to --retries times. Reports throughput, client-side latency
+percentiles, outcomes, admission waits and per-tenant rate-limit waits.
+
+Usage: python -m bench.server_load [--sessions 16] [--utterances 3] [--tenants 2] [--max-active 4]
+                                   [--max-queued 16] [--scale 0.5] [--rate-limits stt=4,gemini=8,search=2,tts=16]
+"""
+import argparse  # For command line options
+import contextlib  # For silencing the pipeline's output
+import io  # For silencing the pipeline's output
+import json  # Requests and responses
+import shutil  # For removing the scratch directory
+import tempfile  # Caches and saved results go to a scratch directory
+import threading  # One thread per simulated session
+import time  # For latencies and think time
+import urllib.error  # Non-2xx responses
+import urllib.request  # Plain HTTP client, like any other client of the server
+import numpy as np  # For percentiles
+from audio.preprocess import prepare_for_stt  # To fingerprint fixtures as the STT stand-in sees them
+from audio.vad import trim_silence  # To fingerprint fixtures as the STT stand-in sees them
+from bench.end_to_end import LATENCIES_MS, SCENARIOS, StandInSTT, fixture_clip, setup  # Stand-in services
+from transcription import engines  # Fixture-aware STT stand-ins replace the registered ones
+from utils import ratelimit  # Rate limits under test
+
+PERCENTILES = (50, 95, 99)
+
+
+class FixtureSTT(StandInSTT):
+    """
+    STT stand-in for concurrent sessions: recognizes which fixture it was sent by the
+    number of samples left after trimming and preprocessing, and returns its transcript.
+    """
+    def __init__(self, name, latency, transcripts):
+        super().__init__(name, latency)
+        self.transcripts = transcripts
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        delay = self.latency()
+        if cancel_event is not None:
+            if cancel_event.wait(delay):
+                return None
+        else:
+            time.sleep(delay)
+        return self.transcripts.get(len(clip.samples))
+
+
+def request(base_url, method, path, body=None, headers=None):
+    """Send a request; returns (status, parsed JSON body or None, Retry-After seconds or None)."""
+    req = urllib.request.Request(base_url + path, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            data = response.read()
+            return response.status, json.loads(data) if data else None, None
+    except urllib.error.HTTPError as e:
+        data = e.read()
+        retry_after = e.headers.get("Retry-After")
+        return e.code, json.loads(data) if data else None, float(retry_after) if retry_after else None
+
+
+def run_session(base_url, index, args, fixtures, records):
+    tenant = f"tenant{index % args.tenants}"
+    _, session, _ = request(base_url, "POST", "/sessions", headers={"X-Tenant": tenant})
+    for u in range(args.utterances):
+        name, wav = fixtures[(index + u) % len(fixtures)]
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            status, body, retry_after = request(base_url, "POST", f"/sessions/{session['session']}/utterances", wav,
+                                                {"Content-Type": "audio/wav"})
+            if status not in (429, 503) or attempts > args.retries:
+                break
+            time.sleep(retry_after or 1.0)
+        records.append({"tenant": tenant, "scenario": name, "status": status, "attempts": attempts,
+                        "latency": time.perf_counter() - start, "body": body or {}})
+        time.sleep(args.think_ms / 1000)
+    request(base_url, "DELETE", f"/sessions/{session['session']}")
+
+
+def percentiles(values):
+    if not values:
+        return "-"
+    return "  ".join(f"p{q} {np.percentile(values, q):6.3f}s" for q in PERCENTILES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=16, help="Concurrent simulated sessions")
+    parser.add_argument("--utterances", type=int, default=3, help="Utterances per session")
+    parser.add_argument("--tenants", type=int, default=2, help="Tenants the sessions are spread over")
+    parser.add_argument("--max-active", type=int, default=4, help="Server: utterances processed at once")
+    parser.add_argument("--max-queued", type=int, default=16, help="Server: utterances waiting for a slot")
+    parser.add_argument("--rate-limits", default=ratelimit.RATE_LIMITS, help="Per-tenant calls per second (api=rate,...)")
+    parser.add_argument("--scale", type=float, default=0.5, help="Multiply every injected latency")
+    parser.add_argument("--think-ms", type=float, default=200, help="Pause between a session's utterances")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of a refused request")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the injected jitter")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_server_load_")
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet):
+        stt, _ = setup(LATENCIES_MS, args.scale, 1.0, args.seed, scratch)
+        from server import AgentServer  # Imported after setup(): tools read the environment on import
+        fixtures = []
+        transcripts = {}
+        for i, (name, seconds, transcript, _) in enumerate(SCENARIOS):
+            clip = fixture_clip(seconds, seed=i)
+            transcripts[len(prepare_for_stt(trim_silence(clip).clip).samples)] = transcript
+            fixtures.append((name, clip.wav_bytes()))
+        for engine in stt:
+            engines.register_engine(FixtureSTT(engine.name, engine.latency, transcripts))
+        ratelimit.limiter = ratelimit.RateLimiter(ratelimit.parse_limits(args.rate_limits))
+
+        server = AgentServer(("127.0.0.1", 0), args.max_active, args.max_queued)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        records = []
+        threads = [threading.Thread(target=run_session, args=(base_url, i, args, fixtures, records))
+                   for i in range(args.sessions)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        health = server.health()
+        server.shutdown()
+        server.server_close()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    done = [r for r in records if r["status"] == 200 and r["body"].get("status") == "done"]
+    print(f"{args.sessions} sessions x {args.utterances} utterances, {args.tenants} tenant(s), "
+          f"{args.max_active} active / {args.max_queued} queued, latency scale {args.scale}, "
+          f"rate limits {args.rate_limits or 'none'}")
+    print(f"Finished in {elapsed:.1f}s: {len(done) / elapsed:.2f} utterances/s completed")
+    statuses = {}
+    for r in records:
+        key = r["body"].get("status", str(r["status"]))
+        statuses[key] = statuses.get(key, 0) + 1
+    print("Outcomes: " + ", ".join(f"{status} {count}" for status, count in sorted(statuses.items())))
+    print(f"Retried requests: {sum(r['attempts'] > 1 for r in records)}, "
+          f"refused by the server: {health['rejected']}, peak active: {health['peak_active']}")
+    print(f"Latency (client side, incl. retries): {percentiles([r['latency'] for r in done])}")
+    print(f"Admission wait:                       {percentiles([r['body']['admission_wait'] for r in done])}")
+    print(f"Server-side total_processing:         "
+          f"{percentiles([r['body']['timings'].get('total_processing', 0.0) for r in done])}")
+    print("\nPer tenant:")
+    for tenant in sorted({r["tenant"] for r in records}):
+        mine = [r for r in done if r["tenant"] == tenant]
+        waits = [r["body"]["timings"].get("rate_limit_wait", 0.0) for r in mine]
+        print(f"  {tenant}: {len(mine)} done, latency {percentiles([r['latency'] for r in mine])}, "
+              f"rate-limit wait {np.sum(waits):.2f}s total ({np.mean(waits) if waits else 0.0:.3f}s per utterance)")
+    print("\nPer scenario (done):")
+    for name, *_ in SCENARIOS:
+        mine = [r for r in done if r["scenario"] == name]
+        print(f"  {name:<26} {len(mine):3d}  {percentiles([r['latency'] for r in mine])}")
+
+
+if __name__ == "__main__":
+    main()
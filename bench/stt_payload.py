@@ -0,0 +1,57 @@
+"""
+Compare STT upload payloads: the original 44.1 kHz WAV against resampled and FLAC-encoded audio.
+
+For each fixture it reports payload bytes, preprocessing/encoding time, and an
+estimated end-to-end upload time at the given uplink bandwidth.
+
+Usage: python -m bench.stt_payload [--fixtures DIR] [--uplink-mbps 5] [--rtt-ms 50]
+"""
+import argparse  # For command line options
+import time  # For timing preprocessing and encoding
+from audio.clip import AudioClip, encode  # Encoding under test
+from audio.preprocess import prepare_for_stt  # Resampling under test
+from bench.fixtures import load_fixtures  # Fixed set of WAV fixtures
+
+# (label, target sample rate or None to keep the original, payload format)
+VARIANTS = [
+    ("wav 44.1k (original)", None, "wav"),
+    ("wav 16k", 16000, "wav"),
+    ("flac 16k", 16000, "flac"),
+]
+
+
+def measure(clip, target_fs, fmt):
+    start = time.perf_counter()
+    # Start from raw samples each time so no cached encoding is reused
+    prepared = AudioClip(clip.samples, clip.fs)
+    if target_fs:
+        prepared = prepare_for_stt(prepared, target_fs)
+    payload = encode(prepared.samples, prepared.fs, fmt)
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fixtures", help="Directory of WAV files (default: synthetic fixtures)")
+    parser.add_argument("--uplink-mbps", type=float, default=5.0, help="Uplink bandwidth used to estimate upload time")
+    parser.add_argument("--rtt-ms", type=float, default=50.0, help="Round trip time added to each upload estimate")
+    args = parser.parse_args()
+    bytes_per_second = args.uplink_mbps * 1e6 / 8
+    totals = {label: [0, 0.0] for label, _, _ in VARIANTS}
+    for name, clip in load_fixtures(args.fixtures):
+        print(f"{name} ({clip.duration:.1f}s)")
+        for label, target_fs, fmt in VARIANTS:
+            size, prep_time = measure(clip, target_fs, fmt)
+            upload = args.rtt_ms / 1000 + size / bytes_per_second
+            totals[label][0] += size
+            totals[label][1] += prep_time + upload
+            print(f"  {label:>22}: {size / 1024:8.1f} KB  prep+encode={prep_time * 1000:6.1f}ms  "
+                  f"est. end-to-end={(prep_time + upload) * 1000:7.1f}ms")
+    baseline = totals[VARIANTS[0][0]][0]
+    print("Total")
+    for label, (size, seconds) in totals.items():
+        print(f"  {label:>22}: {size / 1024:8.1f} KB ({size / baseline:5.1%} of original)  est. end-to-end={seconds * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Cost of recording a span, and of recording from many threads at once.
+
+Times empty benchmark_block() spans (the cost every instrumented stage pays) on
+one thread and then on --threads threads in parallel, and checks that no spans
+or histogram samples were lost. Also shows how far the streaming percentiles are
+from exact ones computed over the same samples.
+
+Usage: python -m bench.tracing_overhead [--spans 200000] [--threads 8]
+"""
+import argparse  # For command line options
+import threading  # For the concurrent run
+import time  # For timings
+import numpy as np  # For exact percentiles to compare against
+from utils.benchmark import benchmark_block, benchmark_data, clear_benchmark_data  # Instrumentation under test
+from utils.tracing import Histogram, buffer  # Histogram accuracy, spans recorded
+
+
+def record_spans(n):
+    for _ in range(n):
+        with benchmark_block("empty"):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--spans", type=int, default=200000, help="Spans recorded per run")
+    parser.add_argument("--threads", type=int, default=8, help="Threads in the concurrent run")
+    args = parser.parse_args()
+
+    clear_benchmark_data()
+    start = time.perf_counter()
+    record_spans(args.spans)
+    elapsed = time.perf_counter() - start
+    print(f"1 thread:   {elapsed / args.spans * 1e9:7.0f} ns per span")
+
+    clear_benchmark_data()
+    per_thread = args.spans // args.threads
+    threads = [threading.Thread(target=record_spans, args=(per_thread,)) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    total = per_thread * args.threads
+    recorded = benchmark_data["empty"].count
+    print(f"{args.threads} threads: {elapsed / total * 1e9:7.0f} ns per span, "
+          f"{recorded}/{total} samples recorded, {min(total, buffer.capacity) - len(buffer.records())} spans lost, "
+          f"{buffer.dropped} overwritten (buffer holds {buffer.capacity})")
+
+    samples = np.random.default_rng(0).lognormal(mean=-1.0, sigma=1.0, size=100000)
+    histogram = Histogram()
+    for value in samples:
+        histogram.add(value)
+    for q in (50, 95, 99):
+        exact = np.percentile(samples, q)
+        print(f"p{q}: streaming {histogram.percentile(q):.4f}s, exact {exact:.4f}s "
+              f"({abs(histogram.percentile(q) - exact) / exact:.2%} off)")
+
+
+if __name__ == "__main__":
+    main()
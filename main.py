@@ -1,14 +1,18 @@
-from audio.recorder import AudioRecorder         # Handles audio recording logic (start/stop, file saving)
-from transcription.openai_whisper import transcribe_with_whisper  # Handles transcription using OpenAI Whisper API
-from transcription.google_stt import transcribe_with_google_stt   # Handles transcription using Google Speech-to-Text
+from utils.startup import ready, start_warm_up, startup_report, import_module_step  # First: times every import after it
+from audio.recorder import AudioRecorder         # Handles audio recording logic (start/stop, in-memory clip)
+from transcription.google_stt import GoogleStreamingBackend  # Incremental Google Speech-to-Text for streaming mode
+from transcription.streaming import StreamingPipeline, TAIL_TIMEOUT  # Streams audio chunks to an incremental STT backend while recording
 from ui.hotkey_listener import HotkeyListener    # Listens for hotkey events to trigger recording
-from utils.clipboard import copy_to_clipboard    # Copies text to the system clipboard
-from utils.benchmark import benchmark_block, print_benchmark_summary, benchmark_data  # For benchmarking
+from utils.benchmark import benchmark_summary  # For benchmarking
+from utils.resilience import resilience_report  # Circuit breaker states of the upstream providers
+from utils.tracing import export_jsonl, export_chrome_trace  # Every utterance's spans, exported on shutdown
 from pynput import keyboard                      # Provides key constants (e.g., right shift, right option)
-from tools.intent import detect_intent           # Detects user intent from transcript (Gemini-based)
-from tools.web_search import search_duckduckgo   # Performs web search using DuckDuckGo and Gemini
-from tools.text_to_speech import speak_text, stop_speech  # Converts text to speech using gTTS
-import threading  # For interruption support
+from tools.text_to_speech import stop_speech, init_mixer  # Stops speech playback on shutdown; mixer warm-up
+from tools.tts_engines import TTS_ENGINE         # Which TTS SDK to warm up
+from transcription.engines import STT_ENGINES    # Which STT SDKs to warm up
+from pipeline import process_audio, process_streaming  # Per-utterance jobs: VAD, STT, intent and tools
+from utils.clients import warm_up_steps          # Creates the shared API clients in the background
+from utils.scheduler import Scheduler            # Cancellable per-utterance jobs
 import signal     # For graceful shutdown
 import sys        # For sys.exit
 import os         # For saving benchmark files
@@ -17,8 +21,11 @@ import datetime   # For timestamped filenames
 # Use right shift + right option as the trigger key combination
 RECORD_KEYS = {keyboard.Key.shift_r, keyboard.Key.alt_r}
 
-# Global interrupt event
-interrupt_event = threading.Event()
+# Set STREAMING_STT=1 to transcribe while the hotkey is held (Google streaming recognition)
+STREAMING_STT = os.getenv("STREAMING_STT") == "1"
+
+# Runs each utterance as a cancellable job (SCHEDULER_POLICY: cancel_previous, queue or concurrent)
+scheduler = Scheduler()
 
 # For graceful shutdown
 def save_benchmarks_to_file():
@@ -26,114 +33,76 @@ def save_benchmarks_to_file():
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     file_path = f"benchmarks/bench_{ts}.txt"
     with open(file_path, "w") as f:
-        if not benchmark_data:
-            f.write("[Benchmark] No data collected.\n")
-        else:
-            f.write("BENCHMARK SUMMARY\n" + "="*50 + "\n")
-            for name, times in benchmark_data.items():
-                if times:
-                    avg_time = sum(times) / len(times)
-                    min_time = min(times)
-                    max_time = max(times)
-                    total_time = sum(times)
-                    count = len(times)
-                    f.write(f"{name}:\n")
-                    f.write(f"  Count: {count}\n")
-                    f.write(f"  Average: {avg_time:.3f}s\n")
-                    f.write(f"  Min: {min_time:.3f}s\n")
-                    f.write(f"  Max: {max_time:.3f}s\n")
-                    f.write(f"  Total: {total_time:.3f}s\n\n")
+        f.write(benchmark_summary())
+        f.write("\n" + startup_report())
+        f.write("\n" + resilience_report())
     print(f"[Benchmark] Saved to {file_path}")
+    # Every span of every utterance, for offline analysis and for chrome://tracing / Perfetto
+    if export_jsonl(f"benchmarks/trace_{ts}.jsonl"):
+        export_chrome_trace(f"benchmarks/trace_{ts}.json")
+        print(f"[Benchmark] Traces saved to benchmarks/trace_{ts}.jsonl and benchmarks/trace_{ts}.json")
 
 def graceful_exit(*args):
     print("\n[Shutdown] Stopping agent and saving benchmarks...")
-    interrupt_event.set()
+    scheduler.shutdown(cancel=True)
     stop_speech()
     save_benchmarks_to_file()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, graceful_exit)
 
+def warm_up_agent_steps(recorder):
+    """Warm-up steps in the order an utterance needs them: recording, preprocessing, STT, intent, tools, speech."""
+    whisper = "whisper" in STT_ENGINES
+    google = "google" in STT_ENGINES or STREAMING_STT
+    steps = [("audio device", recorder.warm_up)]
+    steps += [import_module_step(name) for name in ("scipy.signal", "scipy.io.wavfile", "soundfile")]
+    if whisper:
+        steps.append(import_module_step("openai"))
+    if google:
+        steps.append(import_module_step("google.cloud.speech"))
+    steps.append(import_module_step("google.generativeai"))
+    steps += warm_up_steps(speech=google, openai=whisper)
+    steps += [import_module_step("duckduckgo_search"), import_module_step("trafilatura")]
+    if TTS_ENGINE == "gtts":
+        steps.append(import_module_step("gtts"))
+    steps.append(("audio mixer", init_mixer))
+    return steps
+
 def main():
     """
     Main function to run the voice-to-text agent with Gemini-based intent detection and tools.
     """
     recorder = AudioRecorder()
     pressed_keys = set()
-    processing_lock = threading.Lock()
-    processing_thread = [None]  # Mutable container to allow reassignment
-
-    def process_audio(filename):
-        with benchmark_block("total_processing"):
-            # Run both STT engines in parallel
-            whisper_result = {}
-            google_result = {}
-            def run_whisper():
-                whisper_result["text"] = transcribe_with_whisper(filename)
-            def run_google():
-                google_result["text"] = transcribe_with_google_stt(filename)
-            t1 = threading.Thread(target=run_whisper)
-            t2 = threading.Thread(target=run_google)
-            t1.start()
-            t2.start()
-            t1.join()
-            t2.join()
-            print("\n--- STT Results ---")
-            print("[OpenAI Whisper]")
-            print(whisper_result["text"])
-            print("[Google STT]")
-            print(google_result["text"])
-            print("-------------------\n")
-            # Use Whisper result for downstream processing (or swap to google_result["text"] to compare)
-            transcript = whisper_result["text"]
-            print("Transcription (using Whisper for downstream):")
-            print(transcript)
-            # Use Gemini to detect intent, query, and result_length
-            intent_result = detect_intent(transcript)
-            intent = intent_result["intent"]
-            query = intent_result["query"]
-            result_length = intent_result.get("result_length", "default")
-            print(f"Detected intent: {intent}")
-            if intent == "web_search":
-                print(f"Searching the web for: {query} (result length: {result_length})")
-                answer, file_path, results = search_duckduckgo(query, result_length=result_length)
-                print("\nDirect answer:")
-                print(answer)
-                print(f"\nFull results and summary saved to: {file_path}")
-                print("\nTop links:")
-                for i, r in enumerate(results, 1):
-                    print(f"{i}. {r['title']}\n{r['href']}\n")
-                speak_text(answer, stop_event=interrupt_event)
-            elif intent == "tts":
-                print(f"Speaking: {query}")
-                speak_text(query, stop_event=interrupt_event)
-            else:
-                copy_to_clipboard(query)
-                print("Transcription copied to clipboard.")
-        print_benchmark_summary()
+    streaming_pipeline = [None]  # Pipeline for the utterance currently being recorded
 
     def on_start():
-        if processing_lock.locked():
+        # Under SCHEDULER_POLICY=cancel_previous, pressing the hotkey interrupts the running utterance
+        if scheduler.preempt():
             print("[Interrupt] Stopping ongoing processing and starting over...")
-            interrupt_event.set()
-            stop_speech()
-            if processing_thread[0] and processing_thread[0].is_alive():
-                processing_thread[0].join(timeout=2)
-            interrupt_event.clear()
         print("Recording...")
-        recorder.start()
+        if STREAMING_STT:
+            pipeline = StreamingPipeline(GoogleStreamingBackend(), recorder.fs)
+            pipeline.start()
+            streaming_pipeline[0] = pipeline
+            recorder.start(on_chunk=pipeline.submit)
+        else:
+            recorder.start()
 
     def on_stop():
         print("Processing...")
-        filename = recorder.stop()
-        if filename:
-            def run_processing():
-                with processing_lock:
-                    process_audio(filename)
-            t = threading.Thread(target=run_processing)
-            processing_thread[0] = t
-            t.start()
+        clip = recorder.stop()
+        pipeline = streaming_pipeline[0]
+        streaming_pipeline[0] = None
+        if clip:
+            if pipeline is not None:
+                scheduler.submit(process_streaming, pipeline)
+            else:
+                scheduler.submit(process_audio, clip)
         else:
+            if pipeline is not None:
+                pipeline.close(TAIL_TIMEOUT)
             print("No audio recorded.")
 
     def on_press(key):
@@ -149,9 +118,15 @@ def main():
             del on_press.pressed
             on_stop()
 
+    def on_ready():
+        ready()
+        # Load SDKs, open the audio device and mixer and build API clients (auth, gRPC
+        # channels, HTTP pools) while waiting for the first hotkey press
+        start_warm_up(warm_up_agent_steps(recorder))
+
     listener = HotkeyListener(on_press, on_release)
     try:
-        listener.run()
+        listener.run(on_ready=on_ready)
     except SystemExit:
         pass
     except Exception as e:
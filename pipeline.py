@@ -0,0 +1,124 @@
+"""
+The per-utterance pipeline: silence trimming, preprocessing, STT, intent detection
+and the chosen tool. Each function is a scheduler job (see utils/scheduler.py);
+main.py submits them from the hotkey handlers, and bench/end_to_end.py replays
+fixture recordings through them with local stand-ins for every remote service.
+server.py runs them for many sessions at once. Each job returns what it did as a dict
+(transcript, intent, query, answer and the utterance's trace id), or None if there was
+nothing to transcribe.
+"""
+from transcription.engines import transcribe    # Runs the registered STT engines (Whisper, Google) per STT_POLICY
+from utils.clipboard import copy_to_clipboard    # Copies text to the system clipboard
+from utils.benchmark import benchmark_block, print_benchmark_summary, record_value  # For benchmarking
+from utils.tracing import trace, current_trace_id  # One trace per utterance
+from audio.vad import trim_silence               # Trims silence and drops recordings without speech
+from audio.preprocess import prepare_for_stt, check_payload_format, PAYLOAD_FORMAT  # Resampling and compact encoding
+from tools.intent import detect_intent           # Detects user intent from transcript (Gemini-based)
+from tools.web_search import search_duckduckgo_stream   # Performs web search using DuckDuckGo and Gemini
+from tools.speculation import speculate_search, settle  # Starts likely web searches during intent detection
+from tools.text_to_speech import speak_text, speak_stream, play_audio  # Converts text to speech using gTTS
+from transcription.streaming import TAIL_TIMEOUT  # Bounds the wait for the streaming backend after release
+
+payload_format = check_payload_format(PAYLOAD_FORMAT)
+
+
+def prepare(clip):
+    # Downmix, resample to 16 kHz and encode once; both engines share the same payload
+    clip = prepare_for_stt(clip)
+    clip.encoded(payload_format)
+    return clip
+
+
+async def process_audio(ctx, clip, play=play_audio, copy=copy_to_clipboard, summary=True):
+    """
+    Job for a recorded clip. play and copy replace speaker playback and the clipboard;
+    summary=False skips printing the benchmark summary afterwards.
+    """
+    # Every span recorded for this utterance (stages, API calls, sub-stages) shares its trace id
+    with trace("total_processing", job=ctx.job.id):
+        # Trim leading/trailing silence, and skip the API calls entirely if nobody spoke
+        with benchmark_block("vad"):
+            vad = await ctx.run(trim_silence, clip, stage="vad")
+        record_value("vad_seconds_saved", vad.saved_seconds)
+        if not vad.has_speech:
+            print(f"No speech detected in {vad.original_seconds:.1f}s of audio, skipping transcription.")
+            return
+        print(f"[VAD] Trimmed {vad.saved_seconds:.1f}s of silence ({vad.original_seconds:.1f}s -> {vad.kept_seconds:.1f}s)")
+        with benchmark_block("audio_preprocessing"):
+            clip = await ctx.run(prepare, vad.clip, stage="audio_preprocessing")
+        record_value("stt_payload_kb", len(clip.encoded(payload_format)) / 1024)
+        # Run the STT engines according to STT_POLICY (race, compare, hedged or single)
+        stt = await ctx.run(transcribe, clip, fmt=payload_format, stage="stt")
+        print("\n--- STT Results ---")
+        for name, (text, latency, error) in stt.results.items():
+            print(f"[{name}] ({latency:.3f}s)")
+            print(text if error is None else f"Error: {error}")
+        print("-------------------\n")
+        if stt.text is None:
+            print("No STT engine returned a transcript.")
+            return
+        transcript = stt.text
+        print(f"Transcription (using {stt.engine} for downstream):")
+        print(transcript)
+        result = await process_transcript(ctx, transcript, play, copy)
+    if summary:
+        print_benchmark_summary()
+    return result
+
+
+async def process_streaming(ctx, pipeline, play=play_audio, copy=copy_to_clipboard, summary=True):
+    """Job for an utterance transcribed while it was recorded (STREAMING_STT=1)."""
+    with trace("total_processing", job=ctx.job.id, streaming=True):
+        # Most of the audio was transcribed while recording; only the tail is left
+        ctx.on_cancel(pipeline.abandon)
+        transcript = await ctx.run(pipeline.close, TAIL_TIMEOUT, stage="streaming_stt_tail")
+        print("Transcription (streaming):")
+        print(transcript)
+        result = await process_transcript(ctx, transcript, play, copy)
+    if summary:
+        print_benchmark_summary()
+    return result
+
+
+async def process_transcript(ctx, transcript, play=play_audio, copy=copy_to_clipboard):
+    # Start the search speculatively while Gemini detects intent, query, and result_length
+    speculation = speculate_search(transcript)
+    if speculation is not None:
+        ctx.on_cancel(speculation.cancel)
+    intent_result = await ctx.run(detect_intent, transcript, stage="intent")
+    intent = intent_result["intent"]
+    query = intent_result["query"]
+    result_length = intent_result.get("result_length", "default")
+    print(f"Detected intent: {intent}")
+    prefetched = await ctx.run(settle, speculation, intent, query, stage="speculation")
+    result = {"transcript": transcript, "intent": intent, "query": query, "answer": query,
+              "trace_id": current_trace_id()}
+    if intent == "web_search":
+        print(f"Searching the web for: {query} (result length: {result_length})")
+        chunks, record, results = await ctx.run(
+            search_duckduckgo_stream, query, result_length=result_length,
+            prefetched=prefetched, cancel=ctx.cancel_event, stage="web_search",
+        )
+        if record is not None:
+            print(f"\nFull results and summary archived as {record} (python -m tools.search_archive show {record})")
+        print("\nTop links:")
+        for i, r in enumerate(results, 1):
+            print(f"{i}. {r['title']}\n{r['href']}\n")
+        print("Direct answer:")
+
+        def echo(chunks):
+            # Print the answer as it streams in, while speak_stream speaks it sentence by sentence
+            for chunk in chunks:
+                print(chunk, end="", flush=True)
+                yield chunk
+            print()
+
+        result["answer"] = await ctx.run(speak_stream, echo(chunks), stop_event=ctx.cancel_event, play=play,
+                                         stage="speech")
+    elif intent == "tts":
+        print(f"Speaking: {query}")
+        await ctx.run(speak_text, query, stop_event=ctx.cancel_event, play=play, stage="speech")
+    else:
+        await ctx.run(copy, query, stage="clipboard")
+        print("Transcription copied to clipboard.")
+    return result
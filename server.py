@@ -0,0 +1,405 @@
+"""
+Local agent service: runs the pipeline for many concurrent clients over HTTP.
+
+Each client opens a session (per-session state: its running utterance and its
+results), then posts recordings (WAV bytes) or transcripts to it. Every utterance is
+a job on one shared scheduler, using the same process-wide warmed clients, caches and
+thread pools as the local agent. A new utterance cancels the session's previous one,
+as pressing the hotkey does, without touching other sessions. Speech is returned in
+the response instead of being played, and clipboard text instead of being copied.
+
+Admission control bounds the utterances running at once (--max-active); up to
+--max-queued more wait for a slot, and anything beyond that is refused with 503 and
+Retry-After, so overload turns into backpressure on the clients rather than a
+growing backlog. Upstream API calls are rate limited per tenant (X-Tenant header,
+see utils/ratelimit.py); a tenant that stays over its limit gets 429. Upstream calls
+are retried only within the utterance's timeout (see utils/resilience.py), and an
+utterance that fails on a provider whose circuit breaker is open gets 503.
+
+Endpoints:
+    POST   /sessions                   -> 201 {"session", "tenant"}
+    POST   /sessions/<id>/utterances   WAV body (audio/wav) or JSON {"transcript": ...};
+                                       ?audio=1 includes the speech as base64
+    DELETE /sessions/<id>              Cancels the running utterance and closes the session
+    GET    /health                     Sessions, active and queued utterances
+    GET    /metrics                    Benchmark summary of all sessions (text)
+
+Usage: python server.py [--host 127.0.0.1] [--port 8765] [--max-active 4] [--max-queued 16] [--verbose]
+"""
+import argparse  # For command line options
+import base64  # Speech is returned as base64 in JSON
+import contextlib  # For silencing pipeline output
+import json  # Requests and responses
+import os  # For configuration via environment variables
+import sys  # Server log goes to stderr
+import threading  # Sessions are used from the HTTP handler threads
+import time  # For admission waits and idle sessions
+import uuid  # For session ids
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # One thread per connection
+from urllib.parse import urlparse, parse_qs  # For paths and query parameters
+from audio.clip import AudioClip  # Posted recordings are in-memory clips
+from utils.scheduler import Scheduler, JobCancelled, STAGE_WORKERS  # Utterances are cancellable jobs
+from utils.ratelimit import as_tenant, RateLimited  # Per-tenant upstream rate limits
+from utils.resilience import deadline, CircuitOpen, resilience_report  # Upstream retries stop at the utterance's deadline
+from utils.tracing import trace, spans  # Per-utterance timings from the utterance's trace
+from utils.benchmark import benchmark_summary, count_event, record_value  # Aggregate metrics
+
+# Utterances processed at once; more wait for a slot (up to SERVER_MAX_QUEUED) or are refused
+SERVER_MAX_ACTIVE = int(os.getenv("SERVER_MAX_ACTIVE", "4"))
+SERVER_MAX_QUEUED = int(os.getenv("SERVER_MAX_QUEUED", "16"))
+# Longest an utterance waits for a slot before being refused
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "30"))
+# Longest an admitted utterance may run
+UTTERANCE_TIMEOUT = float(os.getenv("UTTERANCE_TIMEOUT", "120"))
+# Sessions unused for this long are closed
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "600"))
+DEFAULT_TENANT = "default"
+
+
+class Overloaded(Exception):
+    """Raised by Admission.enter() when no slot is free and the queue is full (or the wait timed out)."""
+
+
+class Admission:
+    """
+    Bounds the utterances running at once to max_active. Up to max_queued callers wait
+    for a slot, in arrival order; further callers are refused right away.
+    """
+    def __init__(self, max_active=SERVER_MAX_ACTIVE, max_queued=SERVER_MAX_QUEUED, timeout=SERVER_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.active = 0
+        self.peak_active = 0
+        self.rejected = 0
+        self._waiting = []  # Tickets in arrival order
+        self._condition = threading.Condition()
+
+    @property
+    def queued(self):
+        return len(self._waiting)
+
+    def enter(self):
+        """Take a slot, waiting in line if needed. Returns the seconds waited; raises Overloaded."""
+        start = time.perf_counter()
+        with self._condition:
+            if self.active < self.max_active and not self._waiting:
+                return self._admit(start)
+            if len(self._waiting) >= self.max_queued:
+                self.rejected += 1
+                raise Overloaded(f"{self.active} utterances running and {len(self._waiting)} queued")
+            ticket = object()
+            self._waiting.append(ticket)
+            try:
+                admitted = self._condition.wait_for(
+                    lambda: self.active < self.max_active and self._waiting[0] is ticket, self.timeout)
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+            if not admitted:
+                self.rejected += 1
+                raise Overloaded(f"No slot within {self.timeout:.0f}s")
+            return self._admit(start)
+
+    def leave(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def _admit(self, start):
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        return time.perf_counter() - start
+
+
+class SessionOutput:
+    """Collects what an utterance would have played or copied, for the response."""
+    def __init__(self):
+        self.audio = []
+        self.clipboard = None
+
+    def play(self, data, stop_event=None):
+        if stop_event is not None and stop_event.is_set():
+            return False
+        self.audio.append(data)
+        return True
+
+    def copy(self, text):
+        self.clipboard = text
+
+
+class Session:
+    """One client's state: its tenant and the utterance it is running."""
+    def __init__(self, session_id, tenant):
+        self.id = session_id
+        self.tenant = tenant
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.utterances = 0
+        self.job = None
+        self.lock = threading.Lock()
+
+    def replace_job(self, submit):
+        """Cancel the running utterance (if any) and start a new one with submit()."""
+        with self.lock:
+            if self.job is not None and not self.job.done:
+                self.job.cancel()
+                count_event("server_utterances_superseded")
+            self.job = submit()
+            self.utterances += 1
+            self.last_used = time.monotonic()
+            return self.job
+
+    def close(self):
+        with self.lock:
+            if self.job is not None:
+                self.job.cancel()
+
+
+class SessionStore:
+    """Open sessions by id; idle sessions are closed when new ones are created."""
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, tenant):
+        self.expire()
+        with self._lock:
+            session = Session(uuid.uuid4().hex[:16], tenant)
+            self._sessions[session.id] = session
+        count_event("server_sessions_opened")
+        return session
+
+    def get(self, session_id):
+        return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+        return session
+
+    def expire(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [s for s in self._sessions.values() if s.last_used < cutoff and (s.job is None or s.job.done)]
+        for session in idle:
+            self.close(session.id)
+            count_event("server_sessions_expired")
+
+
+async def run_utterance(ctx, session, output, clip=None, transcript=None, timeout=UTTERANCE_TIMEOUT):
+    """
+    Job for one utterance of a session: the pipeline, on behalf of the session's tenant.
+    Upstream calls are not retried past timeout seconds from now (see utils.resilience).
+    """
+    from pipeline import process_audio, process_transcript  # Imported here: loads the tools on first use
+    with as_tenant(session.tenant), deadline(timeout):
+        if clip is not None:
+            return await process_audio(ctx, clip, play=output.play, copy=output.copy, summary=False)
+        with trace("total_processing", job=ctx.job.id):
+            return await process_transcript(ctx, transcript, output.play, output.copy)
+
+
+def stage_timings(trace_id):
+    """Seconds per span name in one utterance's trace."""
+    timings = {}
+    for record in spans(trace_id):
+        timings[record["name"]] = timings.get(record["name"], 0.0) + record["duration_ns"] / 1e9
+    return timings
+
+
+class AgentServer(ThreadingHTTPServer):
+    """HTTP server holding the sessions, the admission control and the shared scheduler."""
+    daemon_threads = True
+
+    def __init__(self, address, max_active=SERVER_MAX_ACTIVE, max_queued=SERVER_MAX_QUEUED,
+                 queue_timeout=SERVER_QUEUE_TIMEOUT, utterance_timeout=UTTERANCE_TIMEOUT, verbose=False):
+        super().__init__(address, AgentHandler)
+        self.verbose = verbose
+        self.admission = Admission(max_active, max_queued, queue_timeout)
+        self.sessions = SessionStore()
+        self.utterance_timeout = utterance_timeout
+        # Sessions cancel their own previous utterance, so jobs of different sessions run side by side
+        self.scheduler = Scheduler("concurrent", stage_workers=max(STAGE_WORKERS, 2 * max_active))
+
+    def server_close(self):
+        super().server_close()
+        self.scheduler.shutdown(cancel=True)
+
+    def handle_utterance(self, session, clip=None, transcript=None, include_audio=False):
+        """Run one utterance through admission control; returns (HTTP status, body, extra headers)."""
+        try:
+            waited = self.admission.enter()
+        except Overloaded as e:
+            count_event("server_rejected")
+            return 503, {"status": "overloaded", "error": str(e)}, {"Retry-After": "1"}
+        record_value("server_admission_wait", waited)
+        try:
+            output = SessionOutput()
+            job = session.replace_job(lambda: self.scheduler.submit(
+                run_utterance, session, output, clip=clip, transcript=transcript, timeout=self.utterance_timeout,
+                name=f"{session.id}-utterance"))
+            try:
+                result = job.result(self.utterance_timeout)
+            except TimeoutError:
+                job.cancel()
+                return 504, {"status": "timeout"}, {}
+        except JobCancelled:
+            return 409, {"status": "cancelled", "error": "Superseded by a newer utterance or the session was closed"}, {}
+        except RateLimited as e:
+            count_event("server_rate_limited")
+            return 429, {"status": "rate_limited", "error": str(e)}, {"Retry-After": "1"}
+        except CircuitOpen as e:
+            count_event("server_upstream_unavailable")
+            return 503, {"status": "upstream_unavailable", "error": str(e)}, {"Retry-After": "5"}
+        except Exception as e:
+            return 500, {"status": "error", "error": f"{type(e).__name__}: {e}"}, {}
+        finally:
+            self.admission.leave()
+        if result is None:
+            return 200, {"status": "no_speech", "admission_wait": waited}, {}
+        body = dict(result, status="done", admission_wait=waited, timings=stage_timings(result["trace_id"]),
+                    clipboard=output.clipboard, audio_chunks=len(output.audio),
+                    audio_bytes=sum(len(data) for data in output.audio))
+        if include_audio:
+            body["audio"] = [base64.b64encode(data).decode("ascii") for data in output.audio]
+        return 200, body, {}
+
+    def health(self):
+        return {"status": "ok", "sessions": len(self.sessions), "active": self.admission.active,
+                "queued": self.admission.queued, "peak_active": self.admission.peak_active,
+                "rejected": self.admission.rejected}
+
+
+class AgentHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send(200, self.server.health())
+        elif path == "/metrics":
+            self._send_text(200, benchmark_summary() + "\n" + resilience_report())
+        else:
+            self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if parts == ["sessions"]:
+            options = self._json_object(body) if body else {}
+            if options is None:
+                return
+            tenant = self.headers.get("X-Tenant") or options.get("tenant") or DEFAULT_TENANT
+            session = self.server.sessions.create(tenant)
+            self._send(201, {"session": session.id, "tenant": session.tenant})
+            return
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "utterances":
+            session = self.server.sessions.get(parts[1])
+            if session is None:
+                self._send(404, {"error": f"Unknown session: {parts[1]}"})
+                return
+            clip = transcript = None
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                options = self._json_object(body)
+                if options is None:
+                    return
+                transcript = options.get("transcript")
+                if not isinstance(transcript, str):
+                    transcript = None  # Answered with 400 below
+            elif body:
+                clip = AudioClip(wav_data=body)
+                try:
+                    clip.samples  # Decoded here (and kept for the job), so a bad upload is the client's error
+                except Exception:
+                    self._send(400, {"error": "The body is not a valid WAV recording"})
+                    return
+            if clip is None and not transcript:
+                self._send(400, {"error": "Post a WAV recording or JSON with a transcript"})
+                return
+            include_audio = parse_qs(url.query).get("audio") == ["1"]
+            status, result, headers = self.server.handle_utterance(session, clip, transcript, include_audio)
+            self._send(status, result, headers)
+            return
+        self._send(404, {"error": "Not found"})
+
+    def _json_object(self, body):
+        """Parse a JSON object from the request body, or answer 400 and return None."""
+        try:
+            value = json.loads(body)
+        except ValueError:
+            value = None
+        if not isinstance(value, dict):
+            self._send(400, {"error": "The body must be a JSON object"})
+            return None
+        return value
+
+    def do_DELETE(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "sessions" and self.server.sessions.close(parts[1]) is not None:
+            self._send(204, None)
+        else:
+            self._send(404, {"error": "Unknown session"})
+
+    def _send(self, status, payload, headers=None):
+        data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json")
+        self._finish(data, headers)
+
+    def _send_text(self, status, text):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self._finish(text.encode("utf-8"))
+
+    def _finish(self, data, headers=None):
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (localhost by default)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--max-active", type=int, default=SERVER_MAX_ACTIVE, help="Utterances processed at once")
+    parser.add_argument("--max-queued", type=int, default=SERVER_MAX_QUEUED, help="Utterances waiting for a slot")
+    parser.add_argument("--no-warm-up", action="store_true", help="Create API clients on first use instead")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline output and request log")
+    args = parser.parse_args()
+
+    server = AgentServer((args.host, args.port), args.max_active, args.max_queued, verbose=args.verbose)
+    if not args.no_warm_up:
+        from transcription.engines import STT_ENGINES  # Which STT clients to create
+        from utils.clients import warm_up_steps  # Shared by every session
+        from utils.startup import start_warm_up
+        start_warm_up(warm_up_steps(speech="google" in STT_ENGINES, openai="whisper" in STT_ENGINES))
+    print(f"[Server] Listening on http://{args.host}:{server.server_address[1]} "
+          f"({args.max_active} utterances at once, {args.max_queued} queued)", file=sys.stderr)
+    # Pipeline output from many sessions at once is unreadable; the responses carry the results
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n[Server] Shutting down...", file=sys.stderr)
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import os  # For accessing environment variables
-import google.generativeai as genai  # For Gemini API
 import json  # For parsing Gemini's JSON response
-from utils.benchmark import benchmark_function  # For benchmarking
+import random  # For sampling shadow checks
+import threading  # For shadow checks in the background
+import time  # For decision log timestamps
+from utils.benchmark import benchmark_function, count_event  # For benchmarking
+from utils.clients import get_gemini_model  # Shared long-lived Gemini model
+from utils.resilience import call, available  # Timeouts, retries, hedging and circuit breaker for Gemini
+from tools.local_intent import classify  # Local first-stage classifier
 
-# Load Gemini API key from environment
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable not set.")
-genai.configure(api_key=GEMINI_API_KEY)
+# Local decisions at or above this confidence skip Gemini (set above 1 to always use Gemini)
+LOCAL_INTENT_THRESHOLD = float(os.getenv("LOCAL_INTENT_THRESHOLD", "0.9"))
+# Fraction of local decisions that are also sent to Gemini in the background to measure agreement
+INTENT_SHADOW_RATE = float(os.getenv("INTENT_SHADOW_RATE", "0.1"))
+# Every decision is appended here as JSON, for tuning the threshold (empty string disables logging)
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", os.path.join("logs", "intent_decisions.jsonl"))
+
+_log_lock = threading.Lock()
+_agreement = {"agree": 0, "total": 0}
 
 # System prompt for Gemini
 SYSTEM_PROMPT = """
@@ -41,15 +50,54 @@ User: This is a note, uh, wait, make that a reminder for tomorrow
 {"intent": "clipboard", "query": "reminder for tomorrow"}
 """
 
-@benchmark_function("gemini_intent_detection")
+@benchmark_function("intent_detection")
 def detect_intent(text):
     """
-    Uses Gemini to detect the user's intent and extract a cleaned-up query and result length.
+    Detect the user's intent and extract a cleaned-up query and result length.
+    Clear-cut utterances are handled by the local classifier; the rest go to Gemini.
+    If Gemini is unavailable (circuit breaker open) or fails, the local decision is
+    used anyway, and the fallback is reported and counted.
     Returns a dict: {"intent": ..., "query": ..., "result_length": ...}
     """
-    model = genai.GenerativeModel("gemini-2.0-flash-lite")
+    local = classify(text)
+    decision = {"intent": local["intent"], "query": local["query"], "result_length": local["result_length"]}
+    if local["confidence"] >= LOCAL_INTENT_THRESHOLD:
+        count_event("intent_local")
+        print(f"[Intent] Local {local['source']} decision: {local['intent']} (confidence {local['confidence']:.2f})")
+        _log_decision(text, local, None)
+        if random.random() < INTENT_SHADOW_RATE and available("gemini"):
+            threading.Thread(target=_shadow_check, args=(text, local), daemon=True).start()
+        return decision
+    if not available("gemini"):
+        count_event("intent_gemini_unavailable")
+        print(f"[Intent] Gemini unavailable, using the local decision: {local['intent']} "
+              f"(confidence {local['confidence']:.2f})")
+        _log_decision(text, local, None)
+        return decision
+    count_event("intent_gemini")
+    try:
+        result = detect_intent_with_gemini(text)
+    except Exception as e:
+        count_event("intent_gemini_failed")
+        print(f"[Intent] Gemini failed ({type(e).__name__}: {e}), using the local decision: {local['intent']} "
+              f"(confidence {local['confidence']:.2f})")
+        _log_decision(text, local, None)
+        return decision
+    _record_agreement(text, local, result)
+    return result
+
+@benchmark_function("gemini_intent_detection")
+def detect_intent_with_gemini(text):
+    """
+    Uses Gemini to detect the user's intent and extract a cleaned-up query and result length.
+    Returns a dict: {"intent": ..., "query": ..., "result_length": ...}. Raises if Gemini
+    cannot be reached or its answer cannot be parsed.
+    """
+    model = get_gemini_model("gemini-2.0-flash-lite")
     prompt = SYSTEM_PROMPT + f"\nUser: {text}\n"
-    response = model.generate_content(prompt)
+    # Short and idempotent, so a slow call is hedged with a second one
+    response = call("gemini", lambda timeout: model.generate_content(prompt, request_options={"timeout": timeout}),
+                    hedge=True, op="intent")
     # Try to extract JSON from the response
     try:
         # Gemini may return text with code block formatting or extra text, so extract JSON
@@ -66,6 +114,41 @@ def detect_intent(text):
         result_length = result.get("result_length", "default")
         return {"intent": intent, "query": query, "result_length": result_length}
     except Exception as e:
-        print(f"[Intent Detection Error] Could not parse Gemini response: {e}\nResponse: {getattr(response, 'text', response)}")
-        # Fallback: treat as clipboard
-        return {"intent": "clipboard", "query": text, "result_length": "default"} 
\ No newline at end of file
+        raise ValueError(f"Could not parse Gemini response: {e}\nResponse: {getattr(response, 'text', response)}")
+
+def _shadow_check(text, local):
+    """Ask Gemini about an utterance that was decided locally, only to measure agreement."""
+    try:
+        _record_agreement(text, local, detect_intent_with_gemini(text), shadow=True)
+    except Exception as e:
+        print(f"[Intent] Shadow check failed: {e}")
+
+def _record_agreement(text, local, gemini, shadow=False):
+    agree = local["intent"] == gemini["intent"]
+    count_event("intent_agree" if agree else "intent_disagree")
+    with _log_lock:
+        _agreement["total"] += 1
+        _agreement["agree"] += agree
+        rate = _agreement["agree"] / _agreement["total"]
+    print(f"[Intent] Local {local['intent']} ({local['confidence']:.2f}) vs Gemini {gemini['intent']}, "
+          f"agreement so far {rate:.0%} of {_agreement['total']}")
+    _log_decision(text, local, gemini, shadow)
+
+def _log_decision(text, local, gemini, shadow=False):
+    if not INTENT_LOG_PATH:
+        return
+    entry = {
+        "time": time.time(),
+        "text": text,
+        "local": local,
+        "gemini": gemini,
+        "decided_by": "local" if gemini is None or shadow else "gemini",
+        "threshold": LOCAL_INTENT_THRESHOLD,
+    }
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(INTENT_LOG_PATH) or ".", exist_ok=True)
+            with open(INTENT_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"[Intent] Could not write decision log: {e}")
@@ -0,0 +1,165 @@
+import json  # For reading the example set
+import math  # For log probabilities
+import os  # For locating the bundled examples
+import re  # For the rule-based first stage
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_examples.jsonl")
+INTENTS = ("web_search", "tts", "clipboard")
+# Confidence given to utterances that are neither commands nor questions but that the model did not
+# take for dictation ("Weather in Paris tomorrow"): below LOCAL_INTENT_THRESHOLD, so Gemini decides
+DICTATION_CONFIDENCE = 0.6
+# Confidence of a bare command verb that also starts ordinary sentences ("Say hi to mom for me")
+BARE_VERB_CONFIDENCE = 0.6
+
+# Explicit commands, taken from the examples in tools.intent.SYSTEM_PROMPT. A bare verb ("say", "google")
+# only counts as explicit with a colon, "the following", or (google) "for" not followed by a pronoun:
+# a comma or "this" after it starts ordinary sentences just as often ("Say, what a day.")
+_SEARCH_COMMAND = re.compile(
+    r"^(?:please\s+)?(?:search(?:\s+the\s+web|\s+online|\s+the\s+internet)?(?:\s+for|\s+about)?|find\s+out|"
+    r"(?P<bare>look\s+up|google)(?P<object>\s*:|\s+(?:this|it)\s*:|\s+the\s+following\b|"
+    r"(?<=google)\s+for\b(?!\s+(?:me|us|you|him|her|them|it)\b))?)[\s,:]+(?P<query>.+)$",
+    re.IGNORECASE,
+)
+_TTS_COMMAND = re.compile(
+    r"^(?:please\s+)?(?:can\s+you\s+)?(?:(?:read\s+(?:this\s+)?(?:aloud|out\s+loud|to\s+me|out(?:\s+the\s+following)?)|"
+    r"repeat\s+after\s+me|pronounce)(?:\s+(?:this|it))?|"
+    r"(?P<bare>speak|say)(?P<object>\s*:|\s+(?:this|it)\s*:|\s+the\s+following\b)?)[\s,:]+(?P<query>.+)$",
+    re.IGNORECASE,
+)
+# Openings of questions and information requests; utterances without one (and without "?") are dictation
+_QUESTION_START = re.compile(
+    r"^(?:what|what's|whats|who|who's|when|where|why|how|which|is|are|does|do|can|will|"
+    r"explain|tell\s+me\s+about|find|show\s+me)\b",
+    re.IGNORECASE,
+)
+# Self-corrections and hesitations that need Gemini's rewriting ("um, actually, say Hello world instead")
+_CORRECTION = re.compile(
+    r"\b(?:actually|wait|scratch\s+that|i\s+mean|no\s+no|make\s+(?:that|it)\s+(?:a|the)|instead)\b", re.IGNORECASE,
+)
+_FILLERS = re.compile(r"\b(?:um+|uh+|erm+|hmm+)\b[,.]?\s*", re.IGNORECASE)
+_SHORT_HINT = re.compile(r",?\s*(?:make\s+it\s+short|briefly|in\s+short|quick(?:ly)?\s+answer)\.?$", re.IGNORECASE)
+_DETAILED_HINT = re.compile(r",?\s*(?:in\s+detail|make\s+it\s+detailed|explain\s+in\s+depth)\.?$", re.IGNORECASE)
+_SHORT_QUESTION = re.compile(r"^(?:what\s+time|what's\s+the\s+time|what\s+is\s+the\s+time|when|how\s+(?:old|tall|far|much|many))\b", re.IGNORECASE)
+_DETAILED_QUESTION = re.compile(r"^(?:explain|why|how\s+do|how\s+does|tell\s+me\s+about)\b", re.IGNORECASE)
+
+
+def _tokens(text):
+    words = re.findall(r"[a-z']+", text.lower())
+    # Unigrams, bigrams, and the first word (questions and commands are mostly decided by it)
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if words:
+        features.append(f"^{words[0]}")
+    return features
+
+
+class NaiveBayesIntent:
+    """Multinomial naive Bayes over word unigrams/bigrams, small enough to train at import."""
+    def __init__(self, alpha=0.5):
+        self.alpha = alpha
+        self.class_counts = {}
+        self.feature_counts = {}
+        self.totals = {}
+        self.vocabulary = set()
+
+    def train(self, examples):
+        for text, intent in examples:
+            self.class_counts[intent] = self.class_counts.get(intent, 0) + 1
+            counts = self.feature_counts.setdefault(intent, {})
+            for feature in _tokens(text):
+                counts[feature] = counts.get(feature, 0) + 1
+                self.totals[intent] = self.totals.get(intent, 0) + 1
+                self.vocabulary.add(feature)
+        return self
+
+    def predict_proba(self, text):
+        """Return a dict of intent -> probability."""
+        features = [f for f in _tokens(text) if f in self.vocabulary]
+        n_examples = sum(self.class_counts.values())
+        vocab_size = len(self.vocabulary)
+        scores = {}
+        for intent, count in self.class_counts.items():
+            counts = self.feature_counts[intent]
+            denominator = self.totals[intent] + self.alpha * vocab_size
+            score = math.log(count / n_examples)
+            for feature in features:
+                score += math.log((counts.get(feature, 0) + self.alpha) / denominator)
+            scores[intent] = score
+        top = max(scores.values())
+        exp = {intent: math.exp(score - top) for intent, score in scores.items()}
+        total = sum(exp.values())
+        return {intent: value / total for intent, value in exp.items()}
+
+
+def load_examples(path=EXAMPLES_PATH):
+    """Read (text, intent) pairs from a JSONL file with "text" and "intent" fields."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [(row["text"], row["intent"]) for row in map(json.loads, filter(str.strip, f))]
+
+
+_model = NaiveBayesIntent().train(load_examples())
+
+
+def _result_length(text):
+    if _SHORT_HINT.search(text) or _SHORT_QUESTION.search(text):
+        return "short"
+    if _DETAILED_HINT.search(text) or _DETAILED_QUESTION.search(text):
+        return "detailed"
+    return "default"
+
+
+def _remove_fillers(text):
+    return _FILLERS.sub("", text).strip()
+
+
+def _clean(text):
+    """Query text of a search or TTS command: no fillers, length hints or trailing punctuation."""
+    text = _remove_fillers(text)
+    text = _SHORT_HINT.sub("", text)
+    text = _DETAILED_HINT.sub("", text)
+    return text.strip(" ,.")
+
+
+def _rule_confidence(match):
+    """A bare verb ("say", "google") is only certainly a command in one of its explicit forms."""
+    if match.group("bare") and not match.group("object"):
+        return BARE_VERB_CONFIDENCE
+    return 0.97
+
+
+def classify(text):
+    """
+    Classify an utterance locally. Returns a dict with the same keys as
+    tools.intent.detect_intent ("intent", "query", "result_length") plus
+    "confidence" (0-1) and "source" ("rule" or "model"). Callers should fall back
+    to Gemini when the confidence is below their threshold.
+    """
+    stripped = text.strip()
+    needs_rewrite = bool(_CORRECTION.search(stripped))
+
+    match = _SEARCH_COMMAND.match(stripped)
+    if match:
+        query = _clean(match.group("query"))
+        return {"intent": "web_search", "query": query, "result_length": _result_length(stripped),
+                "confidence": 0.8 if needs_rewrite else _rule_confidence(match), "source": "rule"}
+    match = _TTS_COMMAND.match(stripped)
+    if match:
+        return {"intent": "tts", "query": _clean(match.group("query")), "result_length": "default",
+                "confidence": 0.5 if needs_rewrite else _rule_confidence(match), "source": "rule"}
+
+    probabilities = _model.predict_proba(stripped)
+    intent = max(probabilities, key=probabilities.get)
+    confidence = probabilities[intent]
+    if intent == "tts":
+        confidence = min(confidence, 0.8)  # TTS without a recognized command: let Gemini extract the text
+    elif intent != "clipboard" and not _QUESTION_START.match(stripped) and not stripped.endswith("?"):
+        # Looks like a request but is not phrased as a command or question: most likely dictation,
+        # but not certain enough to skip Gemini ("I wonder what the capital of France is.")
+        intent = "clipboard"
+        confidence = DICTATION_CONFIDENCE
+    if needs_rewrite:
+        confidence = min(confidence, 0.5)  # Only Gemini can apply self-corrections
+    # Dictation is kept as spoken (punctuation and all); only commands are reduced to their query
+    query = _remove_fillers(stripped) if intent == "clipboard" else _clean(stripped)
+    return {"intent": intent, "query": query,
+            "result_length": _result_length(stripped) if intent == "web_search" else "default",
+            "confidence": confidence, "source": "model"}
@@ -0,0 +1,86 @@
+import re  # For tokenizing and paragraph splitting
+import numpy as np  # For vectorized BM25 scoring
+from utils.cache import normalize_query  # Drops filler words from the query
+
+PASSAGE_CHARS = 600  # Short paragraphs are merged up to about this many characters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+")
+
+
+def split_passages(text, target_chars=PASSAGE_CHARS):
+    """
+    Split page text into passages: paragraphs, with short ones merged and long ones
+    cut at sentence ends, so passages are roughly target_chars long.
+    """
+    passages = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > target_chars * 2:
+            cut = paragraph.rfind(". ", 0, target_chars * 2)
+            cut = cut + 1 if cut > target_chars // 2 else target_chars
+            passages.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + len(paragraph) > target_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        passages.append(current)
+    return passages
+
+
+def bm25_scores(query, passages, k1=BM25_K1, b=BM25_B):
+    """
+    Score each passage against the query with Okapi BM25. The term-frequency matrix
+    is built in one bincount over all tokens, so scoring is a few array operations.
+    Returns a float array aligned with passages.
+    """
+    tokens = [_WORD.findall(p.lower()) for p in passages]
+    query_terms = list(dict.fromkeys(_WORD.findall(normalize_query(query))))
+    lengths = np.array([len(t) for t in tokens], dtype=np.float64)
+    if not query_terms or not lengths.any():
+        return np.zeros(len(passages))
+    # Map every token to a vocabulary index; query terms absent from the passages score nothing
+    vocabulary = {term: i for i, term in enumerate(query_terms)}
+    flat = np.array([vocabulary.get(t, -1) for words in tokens for t in words], dtype=np.int64)
+    owner = np.repeat(np.arange(len(passages)), lengths.astype(np.int64))
+    keep = flat >= 0
+    tf = np.bincount(owner[keep] * len(query_terms) + flat[keep],
+                     minlength=len(passages) * len(query_terms)).reshape(len(passages), len(query_terms))
+    df = (tf > 0).sum(axis=0)
+    idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+    norm = k1 * (1 - b + b * lengths / lengths.mean())
+    return ((tf * (k1 + 1)) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+
+def top_passages(query, pages, k=8, max_chars=None, target_chars=PASSAGE_CHARS):
+    """
+    Rank the passages of several pages by BM25 relevance to the query and return the
+    best k as (url, passage, score) tuples, best first. pages maps url -> text (None
+    entries are skipped). max_chars optionally caps the total passage length.
+    """
+    candidates = [(url, passage) for url, text in pages.items() if text
+                  for passage in split_passages(text, target_chars)]
+    if not candidates:
+        return []
+    scores = bm25_scores(query, [passage for _, passage in candidates])
+    order = np.argsort(-scores, kind="stable")  # Ties keep page order
+    selected = []
+    total = 0
+    for i in order[:k]:
+        url, passage = candidates[i]
+        if max_chars is not None and total + len(passage) > max_chars and selected:
+            break
+        selected.append((url, passage, float(scores[i])))
+        total += len(passage)
+    return selected
+
+
+def format_passages(passages):
+    """Number passages for a prompt: "[1] (url)\\ntext"."""
+    return "\n\n".join(f"[{i}] ({url})\n{passage}" for i, (url, passage, _) in enumerate(passages, 1))
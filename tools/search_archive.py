@@ -0,0 +1,352 @@
+"""
+Append-only archive of web search results: the query, answer, links, summary and
+scraped text of every answered search, kept searchable instead of one text file per
+query that a later query with the same first 50 characters overwrites.
+
+Records are zlib-compressed and appended to segment files (segment-<n>.z, each
+record framed by its length). An SQLite index next to them maps each record to its
+segment and offset, holds the small fields (query, answer, links) so lookups never
+touch the segments, and has an FTS5 full-text index over queries, URLs, summaries
+and page text. Appends and compaction each run in one SQLite write transaction, which
+also serializes segment writes, so several threads and processes (the agent, the
+server, batch runs) can share one archive.
+
+Compaction drops records older than the retention period, then the oldest ones while
+the archive is over its size budget, deletes segments that no longer hold any record
+and rewrites those that are mostly dead into the active segment.
+
+The tools write through archive_results(), which queues the record for a background
+writer thread, so archiving is off the critical path of the utterance.
+
+Usage: python -m tools.search_archive search "words" | latest "query" | show KEY | compact | stats
+"""
+import json  # Records are stored as JSON
+import os  # For the archive directory and configuration
+import sqlite3  # Index and full-text search
+import struct  # Length prefix of each record in a segment
+import sys  # For the command line
+import threading  # The index connection is shared between threads
+import time  # For record times and retention
+import uuid  # Record keys are known before the record is written
+import zlib  # Records are compressed in the segments
+from concurrent.futures import ThreadPoolExecutor, wait  # Background writer
+from utils.benchmark import benchmark_block, count_event  # Write timings and counters
+from utils.cache import normalize_query  # Lookups match the same queries as the answer cache
+from utils.tracing import in_context  # Background writes stay in the utterance's trace
+
+ARCHIVE_DIR = os.getenv("SEARCH_ARCHIVE_DIR", "search_results")
+# Records older than this are removed by compaction
+ARCHIVE_RETENTION_DAYS = float(os.getenv("SEARCH_ARCHIVE_RETENTION_DAYS", "90"))
+# Compressed size above which compaction also removes the oldest records
+ARCHIVE_MAX_BYTES = int(os.getenv("SEARCH_ARCHIVE_MAX_MB", "500")) * 1024 * 1024
+SEGMENT_BYTES = 16 * 1024 * 1024  # A new segment is started once the active one is this large
+COMPACT_EVERY = 200               # Appends between compactions (also run when a segment fills up)
+REWRITE_BELOW = 0.5               # Segments with less than this fraction of live bytes are rewritten
+_FRAME = struct.Struct(">I")
+
+
+class SearchArchive:
+    """
+    Compressed append-only segments with an SQLite index (see the module docstring).
+    Safe to use from several threads; several processes may share the directory.
+    """
+    def __init__(self, path=ARCHIVE_DIR, retention_days=ARCHIVE_RETENTION_DAYS, max_bytes=ARCHIVE_MAX_BYTES,
+                 segment_bytes=SEGMENT_BYTES):
+        self.path = path
+        self.retention = retention_days * 24 * 60 * 60
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self._appends = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Transactions are explicit (BEGIN IMMEDIATE), so writers in other processes wait for each other
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False, timeout=30,
+                                   isolation_level=None)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS segments (id INTEGER PRIMARY KEY, created REAL NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, created REAL NOT NULL,"
+                " query TEXT NOT NULL, normalized TEXT NOT NULL, result_length TEXT, answer TEXT, links TEXT,"
+                " segment INTEGER NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS records_normalized ON records (normalized, created)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS records_segment ON records (segment)")
+            # Contentless: the text lives only in the compressed segments
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5("
+                " query, urls, summary, text, content='', tokenize='porter unicode61')"
+            )
+
+    def append(self, record):
+        """
+        Write a record: a dict with key, query and optionally created, result_length,
+        answer, results (dicts with title and href), summary and pages (url -> text).
+        """
+        created = record.get("created") or time.time()
+        record = dict(record, created=created)
+        payload = zlib.compress(json.dumps(record).encode("utf-8"))
+        with self._lock:
+            self._begin()
+            try:
+                segment, offset, rolled = self._write_frame(payload)
+                cursor = self._db.execute(
+                    "INSERT INTO records (key, created, query, normalized, result_length, answer, links,"
+                    " segment, offset, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record["key"], created, record["query"], normalize_query(record["query"]),
+                     record.get("result_length"), record.get("answer"), json.dumps(record.get("results") or []),
+                     segment, offset, len(payload)),
+                )
+                self._db.execute("INSERT INTO records_fts (rowid, query, urls, summary, text) VALUES (?, ?, ?, ?, ?)",
+                                 (cursor.lastrowid, *_fts_values(record)))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._appends += 1
+            due = rolled or self._appends % COMPACT_EVERY == 0
+        if due:
+            self.compact()
+        return record["key"]
+
+    def latest(self, query, max_age=None, result_length=None):
+        """Most recent record for the same normalized query (index fields only), or None."""
+        sql = "SELECT " + _SUMMARY_FIELDS + " FROM records WHERE normalized = ?"
+        params = [normalize_query(query)]
+        if max_age is not None:
+            sql += " AND created >= ?"
+            params.append(time.time() - max_age)
+        if result_length is not None:
+            sql += " AND result_length = ?"
+            params.append(result_length)
+        with self._lock:
+            row = self._db.execute(sql + " ORDER BY created DESC LIMIT 1", params).fetchone()
+        return _summary(row) if row is not None else None
+
+    def search(self, text, limit=10):
+        """Records matching any word of text in their query, URLs, summary or page text, best first."""
+        words = "".join(c if c.isalnum() else " " for c in text).split()
+        if not words:
+            return []
+        match = " OR ".join(f'"{w}"' for w in words)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT " + ", ".join("r." + f for f in _SUMMARY_FIELDS.split(", ")) +
+                " FROM records_fts JOIN records r ON r.id = records_fts.rowid"
+                " WHERE records_fts MATCH ? ORDER BY bm25(records_fts) LIMIT ?", (match, limit)
+            ).fetchall()
+        return [_summary(row) for row in rows]
+
+    def get(self, key):
+        """The full record stored under key, or None."""
+        for _ in range(2):  # Compaction in another process may move the record while it is read
+            with self._lock:
+                row = self._db.execute("SELECT segment, offset, length FROM records WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            try:
+                return json.loads(zlib.decompress(self._read(*row)))
+            except (OSError, zlib.error):
+                continue
+        return None
+
+    def stats(self):
+        """Records, segments and bytes (compressed) in the archive."""
+        with self._lock:
+            records, live = self._db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM records").fetchone()
+            segments = [row[0] for row in self._db.execute("SELECT id FROM segments")]
+        on_disk = sum(os.path.getsize(self._segment_path(s)) for s in segments
+                      if os.path.exists(self._segment_path(s)))
+        return {"records": records, "segments": len(segments), "live_bytes": live, "disk_bytes": on_disk}
+
+    def compact(self, now=None):
+        """Apply retention and the size budget, then drop empty and rewrite mostly dead segments."""
+        now = time.time() if now is None else now
+        with benchmark_block("search_archive_compaction"), self._lock:
+            self._begin()
+            try:
+                expired = self._db.execute("SELECT id, segment, offset, length FROM records WHERE created < ?",
+                                           (now - self.retention,)).fetchall()
+                size = self._db.execute("SELECT COALESCE(SUM(length), 0) FROM records WHERE created >= ?",
+                                        (now - self.retention,)).fetchone()[0]
+                if size > self.max_bytes:
+                    for row in self._db.execute("SELECT id, segment, offset, length FROM records WHERE created >= ?"
+                                                " ORDER BY created", (now - self.retention,)).fetchall():
+                        if size <= self.max_bytes * 0.9:
+                            break
+                        expired.append(row)
+                        size -= row[3]
+                for record_id, segment, offset, length in expired:
+                    self._remove(record_id, segment, offset, length)
+                removed = self._rewrite_segments()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        # Only after the commit: until then the index still pointed into these segments
+        for segment in removed:
+            try:
+                os.remove(self._segment_path(segment))
+            except FileNotFoundError:
+                pass
+        if expired:
+            count_event("search_archive_expired", len(expired))
+        if removed:
+            count_event("search_archive_segments_removed", len(removed))
+        return {"expired": len(expired), "segments_removed": len(removed)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _begin(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f"segment-{segment:06d}.z")
+
+    def _read(self, segment, offset, length):
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def _write_frame(self, payload, rollover=True):
+        """Append payload to the active segment (inside a write transaction); returns (segment, offset, rolled)."""
+        row = self._db.execute("SELECT MAX(id) FROM segments").fetchone()
+        segment = row[0]
+        rolled = False
+        if segment is None or (rollover and _size(self._segment_path(segment)) >= self.segment_bytes):
+            rolled = segment is not None
+            segment = self._db.execute("INSERT INTO segments (created) VALUES (?)", (time.time(),)).lastrowid
+        with open(self._segment_path(segment), "ab") as f:
+            f.write(_FRAME.pack(len(payload)))
+            offset = f.tell()
+            f.write(payload)
+        return segment, offset, rolled
+
+    def _remove(self, record_id, segment, offset, length):
+        try:
+            record = json.loads(zlib.decompress(self._read(segment, offset, length)))
+            # A contentless FTS5 row is deleted by repeating the values it was indexed with
+            self._db.execute("INSERT INTO records_fts (records_fts, rowid, query, urls, summary, text)"
+                             " VALUES ('delete', ?, ?, ?, ?, ?)", (record_id, *_fts_values(record)))
+        except (OSError, zlib.error, ValueError):
+            pass  # Unreadable record: its index terms stay behind, but match nothing in records
+        self._db.execute("DELETE FROM records WHERE id = ?", (record_id,))
+
+    def _rewrite_segments(self):
+        """Move live records out of mostly dead segments; returns the segments to delete."""
+        active = self._db.execute("SELECT MAX(id) FROM segments").fetchone()[0]
+        removed = []
+        for (segment,) in self._db.execute("SELECT id FROM segments WHERE id != ?", (active,)).fetchall():
+            live = self._db.execute("SELECT id, offset, length FROM records WHERE segment = ?", (segment,)).fetchall()
+            disk = _size(self._segment_path(segment))
+            if live and sum(length for _, _, length in live) >= disk * REWRITE_BELOW:
+                continue
+            for record_id, offset, length in live:
+                # Moved as they are, still compressed, into the active segment (which may grow past its size)
+                new_segment, new_offset, _ = self._write_frame(self._read(segment, offset, length), rollover=False)
+                self._db.execute("UPDATE records SET segment = ?, offset = ? WHERE id = ?",
+                                 (new_segment, new_offset, record_id))
+            self._db.execute("DELETE FROM segments WHERE id = ?", (segment,))
+            removed.append(segment)
+        return removed
+
+
+_SUMMARY_FIELDS = "key, created, query, result_length, answer, links"
+
+
+def _summary(row):
+    key, created, query, result_length, answer, links = row
+    return {"key": key, "created": created, "query": query, "result_length": result_length,
+            "answer": answer, "results": json.loads(links or "[]")}
+
+
+def _fts_values(record):
+    pages = record.get("pages") or {}
+    urls = " ".join([r.get("href", "") for r in record.get("results") or []] + list(pages))
+    return (record["query"], urls, record.get("summary") or "", "\n\n".join(t for t in pages.values() if t))
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+_archive = None
+_archive_lock = threading.Lock()
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive-writer")
+_pending = set()
+
+
+def get_archive():
+    """Return the process-wide archive (in ARCHIVE_DIR), opening it on first use."""
+    global _archive
+    if _archive is None:
+        with _archive_lock:
+            if _archive is None:
+                _archive = SearchArchive(ARCHIVE_DIR)
+    return _archive
+
+
+def new_key():
+    """Key for a record about to be archived (returned to the caller before the write happens)."""
+    return uuid.uuid4().hex[:16]
+
+
+def archive_results(key, query, answer=None, summary=None, pages=None, results=None, result_length=None):
+    """Queue a search result for the background writer; returns at once."""
+    record = {"key": key, "created": time.time(), "query": query, "result_length": result_length,
+              "answer": answer, "results": results or [], "summary": summary, "pages": pages or {}}
+    future = _writer.submit(in_context(_write, record))
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+
+
+def _write(record):
+    try:
+        with benchmark_block("archive_write"):
+            get_archive().append(record)
+    except Exception as e:
+        count_event("search_archive_write_failed")
+        print(f"[Archive] Could not archive the results for '{record['query']}': {e}")
+
+
+def flush(timeout=None):
+    """Block until queued records have been written (or timeout seconds have passed)."""
+    wait(list(_pending), timeout=timeout)
+
+
+def main(argv):
+    if len(argv) < 1 or argv[0] not in ("search", "latest", "show", "compact", "stats"):
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+    archive = get_archive()
+    command, args = argv[0], argv[1:]
+    if command == "search":
+        for hit in archive.search(" ".join(args)):
+            print(f"{hit['key']}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(hit['created']))}  {hit['query']}")
+    elif command == "latest":
+        print(json.dumps(archive.latest(" ".join(args)), indent=2))
+    elif command == "show":
+        record = archive.get(args[0]) if args else None
+        if record is None:
+            print("No such record")
+            return 1
+        print(f"Query: {record['query']}\n\nAnswer:\n{record.get('answer') or ''}\n\n---\n")
+        print("Summary:\n" + (record.get("summary") or "") + "\n\n---\n")
+        for url, text in (record.get("pages") or {}).items():
+            print(f"URL: {url}\n{text}\n\n---\n")
+    elif command == "compact":
+        print(archive.compact())
+    else:
+        print(archive.stats())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
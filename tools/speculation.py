@@ -0,0 +1,113 @@
+import os  # For configuration via environment variables
+import threading  # For cancelling the speculative scrape
+import time  # For head start and wasted work
+from concurrent.futures import ThreadPoolExecutor  # Speculative searches run here
+from tools.local_intent import classify  # Cheap local guess at the intent
+from utils.benchmark import count_event, record_value  # Hit rate and wasted work
+from utils.cache import get_cache, normalize_query  # Shared cache, query comparison
+from utils.tracing import in_context  # The speculative search is part of the utterance's trace
+
+# SPECULATIVE_SEARCH=0 turns speculation off
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "1") == "1"
+# Local web_search confidence needed to start a speculative search (lower than the
+# threshold for skipping Gemini: a wrong guess only costs a discarded search)
+SPECULATION_THRESHOLD = float(os.getenv("SPECULATION_THRESHOLD", "0.5"))
+# Word overlap (Jaccard, after normalize_query) needed for the final query to reuse the speculative one
+QUERY_MATCH_THRESHOLD = 0.75
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-search")
+
+
+def query_overlap(a, b):
+    """Jaccard similarity of the normalized query words."""
+    words_a = set(normalize_query(a).split())
+    words_b = set(normalize_query(b).split())
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class SpeculativeSearch:
+    """
+    A DuckDuckGo search and page prefetch started before the intent is known.
+    fetch(query, max_results, cache, cancel) does the work (default:
+    tools.web_search.fetch_pages). commit() hands the result over if the final
+    query matches; cancel() abandons it.
+    """
+    def __init__(self, query, max_results=3, fetch=None):
+        if fetch is None:
+            from tools.web_search import fetch_pages as fetch  # Imported here: it configures Gemini on import
+        self.query = query
+        self.max_results = max_results
+        self.cancel_event = threading.Event()
+        self.started = time.perf_counter()
+        self.finished = None
+        self.settled = False
+        self.future = _executor.submit(in_context(self._run, fetch))
+        count_event("speculation_started")
+
+    def _run(self, fetch):
+        try:
+            return fetch(self.query, self.max_results, get_cache(), self.cancel_event)
+        finally:
+            self.finished = time.perf_counter()
+
+    def matches(self, query, max_results=3):
+        return max_results == self.max_results and query_overlap(query, self.query) >= QUERY_MATCH_THRESHOLD
+
+    def commit(self, timeout=None):
+        """
+        Wait for the speculative work and return its (results, scraped), or None if it
+        failed. Records how much of the search ran before the intent was known.
+        """
+        self.settled = True
+        head_start = time.perf_counter() - self.started
+        try:
+            prefetched = self.future.result(timeout=timeout)
+        except Exception as e:
+            print(f"[Speculation] Speculative search failed, searching again: {e}")
+            count_event("speculation_failed")
+            return None
+        count_event("speculation_hit")
+        record_value("speculation_saved_seconds", min(head_start, self.finished - self.started))
+        return prefetched
+
+    def cancel(self):
+        """Abandon the speculative work and record how much of it was wasted (no-op once settled)."""
+        if self.settled:
+            return
+        self.settled = True
+        self.cancel_event.set()
+        self.future.cancel()
+        wasted = (self.finished or time.perf_counter()) - self.started
+        record_value("speculation_wasted_seconds", wasted)
+
+
+def speculate_search(transcript, max_results=3, fetch=None):
+    """
+    Start a speculative search if the local classifier thinks the transcript is a
+    web search. Returns a SpeculativeSearch, or None if speculation is off or unlikely to pay.
+    """
+    if not SPECULATIVE_SEARCH:
+        return None
+    guess = classify(transcript)
+    if guess["intent"] != "web_search" or guess["confidence"] < SPECULATION_THRESHOLD or not guess["query"]:
+        return None
+    print(f"[Speculation] Searching ahead for: {guess['query']}")
+    return SpeculativeSearch(guess["query"], max_results, fetch)
+
+
+def settle(speculation, intent, query, max_results=3):
+    """
+    Resolve a speculation against the detected intent and query. Returns the prefetched
+    (results, scraped) to pass to search_duckduckgo_stream, or None to search normally.
+    """
+    if speculation is None:
+        if intent == "web_search":
+            count_event("speculation_not_started")
+        return None
+    if intent == "web_search" and speculation.matches(query, max_results):
+        return speculation.commit()
+    count_event("speculation_miss")
+    speculation.cancel()
+    return None
@@ -1,57 +1,202 @@
-from gtts import gTTS  # For converting text to speech using Google TTS
-import tempfile  # For creating a temporary file to store the audio
-import os  # For file cleanup
-import pygame  # For playing the generated audio file (cross-platform)
-from utils.benchmark import benchmark_function, benchmark_block  # For benchmarking
+import io  # For playing audio from memory
+import queue  # For handing synthesized sentences to the playback thread
+import re  # For sentence splitting
+import time  # For time-to-first-audio
+from utils.benchmark import benchmark_function, benchmark_block, record_value  # For benchmarking
+from tools.tts_engines import synthesize  # Cached synthesis (gTTS by default)
+from utils.tracing import in_context  # Sentence synthesis belongs to the utterance's trace
 import threading  # For interruption support
 
-# Global variable to track if speech is playing
-_speech_playing = False
+# Internal stop events of the playbacks in progress, set by stop_speech()
+_playbacks = set()
+_playbacks_lock = threading.Lock()
+_mixer_lock = threading.Lock()
+_mixer_ready = False
+
+# Sentences synthesized ahead of playback in speak_stream
+SYNTHESIS_LOOKAHEAD = 2
+# Longest wait for the mixer to drain after a sound's nominal length has elapsed (seconds)
+PLAYBACK_TAIL = 0.5
+# How often a playback checks the caller's stop_event (seconds); stop_speech() wakes it at once
+STOP_POLL = 0.02
+
+# A sentence ends at . ! or ? (plus closing quotes/brackets) followed by whitespace, or at a newline
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+|\n+")
+# Words ending in a period that do not end a sentence
+_ABBREVIATIONS = {"mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "vs.", "etc.", "e.g.", "i.e.", "u.s.", "u.k.", "no.", "approx."}
+
+
+def init_mixer():
+    """Initialize the pygame mixer once per process (safe to call repeatedly)."""
+    global _mixer_ready
+    if not _mixer_ready:
+        with _mixer_lock:
+            if not _mixer_ready:
+                import pygame  # For playing the generated audio (imported on first use: slow to load)
+                pygame.mixer.init()
+                _mixer_ready = True
+
+
+def _stopped(stop, stop_event, timeout):
+    """Wait up to timeout for the playback's own stop event or the caller's stop_event; True if either fired."""
+    if stop_event is None:
+        return stop.wait(timeout)
+    end = time.perf_counter() + timeout
+    while not stop_event.is_set():
+        remaining = end - time.perf_counter()
+        if remaining <= 0:
+            return False
+        if stop.wait(min(STOP_POLL, remaining)):
+            return True
+    return True
+
+
+def play_audio(data, stop_event=None):
+    """
+    Play encoded audio (e.g. MP3 bytes) from memory and block until playback finishes.
+    Each playback waits on its own internal event, which stop_speech() sets, and also
+    stops when the caller's stop_event is set (stop_speech() never sets that one).
+    Returns False if playback was stopped, True otherwise.
+    """
+    init_mixer()
+    import pygame  # Already loaded by init_mixer()
+    sound = pygame.mixer.Sound(file=io.BytesIO(data))
+    stop = threading.Event()
+    with _playbacks_lock:
+        _playbacks.add(stop)
+    try:
+        channel = sound.play()
+        if channel is None:
+            # Every mixer channel is busy (e.g. overlapping playbacks): take over the longest-running one
+            channel = pygame.mixer.find_channel(True)
+            channel.play(sound)
+        if _stopped(stop, stop_event, sound.get_length()):
+            channel.stop()
+            return False
+        # The mixer may still be draining its buffer when the nominal length has elapsed
+        tail_end = time.perf_counter() + PLAYBACK_TAIL
+        while channel.get_busy() and time.perf_counter() < tail_end:
+            if _stopped(stop, stop_event, 0.01):
+                channel.stop()
+                return False
+        return True
+    finally:
+        with _playbacks_lock:
+            _playbacks.discard(stop)
+
 
 @benchmark_function("gtts_speech")
-def speak_text(text, lang="en", stop_event=None):
+def speak_text(text, lang="en", stop_event=None, play=play_audio):
     """
-    Convert the given text to speech using gTTS and play it aloud using pygame.
-    If stop_event is set and triggered, stop playback immediately.
+    Convert the given text to speech (cached, see tools.tts_engines) and play it aloud using pygame
+    (or play(data, stop_event)). If stop_event is set and triggered, stop playback immediately.
     Includes granular benchmarking for TTS generation and playback.
     """
-    global _speech_playing
-    with benchmark_block("gtts_generation"):
-        print("Generating TTS...")
-        tts = gTTS(text=text, lang=lang)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-            temp_path = fp.name
-            tts.save(temp_path)
-    try:
-        pygame.mixer.init()
-        with benchmark_block("tts_playback"):
-            print("Speaking answer: load ...")
-            pygame.mixer.music.load(temp_path)
-            print("Speaking answer: play ...")
-            pygame.mixer.music.play()
-            _speech_playing = True
-            # Wait for playback to finish or interruption
-            while pygame.mixer.music.get_busy():
-                if stop_event and stop_event.is_set():
-                    pygame.mixer.music.stop()
+    print("Generating TTS...")
+    data = synthesize(text, lang)
+    with benchmark_block("tts_playback"):
+        print("Speaking answer ...")
+        play(data, stop_event)
+
+
+def split_sentences(chunks):
+    """
+    Turn a stream of text chunks (e.g. LLM tokens) into a stream of complete sentences.
+    Each sentence is yielded as soon as its end is seen; the remainder is flushed at the end.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        for match in _SENTENCE_END.finditer(buffer):
+            candidate = buffer[start:match.end()].strip()
+            last_word = candidate.rsplit(None, 1)[-1].lstrip("\"'([").lower() if candidate else ""
+            if last_word in _ABBREVIATIONS:
+                continue
+            if candidate:
+                yield candidate
+            start = match.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+@benchmark_function("tts_stream")
+def speak_stream(chunks, lang="en", stop_event=None, synthesize=synthesize, play=play_audio):
+    """
+    Speak a stream of text chunks sentence by sentence: each sentence is synthesized
+    as soon as it is complete and queued for playback, so speech starts after the first
+    sentence instead of after the whole answer. Synthesis runs up to SYNTHESIS_LOOKAHEAD
+    sentences ahead of playback. stop_event stops playback mid-sentence and stops
+    synthesis at the next sentence boundary. Returns the text that was received.
+    """
+    start = time.perf_counter()
+    audio_queue = queue.Queue(maxsize=SYNTHESIS_LOOKAHEAD)
+    received = []
+    stopped = threading.Event()
+
+    def stopping():
+        return stopped.is_set() or (stop_event is not None and stop_event.is_set())
+
+    def produce():
+        try:
+            for sentence in split_sentences(chunks):
+                received.append(sentence)
+                if stopping():
+                    break
+                with benchmark_block("tts_sentence_synthesis"):
+                    data = synthesize(sentence, lang)
+                # Wait for room in the queue, but give up promptly when interrupted
+                while not stopping():
+                    try:
+                        audio_queue.put(data, timeout=0.05)
+                        break
+                    except queue.Full:
+                        pass
+        except Exception as e:
+            print(f"[TTS] Streaming synthesis failed: {e}")
+        finally:
+            # Wait for room for the end marker only while the consumer is still reading
+            while True:
+                try:
+                    audio_queue.put(None, timeout=0.05)
                     break
-                pygame.time.Clock().tick(10)
+                except queue.Full:
+                    if stopped.is_set():
+                        break
+
+    producer = threading.Thread(target=in_context(produce), daemon=True)
+    producer.start()
+    first = True
+    try:
+        while True:
+            data = audio_queue.get()
+            if data is None:
+                break
+            if stopping():
+                continue  # Drain so the producer can finish
+            if first:
+                record_value("tts_time_to_first_audio", time.perf_counter() - start)
+                first = False
+            if not play(data, stop_event):
+                stopped.set()
     finally:
-        _speech_playing = False
-        try:
-            pygame.mixer.music.unload()
-        except Exception:
-            pass
-        os.remove(temp_path)
+        # Also when play() raised: stop the producer and empty the queue so it is never left blocked
+        stopped.set()
+        while producer.is_alive():
+            try:
+                audio_queue.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        producer.join()
+    return " ".join(received)
+
 
 def stop_speech():
     """
-    Stop any ongoing speech playback immediately.
+    Stop every speech playback in progress immediately.
     """
-    global _speech_playing
-    if _speech_playing:
-        try:
-            pygame.mixer.music.stop()
-        except Exception:
-            pass
-        _speech_playing = False 
\ No newline at end of file
+    with _playbacks_lock:
+        playbacks = list(_playbacks)
+    for stop in playbacks:
+        stop.set()  # Wakes its play_audio, which stops its channel
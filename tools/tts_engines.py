@@ -0,0 +1,228 @@
+import io  # For in-memory synthesis output
+import os  # For configuration and the disk tier
+import threading  # The cache is shared between the synthesis and processing threads
+import time  # For the fake engine
+from collections import OrderedDict  # LRU order of the memory tier
+from utils.benchmark import benchmark_block, count_event  # For benchmarking
+from utils.cache import make_key  # Content-addressed cache keys
+from utils.ratelimit import limit  # Per-tenant rate limits when running as a service
+
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+TTS_CACHE_MB = float(os.getenv("TTS_CACHE_MB", "32"))            # Memory tier budget
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("cache", "tts"))  # Disk tier; empty disables it
+TTS_DISK_CACHE_MB = float(os.getenv("TTS_DISK_CACHE_MB", "200"))  # Disk tier budget
+
+
+class TTSEngine:
+    """
+    Interface for a text-to-speech engine.
+
+    synthesize() returns the encoded audio (format is its file extension). Engines
+    must be deterministic for a given text and language, since results are cached.
+    """
+    name = None
+    format = "mp3"
+
+    def synthesize(self, text, lang="en"):
+        raise NotImplementedError
+
+
+class GTTSEngine(TTSEngine):
+    """Google Text-to-Speech via gTTS."""
+    name = "gtts"
+
+    def synthesize(self, text, lang="en"):
+        from gtts import gTTS  # Imported on first use
+        buf = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buf)
+        return buf.getvalue()
+
+
+class FakeTTS(TTSEngine):
+    """
+    Offline stand-in for tests: "synthesizes" after synth_delay seconds (the audio
+    is the UTF-8 text) and "plays" for seconds_per_char per character, honoring
+    stop_event. Everything played is recorded in self.played.
+    """
+    format = "txt"
+
+    def __init__(self, synth_delay=0.0, seconds_per_char=0.0, name="fake"):
+        self.name = name
+        self.synth_delay = synth_delay
+        self.seconds_per_char = seconds_per_char
+        self.calls = 0
+        self.played = []
+
+    def synthesize(self, text, lang="en"):
+        self.calls += 1
+        time.sleep(self.synth_delay)
+        return text.encode("utf-8")
+
+    def play(self, data, stop_event=None):
+        deadline = time.perf_counter() + len(data) * self.seconds_per_char
+        while time.perf_counter() < deadline:
+            if stop_event is not None and stop_event.wait(0.01):
+                return False
+        self.played.append(data.decode("utf-8"))
+        return True
+
+
+class SynthesisCache:
+    """
+    Two-tier cache of synthesized audio keyed by (engine, language, text): an
+    in-memory LRU bounded to max_bytes, backed by an optional directory of files
+    bounded to disk_max_bytes (least recently used files are removed first).
+    Safe to use from several threads.
+    """
+    def __init__(self, max_bytes=TTS_CACHE_MB * 1024 * 1024, directory=TTS_CACHE_DIR,
+                 disk_max_bytes=TTS_DISK_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory or None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    @staticmethod
+    def key(engine, text, lang):
+        return make_key(engine.name, lang, text)
+
+    def get(self, key, fmt):
+        """Return the cached audio, or None. Disk hits are promoted to memory."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                count_event("tts_cache_memory_hit")
+                return data
+        path = self._path(key, fmt)
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # The modification time is the disk tier's LRU order
+            except OSError:
+                data = None
+            if data is not None:
+                count_event("tts_cache_disk_hit")
+                self._remember(key, data)
+                return data
+        count_event("tts_cache_miss")
+        return None
+
+    def set(self, key, fmt, data):
+        self._remember(key, data)
+        path = self._path(key, fmt)
+        if path is None:
+            return
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # Readers never see a partial file
+        except OSError as e:
+            print(f"[TTS] Could not write cache file {path}: {e}")
+            return
+        with self._lock:
+            self._disk_size += len(data)
+            if self._disk_size > self.disk_max_bytes:
+                self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            if self.directory:
+                for entry in os.scandir(self.directory):
+                    os.remove(entry.path)
+                self._disk_size = 0
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, f"{key}.{fmt}") if self.directory else None
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                count_event("tts_cache_evictions")
+
+    def _evict_disk(self):
+        # Remove the least recently used files until usage is down to 90% of the budget
+        files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in os.scandir(self.directory) if entry.is_file())
+        size = sum(entry_size for _, entry_size, _ in files)
+        for _, entry_size, path in files:
+            if size <= self.disk_max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._disk_size = size
+
+
+_engines = {}
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def register_tts_engine(engine):
+    """Add an engine to the registry (replacing any engine with the same name)."""
+    _engines[engine.name] = engine
+
+
+def get_tts_engine(name=None):
+    """Return a registered engine by name (default: TTS_ENGINE)."""
+    name = name or TTS_ENGINE
+    if name not in _engines:
+        raise ValueError(f"Unknown TTS engine '{name}'. Registered: {', '.join(_engines)}")
+    return _engines[name]
+
+
+def get_synthesis_cache():
+    """Return the process-wide synthesis cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SynthesisCache()
+    return _cache
+
+
+def synthesize(text, lang="en", engine=None, cache=None):
+    """
+    Return the synthesized audio for text, from the cache when possible.
+    engine is a TTSEngine or a registered name (default: TTS_ENGINE); cache
+    defaults to the process-wide SynthesisCache (pass False to bypass it).
+    """
+    if not isinstance(engine, TTSEngine):
+        engine = get_tts_engine(engine)
+    if cache is None:
+        cache = get_synthesis_cache()
+    key = SynthesisCache.key(engine, text, lang)
+    if cache:
+        data = cache.get(key, engine.format)
+        if data is not None:
+            return data
+    limit("tts")
+    with benchmark_block(f"{engine.name}_generation"):
+        data = engine.synthesize(text, lang)
+    if cache:
+        cache.set(key, engine.format, data)
+    return data
+
+
+register_tts_engine(GTTSEngine())
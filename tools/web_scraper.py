@@ -1,33 +1,140 @@
-import trafilatura  # For robust web page text extraction
-import requests  # For fetching web pages
+import threading  # For per-host limits and cancelling in-flight fetches
+import time  # For the overall deadline
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait  # Fetch and extraction pools
+from urllib.parse import urlsplit  # For grouping URLs by host
+from utils.clients import get_http_session  # Shared keep-alive HTTP session
+from utils.cache import make_key  # Keys for the optional page cache
+from utils.resilience import call, UpstreamStatus  # Retries of transient failures within the deadline
 
+FETCH_WORKERS = 8      # Concurrent page downloads across all hosts
+EXTRACT_WORKERS = 2    # trafilatura runs here, so parsing never holds up a download slot
+PER_HOST_LIMIT = 2     # Concurrent downloads from any single host
+FETCH_TIMEOUT = 10     # Connect/read timeout per request (seconds)
+DEADLINE = 12          # Overall time budget for scrape_urls (seconds)
+READ_CHUNK = 64 * 1024
 
-def scrape_urls(urls, max_length=20000):
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="scrape-fetch")
+_extract_pool = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="scrape-extract")
+_host_limits = {}
+_host_limits_lock = threading.Lock()
+
+
+def scrape_urls(urls, max_length=20000, deadline=DEADLINE, per_host_limit=PER_HOST_LIMIT, cache=None, cancel=None):
     """
     Scrape and extract main text content from a list of URLs using trafilatura.
     Returns a dict mapping each URL to its extracted text (or None if failed).
     Limits total combined text length to max_length characters.
+
+    Pages are fetched concurrently (at most per_host_limit at a time from one host)
+    and extracted in a separate worker pool. Once max_length characters have been
+    collected, the remaining fetches are cancelled and those URLs are left out of
+    the result. URLs still outstanding when the deadline expires map to None.
+    If cache (a utils.cache.Cache) is given, full page texts are read from and stored in its "page" layer.
+    Setting cancel (a threading.Event owned by the caller) abandons the scrape like
+    the deadline does.
     """
+    import trafilatura  # For robust web page text extraction (imported on first use: slow to load)
     results = {}
     total_length = 0
-    for url in urls:
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                text = trafilatura.extract(response.text, url=url)
-                if text:
-                    # Truncate if total length would exceed max_length
-                    if total_length + len(text) > max_length:
-                        text = text[:max_length - total_length]
-                    results[url] = text
-                    total_length += len(text)
-                    if total_length >= max_length:
-                        break
-                else:
+    stop = threading.Event()  # Set when scrape_urls returns, to stop fetches still in flight
+    stop_at = time.monotonic() + deadline
+    pending = {}  # future -> (url, stage)
+    extracted = []  # (url, text) ready to be added to the results
+    for url in dict.fromkeys(urls):
+        text = cache.get("page", make_key(url)) if cache is not None else None
+        if text is not None:
+            extracted.append((url, text))
+        else:
+            pending[_fetch_pool.submit(_fetch, url, stop, cancel, stop_at, per_host_limit)] = (url, "fetch")
+
+    while extracted or (pending and total_length < max_length):
+        for url, value in extracted:
+            if total_length < max_length:
+                # Truncate if total length would exceed max_length
+                if total_length + len(value) > max_length:
+                    value = value[:max_length - total_length]
+                results[url] = value
+                total_length += len(value)
+        extracted = []
+        if not pending or total_length >= max_length:
+            break
+        remaining = stop_at - time.monotonic()
+        if remaining <= 0 or _stopped(stop, cancel):
+            break
+        done, _ = wait(list(pending), timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            url, stage = pending.pop(future)
+            try:
+                value = future.result()
+            except Exception as e:
+                print(f"[WebScraper] Error scraping {url}: {e}")
+                value = None
+            if stage == "fetch":
+                if value is None:
                     results[url] = None
-            else:
+                else:
+                    pending[_extract_pool.submit(trafilatura.extract, value, url=url)] = (url, "extract")
+            elif not value:
                 results[url] = None
-        except Exception as e:
-            print(f"[WebScraper] Error scraping {url}: {e}")
+            else:
+                if cache is not None:
+                    cache.set("page", make_key(url), value)
+                extracted.append((url, value))
+
+    cancelled = _stopped(stop, cancel)
+    stop.set()
+    for future, (url, stage) in pending.items():
+        future.cancel()
+        if total_length < max_length:
+            if not cancelled:
+                print(f"[WebScraper] Deadline reached before {url} finished ({stage})")
             results[url] = None
-    return results 
\ No newline at end of file
+    # Keep the caller's URL order
+    return {url: results[url] for url in dict.fromkeys(urls) if url in results}
+
+
+def _host_limit(host, limit):
+    with _host_limits_lock:
+        semaphore = _host_limits.get((host, limit))
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(limit)
+            _host_limits[(host, limit)] = semaphore
+        return semaphore
+
+
+def _stopped(stop, cancel):
+    return stop.is_set() or (cancel is not None and cancel.is_set())
+
+
+def _fetch(url, stop, cancel, stop_at, per_host_limit):
+    """
+    Download url and return the raw body (trafilatura detects the encoding itself),
+    or None on failure. Gives up as soon as stop or cancel is set or the deadline passes.
+    """
+    semaphore = _host_limit(urlsplit(url).netloc, per_host_limit)
+    if not semaphore.acquire(timeout=max(0.0, stop_at - time.monotonic())):
+        return None
+    try:
+        if _stopped(stop, cancel):
+            return None
+
+        def open_page(timeout):
+            response = get_http_session().get(url, timeout=min(FETCH_TIMEOUT, timeout), stream=True)
+            if response.status_code != 200:
+                response.close()
+                raise UpstreamStatus(response.status_code, url)
+            return response
+
+        with call("http", open_page, until=stop_at, cancel_event=cancel) as response:
+            chunks = []
+            for chunk in response.iter_content(READ_CHUNK):
+                if _stopped(stop, cancel) or time.monotonic() > stop_at:
+                    return None
+                chunks.append(chunk)
+            return b"".join(chunks)
+    except Exception as e:
+        if not _stopped(stop, cancel):
+            print(f"[WebScraper] Error scraping {url}: {e}")
+        return None
+    finally:
+        semaphore.release()
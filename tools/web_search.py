@@ -1,84 +1,373 @@
-from duckduckgo_search import DDGS  # For performing DuckDuckGo web searches
 from tools.web_scraper import scrape_urls  # For scraping web page content
-import os  # For file operations
-import google.generativeai as genai  # For Gemini summarization and answer extraction
+from tools.ranking import top_passages, format_passages  # BM25 pre-filter for the single-call answer
+import os  # For configuration via environment variables
 import json  # For parsing Gemini's JSON response
-from utils.benchmark import benchmark_block  # For benchmarking
+import time  # For the fake answer stream and time-to-first-token
+import itertools  # For re-joining the first streamed chunk with the rest
+from concurrent.futures import ThreadPoolExecutor, wait  # Deferred summaries
+from utils.benchmark import benchmark_block, record_value, count_event  # For benchmarking
+from utils.tracing import in_context  # Deferred summaries stay in the utterance's trace
+from utils.clients import get_ddgs, get_gemini_model  # Shared long-lived DDG and Gemini clients
+from utils.cache import get_cache, make_key, normalize_query  # Persistent cache for every stage
+from utils.resilience import call, available  # Timeouts, retries and circuit breakers for DuckDuckGo and Gemini
+from tools.search_archive import archive_results, get_archive, new_key, flush as flush_archive  # Searchable results archive
 
-# Ensure search_results directory exists
-RESULTS_DIR = "search_results"
-os.makedirs(RESULTS_DIR, exist_ok=True)
+# Use Gemini for summarization and answer extraction (configured on first use, see utils.clients)
+GEMINI_MODEL = "gemini-2.0-flash-lite"
 
-# Use Gemini for summarization and answer extraction
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+# How the answer is produced from the scraped pages:
+#   single   - rank passages with BM25 and send only the best ones in one call that returns
+#              the spoken answer followed by the archival summary
+#   two_call - summarize all scraped text, then extract the answer from the summary
+ANSWER_MODES = ("single", "two_call")
+ANSWER_MODE = os.getenv("SEARCH_ANSWER_MODE", "single")
+# SEARCH_DEFER_SUMMARY=1 (single mode): the call returns only the answer, and the summary of
+# the full scraped text is written by a background task off the critical path
+DEFER_SUMMARY = os.getenv("SEARCH_DEFER_SUMMARY") == "1"
+TOP_K_PASSAGES = int(os.getenv("SEARCH_TOP_K", "8"))
+PASSAGE_BUDGET = 6000  # Maximum characters of passages sent in single mode
+SUMMARY_MARKER = "===SUMMARY==="
+# Seconds for which an archived answer to the same query is served without searching again
+# (0: only when the search itself fails). Answers like "time in Paris" go stale, so off by default.
+ARCHIVE_MAX_AGE = float(os.getenv("SEARCH_ARCHIVE_MAX_AGE", "0"))
+# Passages read out when Gemini cannot answer (circuit breaker open or the call failed)
+FALLBACK_PASSAGES = {"short": 1, "default": 2, "detailed": 3}
+
+_LENGTH_INSTRUCTIONS = {
+    "short": "answer the question as directly as possible in 1-2 informative sentences.",
+    "detailed": "answer the question in a well-structured paragraph or two, providing as much relevant detail as possible.",
+    "default": "answer the question concisely but completely.",
+}
+
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-summary")
+_pending_summaries = set()
+
+
+def answer_prompt(query, summary, result_length="default"):
+    """Build the prompt asking Gemini for a direct answer from the summary, sized by result_length."""
+    instruction = _LENGTH_INSTRUCTIONS.get(result_length, _LENGTH_INSTRUCTIONS["default"])
+    return (
+        f"Based on the following summary, {instruction}\n"
+        f"Question: {query}\n\nSummary:\n{summary}"
+    )
+
+
+def summary_prompt(query, text):
+    """Build the prompt asking Gemini to summarize the scraped text."""
+    return (
+        f"Summarize the following information from multiple web pages about '{query}'. "
+        "Focus on accuracy, clarity, and completeness.\n\n" + text
+    )
+
+
+def passages_prompt(query, passages, result_length="default", with_summary=True):
+    """
+    Build the single-call prompt: answer from the numbered passages, then (with_summary)
+    a line with SUMMARY_MARKER followed by the archival summary.
+    """
+    instruction = _LENGTH_INSTRUCTIONS.get(result_length, _LENGTH_INSTRUCTIONS["default"])
+    summary_instruction = (
+        f"Then write a line containing only {SUMMARY_MARKER}, followed by a summary of the passages. "
+        "Focus on accuracy, clarity, and completeness.\n" if with_summary else ""
+    )
+    return (
+        f"Based on the following passages from web pages, {instruction}\n"
+        f"{summary_instruction}"
+        f"Question: {query}\n\nPassages:\n{passages}"
+    )
 
 
 def search_duckduckgo(query, result_length="default", max_results=3):
     """
-    Search DuckDuckGo for the given query, scrape the top links, summarize with Gemini, save to file,
-    and extract a direct answer using Gemini. Returns (answer, file_path, results).
+    Search DuckDuckGo for the given query, scrape the top links, summarize with Gemini, archive
+    the results, and extract a direct answer using Gemini. Returns (answer, record, results):
+    record is the key of the results in the archive (see tools.search_archive), or None.
     'results' is a list of dicts with 'title' and 'href' only.
+    Every stage is cached (see utils.cache), so a repeated question is answered from disk.
     """
+    chunks, record, results = search_duckduckgo_stream(query, result_length, max_results)
+    return ("".join(chunks).strip(), record, results)
+
+
+def search_duckduckgo_stream(query, result_length="default", max_results=3, prefetched=None, cancel=None):
+    """
+    Like search_duckduckgo, but returns (chunks, record, results) where chunks is an
+    iterator over the answer text as Gemini generates it, so speech can start on the
+    first sentence. Search and scraping run before this returns; the answer is cached
+    and archived once the iterator has been fully consumed. prefetched is an optional
+    (results, scraped) pair from fetch_pages() for this query (see tools.speculation).
+    Setting cancel (a threading.Event) abandons the scrape. If the search fails, the
+    latest archived answer to the same query is returned instead, if there is one.
+    """
+    cache = get_cache()
+    normalized = normalize_query(query)
+    answer_key = make_key(normalized, result_length, max_results)
+    cached = cache.get("answer", answer_key)
+    if cached is not None:
+        print(f"[Cache] Answer for '{normalized}' served from cache")
+        return (iter([cached["answer"]]), cached.get("record"), cached["results"])
+    if ARCHIVE_MAX_AGE > 0:
+        archived = get_archive().latest(query, max_age=ARCHIVE_MAX_AGE, result_length=result_length)
+        if archived is not None and archived["answer"]:
+            count_event("answer_from_archive")
+            print(f"[Archive] Answer for '{normalized}' served from the archive")
+            return (iter([archived["answer"]]), archived["key"], archived["results"])
+
+    # 1-2. Search DuckDuckGo and scrape the top links (unless a speculative search already did)
+    try:
+        results, scraped = prefetched if prefetched is not None else fetch_pages(query, max_results, cache, cancel)
+    except Exception as e:
+        archived = get_archive().latest(query)
+        if archived is None or not archived["answer"]:
+            raise
+        count_event("answer_from_archive")
+        print(f"[Archive] Search failed ({type(e).__name__}: {e}), answering from the archive of "
+              f"{time.strftime('%Y-%m-%d', time.localtime(archived['created']))}")
+        return (iter([archived["answer"]]), archived["key"], archived["results"])
+    if not any(scraped.values()):
+        return (iter(["No relevant content could be scraped from the top results."]), None, results)
+
+    # 3. Answer (and summarize) with Gemini; the answer, summary and scraped text are archived
+    record = new_key()
+
+    def on_answer(answer):
+        cache.set("answer", answer_key, {"answer": answer, "record": record, "results": results})
+
+    chunks = answer_stream(query, scraped, result_length, get_gemini_model(GEMINI_MODEL),
+                           record=record, results=results, cache=cache, on_answer=on_answer)
+
+    # 4. Return the answer stream, archive key, and results (links only)
+    return (chunks, record, results)
+
+
+def fetch_pages(query, max_results=3, cache=None, cancel=None):
+    """
+    Search DuckDuckGo for the query and scrape the top links. Returns (results, scraped):
+    the hits as dicts with 'title' and 'href', and a dict of url -> page text (or None).
+    Both stages use the cache when one is given; setting cancel abandons the scrape.
+    """
+    normalized = normalize_query(query)
     # 1. Search DuckDuckGo
     with benchmark_block("duckduckgo_search"):
-        links = []
-        results = []
-        with DDGS() as ddgs:
-            for r in ddgs.text(query, max_results=max_results):
+        search_key = make_key(normalized, max_results)
+        results = cache.get("search", search_key) if cache is not None else None
+        if results is None:
+            # The DDGS client has its own request timeout, so the attempt timeout is not passed on
+            hits = call("search", lambda timeout: list(get_ddgs().text(query, max_results=max_results)),
+                        cancel_event=cancel)
+            results = []
+            for r in hits:
                 if r.get("href"):
-                    links.append(r["href"])
                     results.append({
                         "title": r.get("title", ""),
                         "href": r.get("href", "")
                     })
+            if cache is not None:
+                cache.set("search", search_key, results)
+        links = [r["href"] for r in results]
 
-    # 2. Scrape content from top links
+    # 2. Scrape content from top links (pages scraped recently come from the cache)
+    if cancel is not None and cancel.is_set():
+        return (results, {})
     with benchmark_block("web_scraping"):
-        scraped = scrape_urls(links)
-        combined_text = "\n\n".join([t for t in scraped.values() if t])
-        if not combined_text:
-            return ("No relevant content could be scraped from the top results.", None, results)
+        scraped = scrape_urls(links, cache=cache, cancel=cancel)
+    return (results, scraped)
+
+
+def answer_stream(query, pages, result_length="default", model=None, record=None, results=None,
+                  mode=None, defer_summary=None, cache=None, on_answer=None):
+    """
+    Produce the answer for query from the scraped pages (url -> text) as a stream of
+    text chunks, and archive the answer, summary, links (results) and pages under the
+    key record (nothing is archived if record is None). mode and defer_summary default
+    to ANSWER_MODE and DEFER_SUMMARY. In two_call mode the summary is made before this
+    returns; otherwise it comes with the answer (or, deferred, from a background task).
+    on_answer(answer) is called once the answer is complete.
+
+    If Gemini is unavailable or fails before the first chunk, the best passages are
+    read out instead (see fallback_answer); that answer is neither cached nor archived.
+    """
+    model = model or get_gemini_model(GEMINI_MODEL)
+    mode = mode or ANSWER_MODE
+    defer_summary = DEFER_SUMMARY if defer_summary is None else defer_summary
+    if mode not in ANSWER_MODES:
+        raise ValueError(f"Unknown answer mode '{mode}'. Choose from: {', '.join(ANSWER_MODES)}")
+
+    deferred = None  # Future of the deferred summary
 
-    # 3. Summarize all content with Gemini (no intent/result_length here)
+    def answered(answer, summary):
+        if on_answer is not None:
+            on_answer(answer)
+        pending = deferred
+        if pending is None and summary is None:
+            # The model left out the summary marker: make the summary with its own call, in the background
+            pending = _defer_summary(model, query, pages, cache)
+        if pending is None:
+            save_results(record, query, answer, summary, pages, results, result_length)
+        else:
+            # Archived once the summary is ready (right away if it already is)
+            pending.add_done_callback(
+                lambda future: save_results(record, query, answer, future.result(), pages, results, result_length))
+
+    if not available("gemini"):
+        return iter([fallback_answer(query, pages, result_length, "Gemini is unavailable")])
+    if mode == "two_call":
+        try:
+            summary = summarize(model, query, pages, cache)
+        except Exception as e:
+            return iter([fallback_answer(query, pages, result_length, f"{type(e).__name__}: {e}")])
+        return stream_answer(model, answer_prompt(query, summary, result_length),
+                             lambda answer, _: answered(answer, summary),
+                             fallback=lambda reason: fallback_answer(query, pages, result_length, reason))
+
+    with benchmark_block("passage_ranking"):
+        passages = top_passages(query, pages, k=TOP_K_PASSAGES, max_chars=PASSAGE_BUDGET)
+    record_value("answer_context_chars", sum(len(passage) for _, passage, _ in passages))
+    context = format_passages(passages)
+    if defer_summary:
+        deferred = _defer_summary(model, query, pages, cache)
+        return stream_answer(model, passages_prompt(query, context, result_length, with_summary=False), answered,
+                             fallback=lambda reason: fallback_answer(query, pages, result_length, reason, passages))
+    return stream_answer(model, passages_prompt(query, context, result_length), answered, marker=SUMMARY_MARKER,
+                         fallback=lambda reason: fallback_answer(query, pages, result_length, reason, passages))
+
+
+def fallback_answer(query, pages, result_length="default", reason="", passages=None):
+    """
+    Extractive answer for when Gemini cannot be used: the BM25-best passages of the
+    scraped pages (passages, if already ranked), as many as result_length asks for.
+    """
+    count_event("answer_fallback")
+    print(f"[WebSearch] Answering from the top passages ({reason})")
+    if passages is None:
+        passages = top_passages(query, pages, k=TOP_K_PASSAGES, max_chars=PASSAGE_BUDGET)
+    best = [passage for _, passage, _ in passages[:FALLBACK_PASSAGES.get(result_length, 2)]]
+    if not best:
+        return "No relevant content could be scraped from the top results."
+    return "Here is what I found: " + " ".join(best)
+
+
+def summarize(model, query, pages, cache=None):
+    """Summarize all scraped text with Gemini (cached by prompt when a cache is given)."""
     with benchmark_block("gemini_summarization"):
-        model = genai.GenerativeModel("gemini-2.0-flash-lite")
-        summary_prompt = (
-            f"Summarize the following information from multiple web pages about '{query}'. "
-            "Focus on accuracy, clarity, and completeness.\n\n" + combined_text
-        )
-        summary_response = model.generate_content(summary_prompt)
-        summary = summary_response.text.strip()
-
-    # 4. Save full scraped text and summary to a file
-    with benchmark_block("file_saving"):
-        safe_query = "_".join(query.lower().split())[:50]
-        file_path = os.path.join(RESULTS_DIR, f"{safe_query}.txt")
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(f"Query: {query}\n\n---\n\n")
-            f.write("Summary:\n" + summary + "\n\n---\n\n")
-            for url, text in scraped.items():
-                f.write(f"URL: {url}\n{text}\n\n---\n\n")
-
-    # 5. Ask Gemini for a direct answer to the original question, using the summary and result_length
+        prompt = summary_prompt(query, "\n\n".join([t for t in pages.values() if t]))
+        summary_key = make_key(prompt)
+        summary = cache.get("summary", summary_key) if cache is not None else None
+        if summary is None:
+            summary_response = call("gemini", lambda timeout: model.generate_content(
+                prompt, request_options={"timeout": timeout}), op="summary")
+            _record_tokens(summary_response, "gemini_summary")
+            summary = summary_response.text.strip()
+            if cache is not None:
+                cache.set("summary", summary_key, summary)
+    return summary
+
+
+def save_results(record, query, answer, summary, pages, results=None, result_length=None):
+    """Queue the answer, summary, links and full scraped text for the archive (skipped if record is None)."""
+    if record is None:
+        return
+    archive_results(record, query, answer=answer, summary=summary, pages=pages, results=results,
+                    result_length=result_length)
+
+
+def _defer_summary(model, query, pages, cache):
+    """Make the summary on the background executor; returns its future (None if it failed)."""
+    future = _background.submit(in_context(_summarize_quietly, model, query, pages, cache))
+    _pending_summaries.add(future)
+    future.add_done_callback(_pending_summaries.discard)
+    return future
+
+
+def _summarize_quietly(model, query, pages, cache):
+    try:
+        return summarize(model, query, pages, cache)
+    except Exception as e:
+        print(f"[WebSearch] Deferred summary failed: {e}")
+        return None
+
+
+def wait_for_summaries(timeout=None):
+    """Block until deferred summaries have been made and archived (or timeout seconds have passed)."""
+    start = time.perf_counter()
+    wait(list(_pending_summaries), timeout=timeout)
+    flush_archive(None if timeout is None else max(0.0, timeout - (time.perf_counter() - start)))
+
+
+def stream_answer(model, prompt, on_complete=None, marker=None, fallback=None):
+    """
+    Yield the answer text chunk by chunk as Gemini streams it. Records the time to the
+    first chunk. If marker is given, text after it is not yielded but passed on as the
+    second argument of on_complete(answer, rest) (rest is None without a marker, or if
+    the model never wrote it; that is counted as answer_marker_missing).
+    on_complete is called only if the stream is consumed to the end, so an interrupted
+    answer is never cached. Opening the stream and its first chunk are retried (see
+    utils.resilience); if that fails and fallback is given, fallback(reason) is yielded
+    instead and on_complete is not called.
+    """
+    parts = []
+    rest = []
+    pending = ""  # Text held back because it may be the start of the marker
+    in_rest = False
+
+    def open_stream(timeout):
+        response = model.generate_content(prompt, stream=True, request_options={"timeout": timeout})
+        chunks = iter(response)
+        return response, list(itertools.islice(chunks, 1)), chunks
+
     with benchmark_block("gemini_answer_extraction"):
-        if result_length == "short":
-            answer_prompt = (
-                f"Based on the following summary, answer the question as directly as possible in 1-2 informative sentences.\n"
-                f"Question: {query}\n\nSummary:\n{summary}"
-            )
-        elif result_length == "detailed":
-            answer_prompt = (
-                f"Based on the following summary, answer the question in a well-structured paragraph or two, providing as much relevant detail as possible.\n"
-                f"Question: {query}\n\nSummary:\n{summary}"
-            )
-        else:
-            answer_prompt = (
-                f"Based on the following summary, answer the question concisely but completely.\n"
-                f"Question: {query}\n\nSummary:\n{summary}"
-            )
-        answer_response = model.generate_content(answer_prompt)
-        answer = answer_response.text.strip()
-
-    # 6. Return the answer, file path, and results (links only)
-    return (answer, file_path, results) 
\ No newline at end of file
+        start = time.perf_counter()
+        try:
+            response, first, chunks = call("gemini", open_stream, op="answer")
+        except Exception as e:
+            if fallback is None:
+                raise
+            yield fallback(f"{type(e).__name__}: {e}")
+            return
+        for chunk in itertools.chain(first, chunks):
+            try:
+                text = chunk.text
+            except ValueError:
+                continue  # Chunk without text (e.g. only safety metadata)
+            if not text:
+                continue
+            if in_rest:
+                rest.append(text)
+                continue
+            if marker:
+                pending += text
+                index = pending.find(marker)
+                if index >= 0:
+                    in_rest = True
+                    rest.append(pending[index + len(marker):])
+                    text, pending = pending[:index], ""
+                else:
+                    safe = len(pending) - len(marker) + 1
+                    text, pending = (pending[:safe], pending[safe:]) if safe > 0 else ("", pending)
+                if not text:
+                    continue
+            if not parts:
+                record_value("gemini_answer_first_token", time.perf_counter() - start)
+            parts.append(text)
+            yield text
+        if pending:
+            parts.append(pending)
+            yield pending
+        _record_tokens(response, "gemini_answer")
+    if marker and not in_rest:
+        count_event("answer_marker_missing")
+    if on_complete is not None:
+        on_complete("".join(parts).strip(), "".join(rest).strip() if in_rest else None)
+
+
+def _record_tokens(response, name):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_value(f"{name}_prompt_tokens", usage.prompt_token_count)
+
+
+def fake_answer_stream(answer, chunk_chars=12, delay=0.03):
+    """Offline stand-in for a streamed Gemini answer: yields answer in chunk_chars pieces, delay seconds apart."""
+    for i in range(0, len(answer), chunk_chars):
+        time.sleep(delay)
+        yield answer[i:i + chunk_chars]
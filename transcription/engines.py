@@ -0,0 +1,281 @@
+import os  # For configuration via environment variables
+import threading  # For cancellation events and the stats lock
+import time  # For measuring engine latency
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait  # Shared worker pool for engine calls
+from utils.benchmark import benchmark_block  # For benchmarking
+from utils.tracing import in_context  # Engine spans belong to the utterance's trace
+from utils.ratelimit import limit  # Per-tenant rate limits when running as a service
+from utils.resilience import available  # Engines whose circuit breaker is open are skipped
+
+# How to use the registered engines for each utterance:
+#   single  - call one engine (STT_ENGINE, or the fastest by observed latency)
+#   race    - call all engines, the first good result wins and the rest are cancelled
+#   compare - call all engines, wait for all of them and print them side by side
+#   hedged  - call the preferred engine, and a second one only if it has not answered within STT_HEDGE_MS
+POLICIES = ("single", "race", "compare", "hedged")
+STT_POLICY = os.getenv("STT_POLICY", "race")
+STT_ENGINE = os.getenv("STT_ENGINE")  # Preferred engine name (None = pick by latency stats)
+STT_ENGINES = [n for n in os.getenv("STT_ENGINES", "whisper,google").split(",") if n]
+STT_HEDGE_MS = int(os.getenv("STT_HEDGE_MS", "1500"))
+# Threads for engine calls, shared by all utterances (race and compare call every engine at once)
+STT_WORKERS = int(os.getenv("STT_WORKERS", "8"))
+
+# Weight of the newest sample in each engine's moving-average latency
+LATENCY_EWMA_ALPHA = 0.3
+
+_executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt")
+
+
+class STTEngine:
+    """
+    Interface for a speech-to-text engine.
+
+    transcribe() receives an AudioClip and the payload format and returns the text.
+    It may check cancel_event and return early once another engine has won.
+    """
+    name = None
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        raise NotImplementedError
+
+
+class WhisperEngine(STTEngine):
+    """Adapter for transcription.openai_whisper.transcribe_with_whisper."""
+    name = "whisper"
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        from transcription.openai_whisper import transcribe_with_whisper  # Imported on first use (needs OPENAI_API_KEY)
+        return transcribe_with_whisper(clip, fmt=fmt)
+
+
+class GoogleEngine(STTEngine):
+    """Adapter for transcription.google_stt.transcribe_with_google_stt."""
+    name = "google"
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        from transcription.google_stt import transcribe_with_google_stt  # Imported on first use
+        return transcribe_with_google_stt(clip, fmt=fmt)
+
+
+class FakeEngine(STTEngine):
+    """
+    Local engine for tests and benchmarks: returns a fixed transcript after a
+    configurable delay, or raises if error is set. Honors cancel_event.
+    """
+    def __init__(self, name="fake", text="hello world", latency=0.0, error=None):
+        self.name = name
+        self.text = text
+        self.latency = latency
+        self.error = error
+        self.calls = 0
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        self.calls += 1
+        if self.latency:
+            if cancel_event is not None:
+                if cancel_event.wait(self.latency):
+                    return None
+            else:
+                time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+
+class TranscriptFileEngine(STTEngine):
+    """
+    Offline engine for batch runs and regression tests: returns the known transcript
+    of the recording the clip came from (clip.path). Transcripts come from the
+    transcripts dict (path -> text) or a sidecar file next to the recording
+    (recording.wav -> recording.txt); None if there is neither.
+    """
+    def __init__(self, name="transcript_file", latency=0.0, transcripts=None):
+        self.name = name
+        self.latency = latency
+        self.transcripts = transcripts if transcripts is not None else {}
+
+    def transcribe(self, clip, fmt="wav", cancel_event=None):
+        if self.latency and cancel_event is not None and cancel_event.wait(self.latency):
+            return None
+        if self.latency and cancel_event is None:
+            time.sleep(self.latency)
+        if clip.path is None:
+            return None
+        text = self.transcripts.get(clip.path)
+        if text is None:
+            sidecar = os.path.splitext(clip.path)[0] + ".txt"
+            if os.path.exists(sidecar):
+                with open(sidecar, "r", encoding="utf-8") as f:
+                    text = f.read().strip()
+        return text
+
+
+class EngineStats:
+    """Observed latency and reliability of one engine."""
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.wins = 0
+        self.latency_ewma = None
+
+    def record(self, latency, ok):
+        self.calls += 1
+        if not ok:
+            self.failures += 1
+            return
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+
+
+class STTResult:
+    """
+    Outcome of one orchestrated transcription. text/engine/latency describe the
+    winning result (text is None if every engine failed); results maps every
+    engine that finished to its (text, latency, error).
+    """
+    def __init__(self, text, engine, latency, results):
+        self.text = text
+        self.engine = engine
+        self.latency = latency
+        self.results = results
+
+
+_engines = {}
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def register_engine(engine):
+    """Add an engine to the registry (replacing any engine with the same name)."""
+    _engines[engine.name] = engine
+    with _stats_lock:
+        _stats.setdefault(engine.name, EngineStats())
+    return engine
+
+
+def get_engine(name):
+    try:
+        return _engines[name]
+    except KeyError:
+        raise ValueError(f"Unknown STT engine: {name} (registered: {', '.join(_engines)})")
+
+
+def engine_stats():
+    """Return a dict of engine name -> EngineStats."""
+    return dict(_stats)
+
+
+def rank_engines(names):
+    """
+    Order engine names by preference: engines whose circuit breaker is open (see
+    utils.resilience) last, then STT_ENGINE first if set, then engines that have not
+    produced a result yet (so every engine gets measured), then by moving-average
+    latency, with engines that keep failing last.
+    """
+    def key(name):
+        stats = _stats.get(name) or EngineStats()
+        preferred = 0 if name == STT_ENGINE else 1
+        failure_rate = stats.failures / stats.calls if stats.calls else 0.0
+        unmeasured = 0 if stats.latency_ewma is None else 1
+        return (not available(name), preferred, failure_rate > 0.5, unmeasured, stats.latency_ewma or 0.0)
+    return sorted(names, key=key)
+
+
+def is_good_result(text):
+    """A result is usable if the engine returned some non-blank text."""
+    return bool(text and text.strip())
+
+
+def transcribe(clip, policy=None, engines=None, fmt="wav", hedge_ms=None):
+    """
+    Transcribe clip with the registered engines according to policy (see POLICIES).
+    Returns an STTResult.
+    """
+    policy = policy or STT_POLICY
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown STT policy: {policy} (expected one of {', '.join(POLICIES)})")
+    names = rank_engines(engines or STT_ENGINES)
+    # Route around unhealthy providers, unless none is healthy (then try them anyway)
+    names = [name for name in names if available(name)] or names
+    if policy == "single":
+        names = names[:1]
+    elif policy == "hedged":
+        names = names[:2]
+    hedge = (STT_HEDGE_MS if hedge_ms is None else hedge_ms) / 1000
+    with benchmark_block(f"stt_{policy}"):
+        return _run(clip, names, fmt, wait_for_all=(policy == "compare"), hedge=hedge if policy == "hedged" else None)
+
+
+def _run(clip, names, fmt, wait_for_all, hedge):
+    cancel_event = threading.Event()
+    start = time.perf_counter()
+    pending = {}
+    results = {}
+    winner = None
+
+    def launch(name):
+        future = _executor.submit(in_context(_call, get_engine(name), clip, fmt, cancel_event))
+        pending[future] = name
+
+    waiting = list(names)
+    launch(waiting.pop(0))
+    if hedge is None:
+        while waiting:
+            launch(waiting.pop(0))
+    while pending:
+        # While a hedge engine is still waiting, wake up when its delay expires
+        timeout = None
+        if waiting:
+            timeout = max(0.0, hedge - (time.perf_counter() - start))
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done and waiting:
+            print(f"[STT] No answer after {hedge * 1000:.0f}ms, hedging with {waiting[0]}")
+            launch(waiting.pop(0))
+            continue
+        for future in done:
+            name = pending.pop(future)
+            text, latency, error = future.result()
+            results[name] = (text, latency, error)
+            if winner is None and is_good_result(text):
+                winner = name
+        if winner is not None and not wait_for_all:
+            break
+        if not pending and waiting:
+            # Everything launched so far failed; try the next engine right away
+            launch(waiting.pop(0))
+    if pending:
+        cancel_event.set()
+        for future in pending:
+            future.cancel()
+        print(f"[STT] {winner} won, cancelled: {', '.join(pending.values())}")
+    if winner is None:
+        return STTResult(None, None, time.perf_counter() - start, results)
+    if wait_for_all:
+        # All engines finished: prefer the best-ranked good result rather than the fastest
+        winner = next(n for n in names if n in results and is_good_result(results[n][0]))
+    with _stats_lock:
+        _stats[winner].wins += 1
+    return STTResult(results[winner][0], winner, results[winner][1], results)
+
+
+def _call(engine, clip, fmt, cancel_event):
+    limit("stt", cancel_event)  # Before timing, so waiting for the tenant's turn is not engine latency
+    start = time.perf_counter()
+    try:
+        text = engine.transcribe(clip, fmt=fmt, cancel_event=cancel_event)
+        error = None
+    except Exception as e:
+        text, error = None, e
+        print(f"[STT] {engine.name} failed: {e}")
+    latency = time.perf_counter() - start
+    cancelled = cancel_event.is_set() and not is_good_result(text)
+    if not cancelled:
+        with _stats_lock:
+            _stats.setdefault(engine.name, EngineStats()).record(latency, error is None and is_good_result(text))
+    return text, latency, error
+
+
+register_engine(WhisperEngine())
+register_engine(GoogleEngine())
@@ -1,25 +1,115 @@
 import os  # For environment variables
-from google.cloud import speech  # Google Speech-to-Text API
-from utils.benchmark import benchmark_function  # For benchmarking
+import queue  # For passing audio chunks to the streaming request generator
+import threading  # For consuming streaming responses in the background
+from utils.benchmark import benchmark_function, benchmark_block  # For benchmarking
+from transcription.streaming import StreamingBackend  # Interface for incremental transcription
+from audio.clip import as_clip  # Accepts an in-memory AudioClip or a WAV filename
+from utils.clients import get_speech_client  # Shared long-lived SpeechClient
+from utils.resilience import call  # Timeouts, retries and circuit breaker for the Speech API
+
+# Google's encoding for each payload format (WAV carries LINEAR16 samples)
+ENCODINGS = {
+    "wav": "LINEAR16",
+    "flac": "FLAC",
+}
+
+
+def _speech():
+    from google.cloud import speech  # Google Speech-to-Text API, imported on first use (slow to load)
+    return speech
+
 
 @benchmark_function("google_stt_transcription")
-def transcribe_with_google_stt(filename):
+def transcribe_with_google_stt(audio, fmt="wav"):
     """
-    Transcribe the given audio file using Google Cloud Speech-to-Text API.
+    Transcribe the given audio (an AudioClip or a WAV filename) using Google Cloud Speech-to-Text API.
+    fmt selects the upload format ("wav" or "flac").
     Returns the transcribed text.
     """
     # Requires GOOGLE_APPLICATION_CREDENTIALS env var to be set to the path of your service account JSON key
-    client = speech.SpeechClient()
-    with open(filename, "rb") as audio_file:
-        content = audio_file.read()
-    audio = speech.RecognitionAudio(content=content)
+    speech = _speech()
+    client = get_speech_client()
+    clip = as_clip(audio)
+    audio = speech.RecognitionAudio(content=clip.encoded(fmt))
+    # WAV and FLAC carry the sample rate in their header, so sample_rate_hertz is not needed
     config = speech.RecognitionConfig(
-        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-        sample_rate_hertz=44100,
+        encoding=getattr(speech.RecognitionConfig.AudioEncoding, ENCODINGS[fmt]),
         language_code="en-US",
         enable_automatic_punctuation=True,
     )
-    response = client.recognize(config=config, audio=audio)
+    # retry=None: retries are made by utils.resilience, within the utterance's deadline
+    response = call("google", lambda timeout: client.recognize(config=config, audio=audio, timeout=timeout, retry=None))
     # Concatenate all results
     transcript = " ".join([result.alternatives[0].transcript for result in response.results])
-    return transcript.strip() 
\ No newline at end of file
+    return transcript.strip() 
+
+class GoogleStreamingBackend(StreamingBackend):
+    """
+    Incremental backend using Google Cloud Speech-to-Text streaming recognition.
+
+    Audio chunks are forwarded to a streaming_recognize call as they arrive,
+    so by the time the key is released most of the utterance is already recognized.
+    """
+    def __init__(self, language_code="en-US"):
+        self.language_code = language_code
+        self._audio = None
+        self._thread = None
+        self._finals = []
+        self._interim = ""
+        self.error = None
+
+    def start(self, fs):
+        self._audio = queue.Queue()
+        self._finals = []
+        self._interim = ""
+        self.error = None
+        speech = _speech()
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=fs,
+            language_code=self.language_code,
+            enable_automatic_punctuation=True,
+        )
+        streaming_config = speech.StreamingRecognitionConfig(config=config, interim_results=True)
+        self._thread = threading.Thread(target=self._run, args=(streaming_config,), daemon=True)
+        self._thread.start()
+
+    def feed(self, chunk):
+        self._audio.put(chunk.tobytes())
+
+    def partial(self):
+        return " ".join(self._finals + ([self._interim] if self._interim else [])).strip()
+
+    def finish(self):
+        with benchmark_block("google_stt_streaming_finish"):
+            self._audio.put(None)
+            self._thread.join()
+        if self.error is not None:
+            print(f"[Google STT Streaming] Error: {self.error}")
+        return " ".join(self._finals).strip() or self._interim.strip()
+
+    def _requests(self):
+        while True:
+            data = self._audio.get()
+            if data is None:
+                return
+            yield _speech().StreamingRecognizeRequest(audio_content=data)
+
+    def _run(self, streaming_config):
+        try:
+            client = get_speech_client()
+            responses = client.streaming_recognize(config=streaming_config, requests=self._requests())
+            for response in responses:
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    if result.is_final:
+                        self._finals.append(result.alternatives[0].transcript.strip())
+                        self._interim = ""
+                    else:
+                        self._interim = result.alternatives[0].transcript
+        except Exception as e:
+            self.error = e
+            # Drain remaining audio so feed()/finish() never block on a dead stream
+            while self._audio.get() is not None:
+                pass
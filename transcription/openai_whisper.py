@@ -1,20 +1,20 @@
-import openai                # For interacting with OpenAI's Whisper API for transcription
-import os                    # For accessing environment variables
 from utils.benchmark import benchmark_function  # For benchmarking
-
-openai.api_key = os.getenv("OPENAI_API_KEY")
-if not openai.api_key:
-    raise ValueError("OPENAI_API_KEY environment variable not set.")
+from audio.clip import as_clip  # Accepts an in-memory AudioClip or a WAV filename
+from utils.clients import get_openai_client  # Shared OpenAI client (imports openai on first use)
+from utils.resilience import call  # Timeouts, retries and circuit breaker for the Whisper API
 
 @benchmark_function("whisper_transcription")
-def transcribe_with_whisper(filename):
+def transcribe_with_whisper(audio, fmt="wav"):
     """
-    Transcribe the given audio file using OpenAI Whisper API.
+    Transcribe the given audio (an AudioClip or a WAV filename) using OpenAI Whisper API.
+    fmt selects the upload format ("wav" or "flac"); Whisper detects it from the file name.
     Returns the transcribed text.
     """
-    with open(filename, "rb") as audio_file:
-        transcript = openai.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file
-        )
-    return transcript.text 
\ No newline at end of file
+    clip = as_clip(audio)
+    client = get_openai_client()
+    transcript = call("whisper", lambda timeout: client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(clip.name(fmt), clip.encoded(fmt)),
+        timeout=timeout,
+    ))
+    return transcript.text
@@ -0,0 +1,192 @@
+import os         # For configuration via environment variables
+import queue      # Bounded hand-off between the audio callback and the transcription worker
+import threading  # Worker thread that feeds the backend while recording continues
+import time       # For the close() deadline and simulated recognizer latency in the replay backend
+import numpy as np  # For audio chunk handling
+from utils.benchmark import benchmark_block, count_event  # For benchmarking
+
+# Longest wait for the backend after key release before falling back to the partial transcript
+TAIL_TIMEOUT = float(os.getenv("STREAMING_TAIL_TIMEOUT", "5"))
+
+# Sentinel put on the queue to tell the worker that recording has stopped
+_END_OF_STREAM = object()
+
+
+class StreamingBackend:
+    """
+    Interface for incremental transcription backends.
+
+    A backend receives int16 audio chunks as they are captured via feed() and
+    returns the final transcript from finish(). partial() returns whatever text
+    is known so far and may be called at any time.
+    """
+    def start(self, fs):
+        """Prepare for a new utterance captured at sample rate fs."""
+
+    def feed(self, chunk):
+        """Consume one chunk of int16 audio (shape (frames,) or (frames, 1))."""
+        raise NotImplementedError
+
+    def partial(self):
+        """Return the best transcript available so far."""
+        return ""
+
+    def finish(self):
+        """Flush any buffered audio and return the final transcript."""
+        return self.partial()
+
+
+class ReplayBackend(StreamingBackend):
+    """
+    Offline stand-in backend that needs neither a microphone nor a network.
+
+    It is given the reference transcript of a recording (or the path of a
+    text file holding it) and reveals its words in proportion to the audio it
+    has received, which mimics a real streaming recognizer closely enough to
+    exercise the pipeline. Use replay_wav() to push a WAV file through it.
+    """
+    def __init__(self, transcript=None, transcript_file=None, expected_frames=None, delay_per_chunk=0.0):
+        if transcript is None and transcript_file is not None:
+            with open(transcript_file, "r", encoding="utf-8") as f:
+                transcript = f.read()
+        self.words = (transcript or "").split()
+        self.expected_frames = expected_frames
+        self.delay_per_chunk = delay_per_chunk
+        self.frames_received = 0
+        self.chunks_received = 0
+
+    def start(self, fs):
+        self.frames_received = 0
+        self.chunks_received = 0
+
+    def feed(self, chunk):
+        self.frames_received += len(chunk)
+        self.chunks_received += 1
+        if self.delay_per_chunk:
+            time.sleep(self.delay_per_chunk)  # Simulate per-chunk recognizer work
+
+    def partial(self):
+        if not self.expected_frames:
+            return ""
+        ratio = min(1.0, self.frames_received / self.expected_frames)
+        return " ".join(self.words[:int(len(self.words) * ratio)])
+
+    def finish(self):
+        return " ".join(self.words)
+
+
+class StreamingPipeline:
+    """
+    Sends audio chunks to a StreamingBackend while recording is still in progress.
+
+    The audio callback calls submit() for every chunk. Chunks go through a
+    bounded queue to a worker thread, so the callback never blocks on the
+    backend. If the backend falls so far behind that the queue fills, new
+    chunks are dropped and counted rather than stalling the audio thread.
+    close() is called on key release and only has to wait for the few chunks
+    still queued, so the wait after release does not grow with utterance length.
+    """
+    def __init__(self, backend, fs, max_queue_chunks=64):
+        self.backend = backend
+        self.fs = fs
+        self.queue = queue.Queue(maxsize=max_queue_chunks)
+        self.dropped_chunks = 0
+        self.error = None
+        self._thread = None
+        self._abandoned = threading.Event()
+
+    def start(self):
+        """Start the worker thread that feeds the backend."""
+        self.dropped_chunks = 0
+        self.error = None
+        self._abandoned = threading.Event()
+        self.backend.start(self.fs)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, chunk, block=False):
+        """
+        Queue a chunk for transcription. Safe to call from the audio callback.
+        With block=True (used for file replay) the caller waits instead of dropping.
+        """
+        try:
+            self.queue.put(chunk, block=block)
+        except queue.Full:
+            self.dropped_chunks += 1
+
+    def partial(self):
+        """Return the backend's current partial transcript."""
+        return self.backend.partial()
+
+    def close(self, timeout=None):
+        """
+        Signal end of stream, wait for the worker to drain the queue, and return the final transcript.
+        If the worker is still feeding the backend after timeout seconds, the stream is
+        abandoned: the worker stops at the next chunk, the backend is not finished (it
+        is still in use), and the partial transcript so far is returned.
+        """
+        if self._thread is None:
+            return ""
+        with benchmark_block("streaming_stt_tail"):
+            thread, self._thread = self._thread, None
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                # Waits for room: the sentinel must not be dropped even if the queue is full
+                self.queue.put(_END_OF_STREAM, timeout=timeout)
+                thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+            if thread.is_alive():
+                self._abandoned.set()
+                count_event("streaming_stt_timeout")
+                print(f"[Streaming STT] Backend still busy after {timeout}s, using the partial transcript")
+                return self.backend.partial()
+            if self._abandoned.is_set():
+                return self.backend.partial()
+            if self.dropped_chunks:
+                print(f"[Streaming STT] Dropped {self.dropped_chunks} chunks (backend too slow)")
+            if self.error is not None:
+                print(f"[Streaming STT] Backend error: {self.error}")
+                return self.backend.partial()
+            return self.backend.finish()
+
+    def abandon(self):
+        """
+        Stop feeding the backend without finishing it (the utterance was cancelled).
+        The worker stops at its next chunk and a close() in progress returns the partial transcript.
+        """
+        self._abandoned.set()
+        try:
+            self.queue.put_nowait(_END_OF_STREAM)  # Wakes the worker if it is waiting for a chunk
+        except queue.Full:
+            pass  # The worker is busy and checks the flag before its next chunk
+
+    def _run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is _END_OF_STREAM or self._abandoned.is_set():
+                return
+            if self.error is not None:
+                continue  # Keep draining so submit() never sees a full queue
+            try:
+                self.backend.feed(chunk)
+            except Exception as e:
+                self.error = e
+
+
+def replay_wav(filename, pipeline, chunk_frames=1024):
+    """
+    Feed a WAV file through a StreamingPipeline in callback-sized chunks, as the
+    microphone would, and return the final transcript. Starts and closes the pipeline.
+    """
+    import scipy.io.wavfile as wav  # Only needed when replaying from disk
+    fs, audio = wav.read(filename)
+    if audio.ndim == 1:
+        audio = audio.reshape(-1, 1)
+    pipeline.fs = fs
+    if isinstance(pipeline.backend, ReplayBackend) and pipeline.backend.expected_frames is None:
+        pipeline.backend.expected_frames = len(audio)
+    pipeline.start()
+    for i in range(0, len(audio), chunk_frames):
+        pipeline.submit(np.ascontiguousarray(audio[i:i + chunk_frames]), block=True)
+    return pipeline.close()
@@ -7,7 +7,10 @@ class HotkeyListener:
     def __init__(self, on_press, on_release):
         self.listener = keyboard.Listener(on_press=on_press, on_release=on_release)
 
-    def run(self):
+    def run(self, on_ready=None):
+        """Listen until stopped. on_ready() is called once the listener is up."""
         print("Press and hold Right Shift + Right Option to record. Release to stop and transcribe.")
         self.listener.start()
+        if on_ready is not None:
+            on_ready()
         self.listener.join() 
\ No newline at end of file
@@ -1,84 +1,113 @@
-import time  # For timing operations
 import functools  # For decorators
-from contextlib import contextmanager  # For context managers
+import os  # For configuration via environment variables
+import threading  # Counters are updated from many threads
+from utils.tracing import span, observe, metrics, clear as clear_tracing  # Spans, histograms and export
+
+# Set BENCHMARK_PRINT=1 to print every timing as it is recorded (the summary is always available)
+BENCHMARK_PRINT = os.getenv("BENCHMARK_PRINT") == "1"
+
+# Global benchmark data: metric name -> utils.tracing.Histogram (count, mean, min, max, percentiles)
+benchmark_data = metrics
+# Global event counters (cache hits/misses etc.)
+benchmark_counters = {}
+_counters_lock = threading.Lock()
 
-# Global benchmark data storage
-benchmark_data = {}
 
 def benchmark_function(func_name=None):
     """
-    Decorator to benchmark function execution time.
+    Decorator to benchmark function execution time (recorded as a span).
     Usage: @benchmark_function("my_function")
     """
     def decorator(func):
+        name = func_name or func.__name__
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            name = func_name or func.__name__
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            end_time = time.time()
-            duration = end_time - start_time
-            
-            if name not in benchmark_data:
-                benchmark_data[name] = []
-            benchmark_data[name].append(duration)
-            
-            print(f"[Benchmark] {name}: {duration:.3f}s")
-            return result
+            with benchmark_block(name):
+                return func(*args, **kwargs)
         return wrapper
     return decorator
 
-@contextmanager
-def benchmark_block(block_name):
+
+class benchmark_block:
+    """
+    Context manager to benchmark code blocks (recorded as a span, nested under the
+    enclosing one). Usage: with benchmark_block("my_block"):
+    """
+    __slots__ = ("_span",)
+
+    def __init__(self, block_name, **attrs):
+        self._span = span(block_name, **attrs)
+
+    def __enter__(self):
+        return self._span.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.__exit__(exc_type, exc, tb)
+        if BENCHMARK_PRINT:
+            print(f"[Benchmark] {self._span.name}: {self._span.seconds:.3f}s")
+        return False
+
+
+def record_value(name, value):
     """
-    Context manager to benchmark code blocks.
-    Usage: with benchmark_block("my_block"):
+    Record a measured quantity that is not a timing (e.g. seconds of audio saved).
+    It appears in the summary alongside the timings.
     """
-    start_time = time.time()
-    try:
-        yield
-    finally:
-        end_time = time.time()
-        duration = end_time - start_time
-        
-        if block_name not in benchmark_data:
-            benchmark_data[block_name] = []
-        benchmark_data[block_name].append(duration)
-        
-        print(f"[Benchmark] {block_name}: {duration:.3f}s")
+    observe(name, value, unit="")
+    if BENCHMARK_PRINT:
+        print(f"[Benchmark] {name}: {value:.3f}")
+
+
+def count_event(name, n=1):
+    """
+    Increment a named event counter (e.g. "cache_search_hit"). Counters appear in the summary.
+    """
+    with _counters_lock:
+        benchmark_counters[name] = benchmark_counters.get(name, 0) + n
+
+
+def benchmark_summary():
+    """
+    Return the summary of all benchmark data collected as text (count, mean, min,
+    p50/p95/p99, max and total per metric, then the counters).
+    """
+    if not benchmark_data and not benchmark_counters:
+        return "[Benchmark] No data collected.\n"
+    lines = ["=" * 50, "BENCHMARK SUMMARY", "=" * 50]
+    for name, histogram in list(benchmark_data.items()):
+        if not histogram.count:
+            continue
+        unit = histogram.unit
+        lines.append(f"{name}:")
+        lines.append(f"  Count: {histogram.count}")
+        lines.append(f"  Average: {histogram.mean:.3f}{unit}")
+        lines.append(f"  Min: {histogram.min:.3f}{unit}")
+        lines.append("  " + "  ".join(f"p{q}: {histogram.percentile(q):.3f}{unit}" for q in (50, 95, 99)))
+        lines.append(f"  Max: {histogram.max:.3f}{unit}")
+        lines.append(f"  Total: {histogram.total:.3f}{unit}")
+        lines.append("")
+    with _counters_lock:
+        counters = sorted(benchmark_counters.items())
+    if counters:
+        lines.append("Counters:")
+        lines.extend(f"  {name}: {count}" for name, count in counters)
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
 
 def print_benchmark_summary():
     """
     Print a summary of all benchmark data collected.
     """
-    if not benchmark_data:
-        print("[Benchmark] No data collected.")
-        return
-    
-    print("\n" + "="*50)
-    print("BENCHMARK SUMMARY")
-    print("="*50)
-    
-    for name, times in benchmark_data.items():
-        if times:
-            avg_time = sum(times) / len(times)
-            min_time = min(times)
-            max_time = max(times)
-            total_time = sum(times)
-            count = len(times)
-            
-            print(f"{name}:")
-            print(f"  Count: {count}")
-            print(f"  Average: {avg_time:.3f}s")
-            print(f"  Min: {min_time:.3f}s")
-            print(f"  Max: {max_time:.3f}s")
-            print(f"  Total: {total_time:.3f}s")
-            print()
+    print("\n" + benchmark_summary())
+
 
 def clear_benchmark_data():
     """
-    Clear all collected benchmark data.
+    Clear all collected benchmark data, counters and spans.
     """
-    global benchmark_data
-    benchmark_data.clear()
-    print("[Benchmark] Data cleared.") 
\ No newline at end of file
+    clear_tracing()
+    with _counters_lock:
+        benchmark_counters.clear()
+    print("[Benchmark] Data cleared.")
@@ -0,0 +1,149 @@
+import hashlib  # For content-addressed keys
+import json  # Values are stored as JSON
+import os  # For the cache directory and configuration
+import re  # For query normalization
+import sqlite3  # Single-file persistent store
+import threading  # The connection is shared between processing threads
+import time  # For TTLs and LRU timestamps
+from utils.benchmark import count_event  # Hit/miss counters
+
+CACHE_PATH = os.getenv("AGENT_CACHE_PATH", os.path.join("cache", "cache.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv("AGENT_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# Time to live per layer, in seconds
+LAYER_TTLS = {
+    "search": 60 * 60,        # DuckDuckGo hits for a query
+    "page": 24 * 60 * 60,     # Scraped page text per URL
+    "summary": 24 * 60 * 60,  # Gemini summaries, keyed by the full prompt
+    "answer": 5 * 60,         # Final spoken answers; short, since answers like "time in Paris" go stale
+}
+
+# Words and phrases dropped when normalizing a query, so small phrasing differences share a cache
+# entry. Only true fillers: a word that can change the meaning ("right", "now", "about") must stay.
+_FILLER_WORDS = {"a", "an", "the", "please"}
+_FILLER_PHRASES = re.compile(r"\b(?:what\s+is|whats|tell\s+me)\b")
+
+
+def normalize_query(query):
+    """Lowercase, strip punctuation and filler words, and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", "", query.lower())
+    kept = [w for w in _FILLER_PHRASES.sub(" ", text).split() if w not in _FILLER_WORDS]
+    return " ".join(kept or text.split())
+
+
+def make_key(*parts):
+    """Content-addressed key: SHA-256 over the given parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Cache:
+    """
+    Persistent key/value cache in one SQLite file, with a TTL per layer and
+    least-recently-used eviction once the stored values exceed max_bytes.
+    Safe to use from several threads.
+    """
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES, ttls=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(LAYER_TTLS, **(ttls or {}))
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")  # Losing the last entries on power loss is fine for a cache
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " layer TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL,"
+                " PRIMARY KEY (layer, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, layer, key):
+        """Return the cached value, or None if it is missing or older than the layer's TTL."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created FROM entries WHERE layer = ? AND key = ?", (layer, key)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttls.get(layer, 0):
+                self._delete(layer, key)
+                row = None
+            if row is not None:
+                with self._db:
+                    self._db.execute("UPDATE entries SET accessed = ? WHERE layer = ? AND key = ?", (now, layer, key))
+        count_event(f"cache_{layer}_{'hit' if row is not None else 'miss'}")
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, layer, key, value):
+        """Store a JSON-serializable value and evict least recently used entries if over budget."""
+        data = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE layer = ? AND key = ?", (layer, key)).fetchone()
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (layer, key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (layer, key, data, len(data), now, now),
+                )
+            self._size += len(data) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def clear(self, layer=None):
+        """Remove every entry, or only those of one layer."""
+        with self._lock, self._db:
+            if layer is None:
+                self._db.execute("DELETE FROM entries")
+            else:
+                self._db.execute("DELETE FROM entries WHERE layer = ?", (layer,))
+            self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _delete(self, layer, key):
+        with self._db:
+            row = self._db.execute("SELECT size FROM entries WHERE layer = ? AND key = ?", (layer, key)).fetchone()
+            if row:
+                self._db.execute("DELETE FROM entries WHERE layer = ? AND key = ?", (layer, key))
+                self._size -= row[0]
+
+    def _evict(self):
+        # Drop expired entries first, then the least recently used until usage is down to 90% of the budget
+        now = time.time()
+        with self._db:
+            for layer, ttl in self.ttls.items():
+                self._db.execute("DELETE FROM entries WHERE layer = ? AND created < ?", (layer, now - ttl))
+            target = self.max_bytes * 0.9
+            size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            evicted = 0
+            for layer, key, entry_size in self._db.execute(
+                "SELECT layer, key, size FROM entries ORDER BY accessed"
+            ).fetchall():
+                if size <= target:
+                    break
+                self._db.execute("DELETE FROM entries WHERE layer = ? AND key = ?", (layer, key))
+                size -= entry_size
+                evicted += 1
+            self._size = size
+        if evicted:
+            count_event("cache_evictions", evicted)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = Cache()
+    return _cache
@@ -0,0 +1,134 @@
+import os  # For API keys
+import threading  # For lazy construction and per-thread clients
+
+# Keep-alive pool size per host for the shared HTTP session (scraping fetches several pages at once)
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_MAXSIZE = 10
+
+_lock = threading.Lock()
+_clients = {}
+_local = threading.local()
+
+
+def _get_or_create(key, factory):
+    """Return the shared client stored under key, constructing it once on first use."""
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory()
+                _clients[key] = client
+    return client
+
+
+def get_http_session():
+    """
+    Shared requests.Session with a keep-alive connection pool, so repeated fetches
+    reuse TCP/TLS connections instead of handshaking on every request.
+    """
+    def create():
+        import requests  # For fetching web pages
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    return _get_or_create("http_session", create)
+
+
+def get_speech_client():
+    """Shared Google Cloud SpeechClient (one gRPC channel and auth token cache for the process)."""
+    def create():
+        from google.cloud import speech  # Google Speech-to-Text API
+        return speech.SpeechClient()
+    return _get_or_create("speech_client", create)
+
+
+def get_openai_client():
+    """Shared OpenAI client (Whisper). Needs OPENAI_API_KEY."""
+    def create():
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set.")
+        import openai  # For interacting with OpenAI's Whisper API
+        # Retries are made by utils.resilience, with the rest of the upstream calls
+        return openai.OpenAI(api_key=api_key, max_retries=0)
+    return _get_or_create("openai_client", create)
+
+
+def get_gemini_model(model_name="gemini-2.0-flash-lite"):
+    """Shared Gemini GenerativeModel per model name. Needs GEMINI_API_KEY; configures the SDK on first use."""
+    def create():
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable not set.")
+        import google.generativeai as genai  # For Gemini API
+        genai.configure(api_key=api_key)
+        return genai.GenerativeModel(model_name)
+    return _get_or_create(("gemini", model_name), create)
+
+
+def get_ddgs():
+    """
+    DuckDuckGo search client, one per thread (DDGS keeps per-instance HTTP state,
+    so it is reused across searches but not shared between threads).
+    """
+    shared = _clients.get("ddgs")
+    if shared is not None:
+        return shared  # Installed with set_client()
+    ddgs = getattr(_local, "ddgs", None)
+    if ddgs is None:
+        from duckduckgo_search import DDGS  # For performing DuckDuckGo web searches
+        ddgs = DDGS()
+        _local.ddgs = ddgs
+    return ddgs
+
+
+def set_client(key, client):
+    """
+    Install client in place of the real one, e.g. a local stand-in for benchmarks:
+    "http_session", "speech_client", "openai_client", ("gemini", model_name) or "ddgs" (shared by all threads).
+    """
+    with _lock:
+        _clients[key] = client
+
+
+def warm_up_steps(http_urls=(), gemini_models=("gemini-2.0-flash-lite",), speech=True, openai=False):
+    """
+    (label, function) steps that construct the shared clients ahead of the first
+    request and open keep-alive connections to http_urls (and to the OpenAI API).
+    """
+    steps = [("http session", get_http_session)]
+    if openai:
+        steps.append(("openai client", get_openai_client))
+        # Lists models once, so the first Whisper upload reuses an open TLS connection
+        steps.append(("connection to the OpenAI API", lambda: get_openai_client().models.list()))
+    if speech:
+        steps.append(("speech client", get_speech_client))
+    for name in gemini_models:
+        steps.append((f"gemini model {name}", lambda name=name: get_gemini_model(name)))
+    for url in http_urls:
+        steps.append((f"connection to {url}", lambda url=url: get_http_session().head(url, timeout=5)))
+    return steps
+
+
+def warm_up(http_urls=(), gemini_models=("gemini-2.0-flash-lite",), speech=True, openai=False):
+    """
+    Construct the shared clients ahead of the first request, and open keep-alive
+    connections to http_urls. Failures are reported and otherwise ignored, since
+    every client is also created lazily on first use.
+    """
+    for label, step in warm_up_steps(http_urls, gemini_models, speech, openai):
+        try:
+            step()
+        except Exception as e:
+            print(f"[Warm-up] Could not prepare {label}: {e}")
+
+
+def start_warm_up(**kwargs):
+    """Run warm_up() on a daemon thread and return the thread."""
+    thread = threading.Thread(target=warm_up, kwargs=kwargs, daemon=True, name="client-warm-up")
+    thread.start()
+    return thread
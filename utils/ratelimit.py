@@ -0,0 +1,126 @@
+"""
+Per-tenant rate limits on upstream API calls.
+
+When the agent runs as a service (server.py), every utterance runs on behalf of a
+tenant, set with as_tenant() at the start of its job. Each upstream call site calls
+limit(api) first, which takes a token from that tenant's bucket for the API, waiting
+for one if the tenant is over its rate. One tenant's burst then queues behind its own
+limit instead of spending the API quota (and the provider's patience) of everyone
+else. Calls made outside a tenant (the local agent, benchmarks) are not limited.
+"""
+import contextlib  # For as_tenant()
+import contextvars  # The tenant follows the utterance onto stage threads (see utils.tracing.in_context)
+import os  # For configuration via environment variables
+import threading  # Buckets are shared by the stage threads of all sessions
+import time  # For refilling buckets
+from utils.benchmark import benchmark_block, count_event  # Waits are spans; rejections are counted
+
+# Calls per second allowed per tenant and upstream API ("api=rate,..."); APIs not listed are unlimited
+RATE_LIMITS = os.getenv("RATE_LIMITS", "stt=4,gemini=8,search=2,tts=16")
+# Seconds of calls a tenant may make in a burst after being idle
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "2"))
+# Longest a call waits for a token before failing with RateLimited
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "10"))
+
+
+class RateLimited(Exception):
+    """Raised by limit() when a tenant would have to wait longer than the maximum for a token."""
+
+
+def parse_limits(spec):
+    """Parse "api=rate,..." into a dict of api -> calls per second."""
+    limits = {}
+    for item in spec.split(","):
+        if item.strip():
+            api, rate = item.split("=")
+            limits[api.strip()] = float(rate)
+    return limits
+
+
+class TokenBucket:
+    """
+    Classic token bucket: rate tokens per second, holding at most capacity. reserve()
+    takes a token now, going into debt if needed, and returns how long the caller must
+    wait for it, so waiters are served in order without a thread per bucket.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Take a token and return the seconds to wait for it, or None (taking nothing) if over max_wait."""
+        with self._lock:
+            now = time.perf_counter()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class RateLimiter:
+    """Token buckets per (tenant, api), created on first use."""
+    def __init__(self, limits=None, burst=RATE_LIMIT_BURST, max_wait=RATE_LIMIT_MAX_WAIT):
+        self.limits = parse_limits(RATE_LIMITS) if limits is None else dict(limits)
+        self.burst = burst
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, tenant, api):
+        key = (tenant, api)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    rate = self.limits[api]
+                    bucket = self._buckets[key] = TokenBucket(rate, max(1.0, rate * self.burst))
+        return bucket
+
+    def acquire(self, tenant, api, cancel_event=None, max_wait=None):
+        """
+        Wait for a token for tenant's next call to api. Raises RateLimited if the wait would
+        be longer than max_wait (default: the limiter's max_wait).
+        """
+        if tenant is None or api not in self.limits:
+            return
+        wait = self.bucket(tenant, api).reserve(self.max_wait if max_wait is None else max_wait)
+        if wait is None:
+            count_event(f"rate_limited_{api}")
+            raise RateLimited(f"Tenant {tenant} is over its {api} rate limit ({self.limits[api]:g}/s)")
+        if wait > 0:
+            count_event(f"rate_limit_waits_{api}")
+            with benchmark_block("rate_limit_wait", api=api, tenant=tenant):
+                if cancel_event is not None:
+                    cancel_event.wait(wait)
+                else:
+                    time.sleep(wait)
+
+
+limiter = RateLimiter()
+_tenant = contextvars.ContextVar("tenant", default=None)
+
+
+def current_tenant():
+    return _tenant.get()
+
+
+@contextlib.contextmanager
+def as_tenant(tenant):
+    """Run the enclosed code (and the stages it starts through in_context) on behalf of tenant."""
+    token = _tenant.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def limit(api, cancel_event=None, max_wait=None):
+    """Call before each upstream request: waits while the current tenant is over its rate for api."""
+    limiter.acquire(_tenant.get(), api, cancel_event, max_wait)
@@ -0,0 +1,355 @@
+"""
+Resilience for calls to external providers (Whisper, Google STT, Gemini, DuckDuckGo,
+web pages).
+
+Every upstream call goes through call(provider, fn), which applies the provider's
+Policy:
+- a token bucket per provider, so bursts from overlapping utterances (or retries)
+  do not trip the provider's own rate limit;
+- a timeout per attempt, passed to fn, which hands it to the SDK;
+- retries of transient failures (timeouts, connection errors, 429/5xx) with full
+  jitter exponential backoff, but only while the deadline leaves room for another
+  attempt: the deadline is the policy's budget, tightened by any enclosing deadline()
+  (the server gives each utterance one);
+- hedging for cheap idempotent calls (hedge=True): a second attempt starts if the
+  first has not answered within the provider's p95 latency, and the first answer wins;
+- a circuit breaker: after several consecutive failures the provider is skipped
+  (CircuitOpen, raised at once) until a cooldown has passed and a probe succeeds.
+  Callers use available() to route around an unhealthy provider: the STT engines
+  rank it last, intent detection stays local, and web answers fall back to the
+  top passages.
+
+Every attempt is an upstream_<provider> span (upstream_<provider>_<op> when the caller
+names the operation, e.g. op="intent", so that short and long calls to the same provider
+get their own latency percentiles for hedging and retry decisions), so its latency shows
+up in the benchmark histograms and in the utterance's trace. Retries, hedges, failures and breaker
+transitions are counters, and resilience_report() adds the breaker states to the
+benchmark output.
+"""
+import contextlib  # For deadline()
+import contextvars  # The deadline follows the utterance onto stage threads
+import os  # For configuration via environment variables
+import random  # For backoff jitter
+import threading  # Breakers and buckets are shared by all threads
+import time  # For deadlines, backoff and latencies
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait  # Hedged attempts
+from utils.benchmark import benchmark_block, benchmark_data, count_event  # Metrics in the benchmark output
+from utils.ratelimit import TokenBucket, RateLimited, limit, parse_limits  # Buckets; per-tenant limits
+from utils.tracing import in_context  # Hedged attempts stay in the utterance's trace
+
+# Calls per second per provider, across all utterances and tenants ("provider=rate,...")
+UPSTREAM_RATE_LIMITS = os.getenv("UPSTREAM_RATE_LIMITS", "whisper=20,google=20,gemini=10,search=1")
+HEDGE_WORKERS = 32  # Hedged attempts of all concurrent utterances; a queued hedge would only add latency
+# Error class names (lowercased) that mark a transient failure worth retrying
+_TRANSIENT_NAMES = ("timeout", "timedout", "unavailable", "connection", "ratelimit", "exhausted", "deadline",
+                    "internalserver", "servererror", "toomanyrequests")
+_TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    """Raised by call() when the provider's circuit breaker is open."""
+
+
+class UpstreamStatus(Exception):
+    """Raised by call functions for an HTTP error status; transient ones (429, 5xx) are retried."""
+    def __init__(self, status_code, message=""):
+        super().__init__(f"HTTP {status_code} {message}".strip())
+        self.status_code = status_code
+
+
+class Policy:
+    """
+    How calls to one provider are made. attempts counts the first try; timeout is per
+    attempt and budget the total time for all attempts; backoff doubles from backoff up
+    to backoff_cap seconds (jittered). The breaker opens after breaker_failures
+    consecutive failures (None: no breaker) and lets a probe through after
+    breaker_cooldown seconds. tenant_api is the utils.ratelimit API charged per attempt.
+    """
+    def __init__(self, attempts=3, timeout=20.0, budget=40.0, backoff=0.25, backoff_cap=4.0, hedge_min=0.3,
+                 breaker_failures=5, breaker_cooldown=30.0, tenant_api=None):
+        self.attempts = attempts
+        self.timeout = timeout
+        self.budget = budget
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.hedge_min = hedge_min
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.tenant_api = tenant_api
+
+
+POLICIES = {
+    # STT engines are already raced or hedged against each other (transcription/engines.py),
+    # so one quick retry is enough; per-tenant STT limits are charged per engine call there
+    "whisper": Policy(attempts=2, timeout=30.0, budget=45.0),
+    "google": Policy(attempts=2, timeout=30.0, budget=45.0),
+    "gemini": Policy(attempts=3, timeout=20.0, budget=40.0, tenant_api="gemini"),
+    # DuckDuckGo rate-limits aggressively: back off longer
+    "search": Policy(attempts=3, timeout=10.0, budget=20.0, backoff=1.0, backoff_cap=8.0, tenant_api="search"),
+    # Many unrelated hosts: no breaker, and the scraper's own deadline bounds the budget
+    "http": Policy(attempts=2, timeout=10.0, budget=12.0, breaker_failures=None),
+}
+DEFAULT_POLICY = Policy()
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive failures -> half-open after `cooldown` -> closed on success."""
+    def __init__(self, name, failures, cooldown):
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead now (in half-open state, only one probe at a time)."""
+        if self.failures is None:
+            return True
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def available(self):
+        """Whether calls would be let through, without claiming the half-open probe."""
+        if self.failures is None:
+            return True
+        with self._lock:
+            return self.state == "closed" or time.monotonic() - self.opened_at >= self.cooldown
+
+    def release(self):
+        """Give back a half-open probe that was allowed but never made."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok):
+        if self.failures is None:
+            return
+        with self._lock:
+            self._probing = False
+            if ok:
+                if self.state != "closed":
+                    print(f"[Resilience] {self.name} recovered, closing its circuit breaker")
+                    count_event(f"upstream_{self.name}_breaker_closed")
+                self.state = "closed"
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                if self.state != "open":
+                    print(f"[Resilience] {self.name} failed {self.consecutive_failures} time(s) in a row, "
+                          f"skipping it for {self.cooldown:.0f}s")
+                    count_event(f"upstream_{self.name}_breaker_opened")
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class Provider:
+    """Policy, token bucket and circuit breaker of one provider."""
+    def __init__(self, name, policy, rate=None):
+        self.name = name
+        self.policy = policy
+        self.bucket = TokenBucket(rate, max(1.0, rate * 2)) if rate else None
+        self.breaker = CircuitBreaker(name, policy.breaker_failures, policy.breaker_cooldown)
+        self.ops = set()  # Operations called so far (None: calls that did not name one)
+
+    def span(self, op=None):
+        """Name of the span (and latency histogram) of one attempt at op."""
+        return f"upstream_{self.name}" if op is None else f"upstream_{self.name}_{op}"
+
+    def latency(self, q, op=None):
+        """Observed q-th percentile latency of attempts at op (None until there are some)."""
+        histogram = benchmark_data.get(self.span(op))
+        return histogram.percentile(q) if histogram is not None and histogram.count else None
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+_rates = parse_limits(UPSTREAM_RATE_LIMITS)
+_deadline = contextvars.ContextVar("deadline", default=None)
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+
+
+def provider(name):
+    """The Provider for name, created on first use (unknown names get DEFAULT_POLICY)."""
+    p = _providers.get(name)
+    if p is None:
+        with _providers_lock:
+            p = _providers.get(name)
+            if p is None:
+                p = _providers[name] = Provider(name, POLICIES.get(name, DEFAULT_POLICY), _rates.get(name))
+    return p
+
+
+def available(name):
+    """Whether the provider's circuit breaker lets calls through (route around it if not)."""
+    return provider(name).breaker.available()
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Calls made inside (and on stages started inside, via in_context) finish within seconds from now."""
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(current, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def is_transient(error):
+    """Whether error looks like a provider or network hiccup that a retry may fix."""
+    if isinstance(error, (CircuitOpen, RateLimited)):
+        return False
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and 400 <= status < 600:
+        return status in _TRANSIENT_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__.lower()
+    return any(token in name for token in _TRANSIENT_NAMES)
+
+
+def call(name, fn, hedge=False, until=None, cancel_event=None, op=None):
+    """
+    Call fn(timeout) under the provider's policy and return its result. until is an
+    optional time.monotonic() deadline of the caller; cancel_event stops retrying and
+    hedging. op names the operation, which keeps its latency apart from other calls to
+    the same provider. Raises CircuitOpen if the provider is being skipped, otherwise
+    the last error.
+    """
+    p = provider(name)
+    p.ops.add(op)
+    policy = p.policy
+    start = time.monotonic()
+    stop_at = start + policy.budget
+    for limit_at in (_deadline.get(), until):
+        if limit_at is not None:
+            stop_at = min(stop_at, limit_at)
+    attempt = 0
+    while True:
+        attempt += 1
+        if not p.breaker.allow():
+            count_event(f"upstream_{name}_short_circuited")
+            raise CircuitOpen(f"{name} is unavailable (circuit breaker open)")
+        try:
+            try:
+                _take_token(p, stop_at, cancel_event)
+            except Exception:
+                p.breaker.release()
+                raise
+            if hedge:
+                return _hedged(p, fn, stop_at, op, cancel_event)
+            return _attempt(p, fn, stop_at, op)
+        except Exception as e:
+            if not is_transient(e) or attempt >= policy.attempts or (cancel_event is not None and cancel_event.is_set()):
+                raise
+            if not p.breaker.available():
+                raise  # This failure opened the breaker
+            delay = random.uniform(0, min(policy.backoff_cap, policy.backoff * 2 ** (attempt - 1)))
+            # Only retry if the next attempt can still finish in time (at its typical latency)
+            expected = p.latency(50, op) or 0.0
+            if time.monotonic() + delay + expected >= stop_at:
+                count_event(f"upstream_{name}_retry_skipped_deadline")
+                raise
+            count_event(f"upstream_{name}_retries")
+            print(f"[Resilience] {name} failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s")
+            if cancel_event is not None:
+                if cancel_event.wait(delay):
+                    raise
+            else:
+                time.sleep(delay)
+
+
+def _take_token(p, stop_at, cancel_event):
+    if p.policy.tenant_api is not None:
+        limit(p.policy.tenant_api, cancel_event)
+    if p.bucket is None:
+        return
+    wait_seconds = p.bucket.reserve(max(0.0, stop_at - time.monotonic()))
+    if wait_seconds is None:
+        count_event(f"upstream_{p.name}_rate_limited")
+        raise RateLimited(f"{p.name} rate limit ({p.bucket.rate:g}/s) would exceed the deadline")
+    if wait_seconds > 0:
+        count_event(f"upstream_{p.name}_rate_waits")
+        if cancel_event is not None:
+            cancel_event.wait(wait_seconds)
+        else:
+            time.sleep(wait_seconds)
+
+
+def _attempt(p, fn, stop_at, op=None):
+    timeout = max(0.1, min(p.policy.timeout, stop_at - time.monotonic()))
+    try:
+        with benchmark_block(p.span(op)):
+            result = fn(timeout)
+    except Exception as e:
+        count_event(f"upstream_{p.name}_failures")
+        # Only transient errors say something about the provider's health
+        p.breaker.record(not is_transient(e))
+        raise
+    p.breaker.record(True)
+    return result
+
+
+def _hedged(p, fn, stop_at, op=None, cancel_event=None):
+    """Run an attempt; if it is slower than the p95 of op, race a second one against it."""
+    first = _hedge_pool.submit(in_context(_attempt, p, fn, stop_at, op))
+    delay = max(p.policy.hedge_min, p.latency(95, op) or 0.0)
+    done, _ = wait([first], timeout=min(delay, max(0.0, stop_at - time.monotonic())))
+    if done or time.monotonic() >= stop_at or not p.breaker.available():
+        return first.result()
+    if cancel_event is not None and cancel_event.is_set():
+        return first.result()
+    try:
+        # The duplicate request counts against the tenant like any attempt, but is not worth waiting for
+        if p.policy.tenant_api is not None:
+            limit(p.policy.tenant_api, cancel_event, max_wait=0.0)
+    except RateLimited:
+        return first.result()
+    if p.bucket is not None and p.bucket.reserve(0) is None:
+        return first.result()  # No spare capacity for a duplicate request
+    count_event(f"upstream_{p.name}_hedges")
+    second = _hedge_pool.submit(in_context(_attempt, p, fn, stop_at, op))
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is second:
+                count_event(f"upstream_{p.name}_hedge_wins")
+            return result  # The other attempt finishes in the background
+    raise error
+
+
+def resilience_report():
+    """Circuit breaker state and observed latency per provider (and operation), as text for the benchmark output."""
+    lines = ["UPSTREAM PROVIDERS"]
+    for name, p in sorted(_providers.items()):
+        breaker = p.breaker
+        latencies = []
+        for op in sorted(p.ops, key=lambda op: op or ""):
+            p50, p95 = p.latency(50, op), p.latency(95, op)
+            if p50 is not None:
+                latencies.append(f"{'' if op is None else op + ' '}p50 {p50:.3f}s p95 {p95:.3f}s")
+        latency = "; ".join(latencies) or "no successful calls"
+        state = "no breaker" if breaker.failures is None else (
+            f"breaker {breaker.state}, opened {breaker.times_opened} time(s)")
+        lines.append(f"  {name}: {latency}, {state}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,321 @@
+import asyncio  # Jobs are tasks on one event loop
+import itertools  # For job ids
+import os  # For configuration via environment variables
+import threading  # The loop runs in its own thread; callers are hotkey/signal threads
+import time  # For the fake stage and cancel latency
+import traceback  # For reporting failed jobs
+from concurrent.futures import ThreadPoolExecutor, wait  # Blocking SDK calls run here
+from utils.benchmark import count_event, record_value  # Job and cancellation metrics
+from utils.tracing import in_context  # Stages run inside the job's trace
+
+# What happens when a job is submitted while others are running:
+#   cancel_previous - running jobs are cancelled; the new one starts once they have stopped
+#   queue           - jobs run one at a time, in submission order
+#   concurrent      - jobs run side by side
+POLICIES = ("cancel_previous", "queue", "concurrent")
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "cancel_previous")
+STAGE_WORKERS = 8
+# How long a new job waits for the stages of cancelled jobs to notice the cancellation
+CANCEL_GRACE = 2.0
+
+
+class JobCancelled(Exception):
+    """Raised by Job.result() for a job that was cancelled."""
+
+
+class JobContext:
+    """
+    Handed to every job coroutine. Blocking work goes through run(), child
+    coroutines through spawn(); both are cancelled together with the job.
+    cancel_event is set on cancellation, so blocking stages that accept a
+    stop/cancel event (speech playback, scraping) return early.
+    """
+    def __init__(self, job, scheduler):
+        self.job = job
+        self.scheduler = scheduler
+        self.cancel_event = job.cancel_event
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        """Raise asyncio.CancelledError if the job has been cancelled."""
+        if self.cancel_event.is_set():
+            raise asyncio.CancelledError()
+
+    async def run(self, fn, *args, stage=None, **kwargs):
+        """
+        Run a blocking function on the stage pool and return its result. If the job is
+        cancelled first, a stage that has not started yet never runs; a running stage
+        is abandoned (its thread returns to the pool when the call comes back).
+        """
+        self.check()
+        future = self.scheduler._pool.submit(in_context(fn, *args, **kwargs))
+        with self.job._stages_lock:
+            self.job._stages[future] = stage or getattr(fn, "__name__", "stage")
+        future.add_done_callback(self.job._stage_done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    def spawn(self, coro, name=None):
+        """Start a child coroutine that is cancelled with the job. Returns its asyncio.Task."""
+        task = asyncio.get_running_loop().create_task(coro, name=name)
+        self.job._children.add(task)
+        task.add_done_callback(self.job._children.discard)
+        return task
+
+    def on_cancel(self, callback):
+        """Call callback() (from the cancelling thread) when the job is cancelled."""
+        self.job.add_cancel_callback(callback)
+
+
+class Job:
+    """Handle for one submitted job: cancel(), wait() and result() are safe from any thread."""
+    def __init__(self, job_id, name, scheduler):
+        self.id = job_id
+        self.name = name
+        self.scheduler = scheduler
+        self.cancel_event = threading.Event()
+        self.submitted = time.perf_counter()
+        self._finished = threading.Event()
+        self._task = None
+        self._children = set()
+        self._stages = {}  # concurrent.futures.Future -> stage name, while running
+        self._stages_lock = threading.Lock()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+        self._result = None
+        self._error = None
+        self._cancel_requested = None
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.name} {self.state}>"
+
+    @property
+    def state(self):
+        if not self._finished.is_set():
+            return "cancelling" if self.cancel_event.is_set() else "running"
+        if self.cancel_event.is_set():
+            return "cancelled"
+        return "failed" if self._error is not None else "done"
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def running_stages(self):
+        """Names of the blocking stages whose threads have not returned yet."""
+        with self._stages_lock:
+            return list(self._stages.values())
+
+    def add_cancel_callback(self, callback):
+        with self._callbacks_lock:
+            if not self.cancel_event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """Cancel the job and all of its stages and children. Returns False if it had already finished."""
+        if self._finished.is_set():
+            return False
+        with self._callbacks_lock:
+            if self.cancel_event.is_set():
+                return True
+            self._cancel_requested = time.perf_counter()
+            self.cancel_event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Scheduler] Cancel callback of job {self.id} failed: {e}")
+        self.scheduler._call(self._cancel_tasks)
+        return True
+
+    def wait(self, timeout=None, stages=False):
+        """
+        Wait until the job has finished (and, with stages=True, until its stage threads
+        have returned). Returns True if it did within timeout.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        if not self._finished.wait(timeout):
+            return False
+        if stages:
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            _, not_done = wait(self._stage_futures(), timeout=remaining)
+            return not not_done
+        return True
+
+    def result(self, timeout=None):
+        """Wait for the job and return its result; raises JobCancelled or the job's exception."""
+        if not self.wait(timeout):
+            raise TimeoutError(f"Job {self.id} ({self.name}) still running")
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.id} ({self.name}) was cancelled")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _stage_futures(self):
+        with self._stages_lock:
+            return list(self._stages)
+
+    def _cancel_tasks(self):
+        for task in list(self._children):
+            task.cancel()
+        if self._task is not None:
+            self._task.cancel()
+
+    def _stage_done(self, future):
+        with self._stages_lock:
+            self._stages.pop(future, None)
+
+
+class Scheduler:
+    """
+    Runs each utterance as a job: a coroutine on an asyncio loop in a background
+    thread, with blocking SDK calls on a shared thread pool (see JobContext). The
+    policy decides what happens when a job is submitted while others are running.
+    """
+    def __init__(self, policy=None, stage_workers=STAGE_WORKERS, cancel_grace=CANCEL_GRACE):
+        policy = policy or SCHEDULER_POLICY
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduler policy: {policy} (expected one of {', '.join(POLICIES)})")
+        self.policy = policy
+        self.cancel_grace = cancel_grace
+        self._pool = ThreadPoolExecutor(max_workers=stage_workers, thread_name_prefix="job-stage")
+        self._ids = itertools.count(1)
+        self._jobs = []
+        self._jobs_lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._queue_lock = None  # Created on the loop (queue policy)
+        self._thread = threading.Thread(target=self._run_loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._queue_lock = asyncio.Lock()
+        self._loop.run_forever()
+
+    def _call(self, fn, *args):
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def submit(self, job_fn, *args, name=None, **kwargs):
+        """
+        Schedule job_fn(ctx, *args, **kwargs), a coroutine function, as a new job.
+        Under cancel_previous, running jobs are cancelled first. Returns the Job.
+        """
+        job = Job(next(self._ids), name or getattr(job_fn, "__name__", "job"), self)
+        with self._jobs_lock:
+            previous = [j for j in self._jobs if not j.done]
+            self._jobs = previous + [job]
+        if self.policy == "cancel_previous":
+            for old in previous:
+                old.cancel()
+        count_event("scheduler_jobs_submitted")
+        asyncio.run_coroutine_threadsafe(self._start(job, job_fn, args, kwargs, previous), self._loop)
+        return job
+
+    def cancel_all(self):
+        """Cancel every running job. Returns the number of jobs cancelled."""
+        with self._jobs_lock:
+            jobs = [j for j in self._jobs if not j.done]
+        return sum(job.cancel() for job in jobs)
+
+    def preempt(self):
+        """
+        Called when a new job is about to be submitted (e.g. when recording starts).
+        Under cancel_previous this cancels running jobs right away, so speech stops
+        while the user is still talking; other policies leave them running.
+        Returns the number of jobs cancelled.
+        """
+        return self.cancel_all() if self.policy == "cancel_previous" else 0
+
+    def running(self):
+        """Jobs that have not finished yet."""
+        with self._jobs_lock:
+            return [j for j in self._jobs if not j.done]
+
+    @property
+    def busy(self):
+        return bool(self.running())
+
+    def shutdown(self, cancel=True, timeout=CANCEL_GRACE):
+        """Cancel (or wait for) running jobs, then stop the loop and the stage pool."""
+        if cancel:
+            self.cancel_all()
+        for job in self.running():
+            job.wait(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _start(self, job, job_fn, args, kwargs, previous):
+        job._task = asyncio.current_task()
+        ctx = JobContext(job, self)
+        try:
+            if job.cancel_event.is_set():
+                raise asyncio.CancelledError()
+            if self.policy == "cancel_previous" and previous:
+                await self._drain(previous)
+            if self.policy == "queue":
+                async with self._queue_lock:
+                    ctx.check()
+                    job._result = await job_fn(ctx, *args, **kwargs)
+            else:
+                job._result = await job_fn(ctx, *args, **kwargs)
+            count_event("scheduler_jobs_done")
+        except asyncio.CancelledError:
+            job.cancel_event.set()
+            for task in list(job._children):
+                task.cancel()
+            count_event("scheduler_jobs_cancelled")
+            if job._cancel_requested is not None:
+                record_value("scheduler_cancel_latency", time.perf_counter() - job._cancel_requested)
+        except Exception as e:
+            job._error = e
+            count_event("scheduler_jobs_failed")
+            print(f"[Scheduler] Job {job.id} ({job.name}) failed: {e}")
+            traceback.print_exc()
+        finally:
+            job._finished.set()
+            with self._jobs_lock:
+                self._jobs = [j for j in self._jobs if not j.done]
+
+    async def _drain(self, previous):
+        # Let cancelled jobs finish and their stages return (e.g. playback stop), up to the grace period
+        deadline = time.perf_counter() + self.cancel_grace
+        tasks = [old._task for old in previous if old._task is not None and not old._task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.cancel_grace)
+        futures = [future for old in previous for future in old._stage_futures()]
+        if futures:
+            await asyncio.wait([asyncio.wrap_future(f) for f in futures],
+                               timeout=max(0.0, deadline - time.perf_counter()))
+        for old in previous:
+            stages = old.running_stages()
+            if stages:
+                # Blocking SDK calls cannot be interrupted; their threads return to the pool when they finish
+                count_event("scheduler_stages_abandoned", len(stages))
+                print(f"[Scheduler] Job {old.id} still has running stages: {', '.join(stages)}")
+
+
+def fake_stage(seconds, result=None, cancel_event=None, error=None):
+    """
+    Blocking stand-in for an SDK call: returns result after seconds, or early
+    (returning None) once cancel_event is set; raises error if given.
+    """
+    if cancel_event is not None:
+        if cancel_event.wait(seconds):
+            return None
+    else:
+        time.sleep(seconds)
+    if error is not None:
+        raise error
+    return result
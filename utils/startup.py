@@ -0,0 +1,168 @@
+"""
+Startup timing and background warm-up.
+
+Importing this module first (as main.py does) installs an import timer in the style
+of `python -X importtime`: every module imported from then on is timed, with its own
+time and its time including the modules it imported, and attributed to the phase it
+was imported in (startup, warm-up, or on demand while handling an utterance).
+startup_report() lists the slowest ones.
+
+Heavy SDKs are imported on first use by the engines and tools; warm_up() imports
+them, opens the audio device and mixer and builds the API clients on a background
+thread once the hotkey listener is up, so neither startup nor the first utterance
+has to wait for them.
+"""
+import builtins  # The import timer wraps __import__
+import os  # For configuration via environment variables
+import sys  # For the modules already imported
+import threading  # Warm-up runs on a background thread
+import time  # For startup timings
+
+# IMPORT_TIMES=0 turns the import timer off
+IMPORT_TIMES = os.getenv("IMPORT_TIMES", "1") == "1"
+# WARM_UP=0 turns the background warm-up off (everything is still loaded on first use)
+WARM_UP = os.getenv("WARM_UP", "1") == "1"
+# Imports listed in startup_report()
+REPORT_IMPORTS = 15
+
+STARTED = time.perf_counter()  # About when the agent started (this module is imported first)
+
+
+class ImportTimer:
+    """
+    Times first imports by wrapping builtins.__import__. Nested imports are timed
+    too, so each record has self time (excluding nested imports) and cumulative time.
+    """
+    def __init__(self):
+        self.records = []  # (module, self seconds, cumulative seconds, phase)
+        self.phase = "startup"
+        self._local = threading.local()
+        self._original = None
+        self._lock = threading.Lock()
+
+    def install(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)  # Time spent in nested imports
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            phase = getattr(self._local, "phase", None)
+            if phase is None:
+                phase = self.phase if threading.current_thread() is threading.main_thread() else "on demand"
+            with self._lock:
+                self.records.append((name, elapsed - nested, elapsed, phase))
+
+    def set_thread_phase(self, phase):
+        """Attribute imports made by the current (non-main) thread to phase."""
+        self._local.phase = phase
+
+    def total(self, phase=None):
+        """Seconds spent in top-level imports (of one phase, if given)."""
+        with self._lock:
+            records = list(self.records)
+        # Cumulative times of nested imports are already included in their parents'
+        return sum(self_time for _, self_time, _, p in records if phase is None or p == phase)
+
+    def slowest(self, n=REPORT_IMPORTS):
+        with self._lock:
+            records = list(self.records)
+        return sorted(records, key=lambda r: r[2], reverse=True)[:n]
+
+
+import_timer = ImportTimer()
+if IMPORT_TIMES:
+    import_timer.install()
+
+_timeline = {}  # Event name -> seconds since STARTED
+
+
+def mark(event):
+    """Record that a startup event happened now; returns seconds since start."""
+    elapsed = time.perf_counter() - STARTED
+    _timeline[event] = elapsed
+    return elapsed
+
+
+def ready():
+    """
+    Call once the agent accepts input. Records startup times in the benchmark
+    data (startup_ready, startup_imports) and ends the startup import phase.
+    """
+    from utils.benchmark import record_value  # Imported here: timed as part of startup
+    elapsed = mark("ready")
+    import_timer.phase = "on demand"
+    imports = import_timer.total("startup")
+    record_value("startup_ready", elapsed)
+    record_value("startup_imports", imports)
+    print(f"[Startup] Ready in {elapsed:.2f}s ({imports:.2f}s of it importing modules)")
+    return elapsed
+
+
+def warm_up(steps):
+    """
+    Run each (label, function) step in order, timing it as a "warm_up" span.
+    Failures are reported and otherwise ignored: everything is also loaded on first use.
+    """
+    from utils.benchmark import benchmark_block, record_value
+    import_timer.set_thread_phase("warm-up")
+    start = time.perf_counter()
+    for label, step in steps:
+        try:
+            with benchmark_block("warm_up", step=label):
+                step()
+        except Exception as e:
+            print(f"[Warm-up] Could not prepare {label}: {e}")
+    record_value("warm_up_total", time.perf_counter() - start)
+    mark("warm_up_done")
+
+
+def start_warm_up(steps):
+    """Run warm_up(steps) on a daemon thread and return the thread (None if WARM_UP=0)."""
+    if not WARM_UP:
+        return None
+    thread = threading.Thread(target=warm_up, args=(steps,), daemon=True, name="warm-up")
+    thread.start()
+    return thread
+
+
+def import_module_step(name):
+    """A warm-up step that imports a module."""
+    return f"import {name}", lambda: __import__(name)
+
+
+def startup_report(n=REPORT_IMPORTS):
+    """Startup timeline and the slowest imports, as text for the benchmark output."""
+    lines = ["STARTUP"]
+    if "ready" in _timeline:
+        lines.append(f"Ready after {_timeline['ready']:.3f}s, {import_timer.total('startup'):.3f}s of it in imports")
+    if "warm_up_done" in _timeline:
+        lines.append(f"Background warm-up finished after {_timeline['warm_up_done']:.3f}s "
+                     f"({import_timer.total('warm-up'):.3f}s in imports)")
+    on_demand = import_timer.total("on demand")
+    if on_demand:
+        lines.append(f"Imports on demand while handling utterances: {on_demand:.3f}s")
+    slowest = import_timer.slowest(n)
+    if slowest:
+        lines.append("Slowest imports (cumulative, self):")
+        lines.extend(f"  {cumulative:7.3f}s {self_time:7.3f}s  {name} [{phase}]"
+                     for name, self_time, cumulative, phase in slowest)
+    return "\n".join(lines) + "\n"
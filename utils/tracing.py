@@ -0,0 +1,279 @@
+import contextvars  # Current trace and span follow tasks and threads
+import functools  # For binding arguments in in_context()
+import itertools  # For span ids
+import json  # For JSONL and Chrome trace export
+import math  # For histogram buckets
+import os  # For configuration via environment variables
+import threading  # Spans are recorded from many threads
+import time  # Monotonic nanosecond clock
+import uuid  # For trace ids
+
+# Spans kept in memory; once full, the oldest are overwritten
+TRACE_BUFFER_SPANS = int(os.getenv("TRACE_BUFFER_SPANS", "65536"))
+# Relative width of a histogram bucket: percentiles are accurate to about 1%
+HISTOGRAM_PRECISION = 0.01
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+_current_span = contextvars.ContextVar("span_id", default=None)
+_span_ids = itertools.count(1)
+
+# Bucket i holds values in [_BASE**i, _BASE**(i+1)); its midpoint is within HISTOGRAM_PRECISION of both ends
+_BASE = 1 + HISTOGRAM_PRECISION * 2
+_LOG_BASE = math.log(_BASE)
+
+# Converts perf_counter_ns() to wall-clock time for export
+_WALL_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+
+class Histogram:
+    """
+    Streaming summary of one metric: count, sum, min and max exactly, and
+    percentiles from log-spaced buckets (relative error HISTOGRAM_PRECISION),
+    so memory does not grow with the number of samples.
+    """
+    def __init__(self, unit="s"):
+        self.unit = unit
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buckets = {}  # (sign, bucket index) -> count
+        self._zeros = 0
+        self._lock = threading.Lock()
+
+    def add(self, value):
+        value = float(value)
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            if value == 0.0:
+                self._zeros += 1
+                return
+            key = (1 if value > 0 else -1, math.floor(math.log(abs(value)) / _LOG_BASE))
+            self._buckets[key] = self._buckets.get(key, 0) + 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100), clamped to the observed min and max."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = max(1, math.ceil(q / 100 * self.count))
+            # Most negative first (largest magnitude), then zeros, then positive ascending
+            negative = sorted(((key, n) for key, n in self._buckets.items() if key[0] < 0), key=lambda item: -item[0][1])
+            positive = sorted(((key, n) for key, n in self._buckets.items() if key[0] > 0), key=lambda item: item[0][1])
+            seen = 0
+            for key, n in negative + [(None, self._zeros)] + positive:
+                seen += n
+                if n and seen >= rank:
+                    if key is None:
+                        return 0.0
+                    sign, index = key
+                    value = sign * _BASE ** (index + 0.5)
+                    return min(max(value, self.min), self.max)
+            return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count, "mean": self.mean, "min": self.min, "max": self.max, "total": self.total,
+            "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99), "unit": self.unit,
+        }
+
+
+# Metric name -> Histogram (timings in seconds, plus values recorded with observe())
+metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def observe(name, value, unit="s"):
+    """Add a sample to the named histogram."""
+    histogram = metrics.get(name)
+    if histogram is None:
+        with _metrics_lock:
+            histogram = metrics.setdefault(name, Histogram(unit))
+    histogram.add(value)
+
+
+class SpanBuffer:
+    """Fixed-size ring of finished spans, preallocated and safe to append to from any thread."""
+    def __init__(self, capacity=TRACE_BUFFER_SPANS):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        with self._lock:
+            self._slots[self._next % self.capacity] = record
+            self._next += 1
+
+    @property
+    def dropped(self):
+        """Spans overwritten because the buffer was full."""
+        return max(0, self._next - self.capacity)
+
+    def records(self):
+        """Finished spans, oldest first."""
+        with self._lock:
+            if self._next <= self.capacity:
+                return self._slots[:self._next]
+            start = self._next % self.capacity
+            return self._slots[start:] + self._slots[:start]
+
+    def clear(self):
+        with self._lock:
+            self._slots = [None] * self.capacity
+            self._next = 0
+
+
+buffer = SpanBuffer()
+_thread_names = {}
+
+
+class Span:
+    """
+    A timed operation. Entering it makes it the parent of spans started in the same
+    task or thread (and in work handed over with in_context()); leaving it records
+    it in the buffer and its duration in the histogram of the same name.
+    """
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start_ns", "duration_ns", "_token")
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs
+        self.duration_ns = None
+
+    def __enter__(self):
+        self.trace_id = _current_trace.get()
+        self.parent_id = _current_span.get()
+        self.span_id = next(_span_ids)
+        self._token = _current_span.set(self.span_id)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.perf_counter_ns() - self.start_ns
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.set("error", exc_type.__name__)
+        thread = threading.get_ident()
+        if thread not in _thread_names:
+            _thread_names[thread] = threading.current_thread().name
+        buffer.append((self.trace_id, self.span_id, self.parent_id, self.name,
+                       self.start_ns, self.duration_ns, thread, self.attrs))
+        observe(self.name, self.duration_ns / 1e9)
+        return False
+
+    @property
+    def seconds(self):
+        return None if self.duration_ns is None else self.duration_ns / 1e9
+
+    def set(self, key, value):
+        """Attach an attribute (exported with the span)."""
+        if self.attrs is None:
+            self.attrs = {}
+        self.attrs[key] = value
+
+
+def span(name, **attrs):
+    """Time a block as a span: with span("web_scraping", urls=3): ..."""
+    return Span(name, attrs or None)
+
+
+class trace:
+    """
+    Start a new trace (e.g. one per utterance) with a root span of the given name.
+    Spans started inside it, directly or via in_context(), share its trace_id.
+    """
+    def __init__(self, name, trace_id=None, **attrs):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.span = Span(name, attrs or None)
+
+    def __enter__(self):
+        self._token = _current_trace.set(self.trace_id)
+        self._parent = _current_span.set(None)
+        self.span.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.__exit__(exc_type, exc, tb)
+        _current_span.reset(self._parent)
+        _current_trace.reset(self._token)
+        return False
+
+
+def current_trace_id():
+    return _current_trace.get()
+
+
+def in_context(fn, *args, **kwargs):
+    """
+    Bind fn to the current trace and span, for running on another thread or pool:
+    executor.submit(in_context(fn, x)) makes spans inside fn children of the current one.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn, *args, **kwargs)
+
+
+def spans(trace_id=None):
+    """Finished spans as dicts, oldest first (only those of trace_id if given)."""
+    result = []
+    for trace_id_, span_id, parent_id, name, start_ns, duration_ns, thread, attrs in buffer.records():
+        if trace_id is not None and trace_id_ != trace_id:
+            continue
+        record = {
+            "trace_id": trace_id_, "span_id": span_id, "parent_id": parent_id, "name": name,
+            "start_unix_ns": start_ns + _WALL_OFFSET_NS, "start_ns": start_ns, "duration_ns": duration_ns,
+            "thread": _thread_names.get(thread, str(thread)),
+        }
+        if attrs:
+            record["attrs"] = attrs
+        result.append(record)
+    return result
+
+
+def export_jsonl(path, trace_id=None):
+    """Write one JSON object per span. Returns the number of spans written."""
+    records = spans(trace_id)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + "\n")
+    return len(records)
+
+
+def export_chrome_trace(path, trace_id=None):
+    """
+    Write the spans in Chrome trace event format; open the file in chrome://tracing
+    or https://ui.perfetto.dev. Returns the number of spans written.
+    """
+    pid = os.getpid()
+    events = []
+    threads = {}
+    for trace_id_, span_id, parent_id, name, start_ns, duration_ns, thread, attrs in buffer.records():
+        if trace_id is not None and trace_id_ != trace_id:
+            continue
+        threads[thread] = _thread_names.get(thread, str(thread))
+        args = {"trace_id": trace_id_, "span_id": span_id, "parent_id": parent_id}
+        if attrs:
+            args.update(attrs)
+        events.append({"name": name, "cat": "span", "ph": "X", "pid": pid, "tid": thread,
+                       "ts": (start_ns + _WALL_OFFSET_NS) / 1000, "dur": duration_ns / 1000, "args": args})
+    for thread, name in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=str)
+    return len(events) - len(threads)
+
+
+def clear():
+    """Drop all spans and metrics."""
+    buffer.clear()
+    with _metrics_lock:
+        metrics.clear()